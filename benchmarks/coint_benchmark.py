@@ -0,0 +1,83 @@
+"""Validate src.coint_utils against statsmodels and report cointegration tests per second
+
+Run from the repository root: python -m benchmarks.coint_benchmark [--bars 2600] [--pairs 1000]
+"""
+import argparse
+import time
+import warnings
+
+import numpy as np
+from statsmodels.tsa.stattools import adfuller, coint
+
+from src.coint_utils import adf_test, coint_test
+
+# Largest accepted absolute difference in statistics and p-values versus statsmodels
+TOLERANCE = 1e-8
+
+def synthetic_pairs(n_bars, n_pairs, seed=0):
+    """Random-walk x and y, where every other pair is cointegrated"""
+    rng = np.random.default_rng(seed)
+    x = 100 + np.cumsum(rng.normal(size=(n_bars, n_pairs)), axis=0)
+    noise = np.where(np.arange(n_pairs) % 2 == 0,
+                     rng.normal(size=(n_bars, n_pairs)),
+                     np.cumsum(rng.normal(size=(n_bars, n_pairs)), axis=0))
+    return 1.5 * x + 10 + noise, x
+
+def validate(n_bars, n_pairs=40):
+    """Largest difference from statsmodels over ADF and Engle-Granger tests, with used lags compared"""
+    y, x = synthetic_pairs(n_bars, n_pairs, seed=1)
+    worst = 0.0
+    for autolag in ('aic', 'bic', None):
+        max_lag = None if autolag else 2
+        adf = adf_test(y, max_lag=max_lag, autolag=autolag)
+        eg = coint_test(y, x, max_lag=max_lag, autolag=autolag)
+        for j in range(n_pairs):
+            ref = adfuller(y[:, j], maxlag=max_lag, autolag=autolag.upper() if autolag else None)
+            if ref[2] != adf.used_lag[j]:
+                raise AssertionError(f"ADF lag mismatch for series {j}: {ref[2]} != {adf.used_lag[j]}")
+            worst = max(worst, abs(ref[0] - adf.adf_stat[j]), abs(ref[1] - adf.p_value[j]))
+
+            ref_stat, ref_p, _ = coint(y[:, j], x[:, j], maxlag=max_lag, autolag=autolag)
+            worst = max(worst, abs(ref_stat - eg.adf_stat[j]), abs(ref_p - eg.p_value[j]))
+    return worst
+
+def pairs_per_second(test, n_pairs):
+    """Run a test over all pairs once and return the throughput"""
+    start = time.perf_counter()
+    test()
+    return n_pairs / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the batched cointegration tests")
+    parser.add_argument('--bars', type=int, default=2600)
+    parser.add_argument('--pairs', type=int, default=1000)
+    parser.add_argument('--reference-pairs', type=int, default=50,
+                        help="pairs timed with statsmodels, which is much slower")
+    args = parser.parse_args()
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        worst = validate(args.bars)
+    print(f"max |difference| vs statsmodels: {worst:.2e} (tolerance {TOLERANCE:.0e})")
+    if worst > TOLERANCE:
+        raise SystemExit("validation failed")
+
+    y, x = synthetic_pairs(args.bars, args.pairs)
+    n_ref = min(args.reference_pairs, args.pairs)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        rows = [
+            ("statsmodels coint, autolag=aic",
+             pairs_per_second(lambda: [coint(y[:, j], x[:, j]) for j in range(n_ref)], n_ref)),
+            ("coint_test, autolag=aic",
+             pairs_per_second(lambda: coint_test(y, x), args.pairs)),
+            ("coint_test, fixed lag 1",
+             pairs_per_second(lambda: coint_test(y, x, max_lag=1, autolag=None), args.pairs))
+        ]
+
+    print(f"{args.bars} bars per series")
+    for name, rate in rows:
+        print(f"{name:<34}{rate:>12,.0f} pairs/s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,262 @@
+"""Benchmark harness for the data, statistics, plotting and pair-scanning hot paths
+
+Run from the repository root:
+
+    python -m benchmarks.run_benchmarks [--quick] [--output results.json] [--compare baseline.json]
+
+Every case runs against synthetic data in a temporary working directory, so the local
+price store is never touched. Each case is called once to warm up, then timed until
+--min-time has elapsed, and peak memory comes from a separate tracemalloc run. Results
+are written as JSON together with the commit they were taken at, and --compare reports
+the median-time ratio of each case against an earlier results file.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+
+from src.calendar_utils import invalidate_market_calendar
+from src.cache_utils import get_pair_statistics
+from src.data_utils import FixtureProvider, download_pair_data, get_last_market_day, set_data_provider
+from src.panel_utils import PricePanel, clear_panel_cache
+from src.plot_utils import create_pair_plot
+from src.portfolio_utils import build_portfolio
+from src.risk_utils import DEFAULT_PATHS, pair_risk
+from src.scan_utils import PairScanExecutor
+from src.stats_utils import calculate_pair_statistics, cointegration_matrix, scan_cointegrated_pairs
+from src.store_utils import to_epoch_days
+
+BAR_COUNTS = [1_000, 10_000, 100_000, 1_000_000]
+# The store keeps daily bars, and pandas timestamps only span about 213k days
+STORE_BAR_COUNTS = [1_000, 10_000, 100_000]
+UNIVERSE_SIZES = [10, 100, 1_000]
+UNIVERSE_BARS = 2_500
+PORTFOLIO_TICKERS = 100
+PORTFOLIO_PAIRS = 200
+QUICK_MAX_BARS = 100_000
+QUICK_MAX_TICKERS = 100
+FIXTURE_START_DATE = "1800-01-01"
+
+def synthetic_pair(n_bars, seed=0):
+    """Pair frame in the download_pair_data layout with a cointegrated A/B pair at minute spacing"""
+    rng = np.random.default_rng(seed)
+    x = 100 * np.exp(np.cumsum(rng.normal(scale=0.5 / np.sqrt(n_bars), size=n_bars)))
+    spread = lfilter([1.0], [1.0, -0.95], rng.normal(scale=0.5, size=n_bars))
+    y = 1.2 * x + 20 + spread
+    return pd.DataFrame({
+        'date': pd.date_range('2000-01-01', periods=n_bars, freq='min', tz='UTC'),
+        'adj_close_A': y,
+        'vol_A': rng.integers(1_000, 10_000, n_bars).astype(float),
+        'adj_close_B': x,
+        'vol_B': rng.integers(1_000, 10_000, n_bars).astype(float)
+    })
+
+def synthetic_universe(n_tickers, n_bars, n_factors=5, seed=0):
+    """Date-aligned price matrix of tickers driven by a few shared random-walk factors"""
+    rng = np.random.default_rng(seed)
+    factors = np.cumsum(rng.normal(size=(n_bars, n_factors)), axis=0)
+    loadings = rng.integers(0, n_factors, n_tickers)
+    noise = rng.normal(scale=2.0, size=(n_bars, n_tickers))
+    prices = 200 + factors[:, loadings] * rng.uniform(0.5, 1.5, n_tickers) + noise
+    return pd.DataFrame(prices, index=pd.date_range('2000-01-03', periods=n_bars, freq='B', tz='UTC'),
+                        columns=[f'T{i:04d}' for i in range(n_tickers)])
+
+def write_fixtures(folder, n_bars):
+    """Daily A/B fixture CSVs for the local fixture provider; returns the covered date range"""
+    pair = synthetic_pair(n_bars)
+    dates = pd.date_range(FIXTURE_START_DATE, periods=n_bars, freq='D', tz='UTC')
+    for ticker in ('A', 'B'):
+        pd.DataFrame({
+            'date': dates,
+            'adj_close': pair[f'adj_close_{ticker}'],
+            'vol': pair[f'vol_{ticker}']
+        }).to_csv(f'{folder}/{ticker}_{n_bars}.csv', index=False)
+    return dates[0].strftime('%Y-%m-%d'), (dates[-1] + pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+
+def measure(func, setup=None, min_time=0.5, max_repeats=20):
+    """Time func() after one warm-up call until min_time has elapsed, then record its peak traced memory"""
+    if setup is not None:
+        setup()
+    func()
+
+    times = []
+    while not times or (sum(times) < min_time and len(times) < max_repeats):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'min': min(times),
+        'median': float(np.median(times)),
+        'mean': float(np.mean(times)),
+        'repeats': len(times),
+        'peak_memory_mb': peak / 1024 ** 2
+    }
+
+def remove_store(tickers):
+    """Delete stored prices and cached panels so the next download starts cold"""
+    for ticker in tickers:
+        path = f'data/{ticker}.prices'
+        if os.path.exists(path):
+            os.remove(path)
+    clear_panel_cache()
+
+def seed_store(tickers, start, end):
+    """Install the fixture provider and store tickers once, so a warm case never downloads"""
+    set_data_provider(FixtureProvider('fixtures'))
+    if not all(os.path.exists(f'data/{ticker}.prices') for ticker in tickers):
+        download_pair_data(tickers[0], tickers[1], start, end)
+    clear_panel_cache()
+
+def benchmark_cases(quick):
+    """(name, params, func, setup) for every benchmark case"""
+    bar_counts = [n for n in BAR_COUNTS if not quick or n <= QUICK_MAX_BARS]
+    store_counts = [n for n in STORE_BAR_COUNTS if not quick or n <= QUICK_MAX_BARS]
+    universe_sizes = [n for n in UNIVERSE_SIZES if not quick or n <= QUICK_MAX_TICKERS]
+
+    os.makedirs('fixtures', exist_ok=True)
+    for n_bars in store_counts:
+        start, end = write_fixtures('fixtures', n_bars)
+        tickers = [f'A_{n_bars}', f'B_{n_bars}']
+        load = lambda t=tickers, s=start, e=end: download_pair_data(t[0], t[1], s, e)
+        yield ('download_pair_data_cold', {'bars': n_bars}, load,
+               lambda t=tickers: (remove_store(t), set_data_provider(FixtureProvider('fixtures'))))
+        yield ('download_pair_data_warm', {'bars': n_bars}, load,
+               lambda t=tickers, s=start, e=end: seed_store(t, s, e))
+
+    for n_bars in bar_counts:
+        pair = synthetic_pair(n_bars)
+        yield ('calculate_pair_statistics', {'bars': n_bars},
+               lambda p=pair: calculate_pair_statistics(p, 'A', 'B'), None)
+
+        # One new bar on top of running statistics built in setup; unique end keys bypass the result cache
+        start_key, end_keys = f'bench_{n_bars}', itertools.count()
+        yield ('get_pair_statistics_append_bar', {'bars': n_bars},
+               lambda p=pair, s=start_key, k=end_keys: get_pair_statistics(p, 'A', 'B', s, next(k)),
+               lambda p=pair, s=start_key, k=end_keys: get_pair_statistics(p.iloc[:-1], 'A', 'B', s, next(k)))
+
+        yield ('create_pair_plot', {'bars': n_bars}, lambda p=pair: create_pair_plot(p, 'A', 'B'), None)
+
+    risk_pair = synthetic_pair(UNIVERSE_BARS)
+    yield ('pair_risk', {'bars': UNIVERSE_BARS, 'paths': DEFAULT_PATHS},
+           lambda p=risk_pair: pair_risk(p, 'A', 'B', 1.2), None)
+
+    yield ('get_last_market_day_cold', {}, lambda: get_last_market_day('2024-07-05'), invalidate_market_calendar)
+    yield ('get_last_market_day_warm', {}, lambda: get_last_market_day('2024-07-05'), None)
+
+    for n_tickers in universe_sizes:
+        prices = synthetic_universe(n_tickers, UNIVERSE_BARS)
+        params = {'tickers': n_tickers, 'bars': UNIVERSE_BARS}
+        yield ('scan_cointegrated_pairs', params, lambda p=prices: scan_cointegrated_pairs(p), None)
+        yield ('cointegration_matrix', params, lambda p=prices: cointegration_matrix(p), None)
+
+    # A full book build against adding one pair to a book that already holds the rest
+    prices = synthetic_universe(PORTFOLIO_TICKERS, UNIVERSE_BARS)
+    panel = PricePanel(to_epoch_days(prices.index), prices.columns, prices.to_numpy(),
+                       np.ones(prices.shape))
+    idx1, idx2 = np.triu_indices(PORTFOLIO_TICKERS, k=1)
+    pairs = [(prices.columns[i], prices.columns[j], 1.0 / PORTFOLIO_PAIRS)
+             for i, j in zip(idx1[:PORTFOLIO_PAIRS], idx2[:PORTFOLIO_PAIRS])]
+    params = {'tickers': PORTFOLIO_TICKERS, 'pairs': PORTFOLIO_PAIRS, 'bars': UNIVERSE_BARS}
+    yield ('build_portfolio', params, lambda: build_portfolio(panel, pairs), None)
+    state = {}
+    yield ('portfolio_add_pair', params, lambda: state['book'].add_pair(*pairs[-1]),
+           lambda: state.update(book=build_portfolio(panel, pairs[:-1])))
+
+    def exact_scan(prices):
+        with PairScanExecutor(prices) as executor:
+            for _ in executor.stream():
+                pass
+    yield ('pair_scan_executor_exact', {'tickers': 10, 'bars': UNIVERSE_BARS},
+           lambda p=synthetic_universe(10, UNIVERSE_BARS): exact_scan(p), None)
+
+def git_commit():
+    """Current commit hash, or None outside a git checkout"""
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def case_key(result):
+    return result['name'], json.dumps(result['params'], sort_keys=True)
+
+def compare(results, baseline_path, threshold):
+    """Print each case's median time against a baseline results file"""
+    with open(baseline_path) as f:
+        baseline = {case_key(result): result for result in json.load(f)['results']}
+    print(f"\nComparison with {baseline_path} (ratio = current / baseline median)")
+    for result in results:
+        old = baseline.get(case_key(result))
+        if old is None:
+            continue
+        ratio = result['median'] / old['median']
+        flag = "  REGRESSION" if ratio > threshold else ""
+        print(f"{result['name']:<34}{json.dumps(result['params']):<34}{ratio:>8.2f}x{flag}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the data, stats, plotting and scanning paths")
+    parser.add_argument('--quick', action='store_true',
+                        help=f"cap sizes at {QUICK_MAX_BARS:,} bars and {QUICK_MAX_TICKERS} tickers")
+    parser.add_argument('--filter', default='', help="only run cases whose name contains this text")
+    parser.add_argument('--min-time', type=float, default=0.5, help="seconds of repeated timing per case")
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', help="earlier results file to compare against")
+    parser.add_argument('--threshold', type=float, default=1.2, help="ratio flagged as a regression")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output)
+    baseline = os.path.abspath(args.compare) if args.compare else None
+    commit = git_commit()
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        os.makedirs('data', exist_ok=True)
+        for name, params, func, setup in benchmark_cases(args.quick):
+            if args.filter not in name:
+                continue
+            result = {'name': name, 'params': params, **measure(func, setup, args.min_time)}
+            results.append(result)
+            print(f"{name:<34}{json.dumps(params):<34}{result['median'] * 1000:>12.2f} ms"
+                  f"{result['peak_memory_mb']:>10.1f} MB")
+
+    with open(output, 'w') as f:
+        json.dump({
+            'commit': commit,
+            'timestamp': pd.Timestamp.now(tz='UTC').isoformat(),
+            'python': sys.version.split()[0],
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'results': results
+        }, f, indent=2)
+    print(f"\nSaved {len(results)} results to {output}")
+
+    if baseline:
+        compare(results, baseline, args.threshold)
+
+if __name__ == '__main__':
+    main()
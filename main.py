@@ -1,25 +1,65 @@
 import streamlit as st
 import streamlit.components.v1 as components
 import pandas as pd
-import random
+import time
 from datetime import datetime, timedelta
 
 from src.constants import (
     PRIMARY_COLOR, SELECTED_PRIMARY_COLOR, DEFAULT_TICKERS_LIST,
-    TICKERS_SELECTION_COLORS, DEFAULT_START_DATE, DEFAULT_END_DATE, DATA_FOLDER_PATH
+    TICKERS_SELECTION_COLORS, DEFAULT_START_DATE, DEFAULT_END_DATE, DATA_FOLDER_PATH,
+    ROLLING_OVERLAYS, DEFAULT_ROLLING_WINDOW
 )
-from src.data_utils import (
-    check_and_download_default_data, download_pair_data,
-    is_valid_ticker
+from src.data_utils import download_pair_data, load_panel, load_price_matrix
+from src.refresh_utils import (
+    start_refresh_worker, watch_tickers, get_freshness, data_as_of, last_stored_date
 )
-from src.stats_utils import calculate_pair_statistics
-from src.plot_utils import create_pair_plot, create_single_plot
+from src.validation_utils import parse_tickers, validate_tickers
+from src.stats_utils import (
+    scan_cointegrated_pairs, correlation_matrix, cointegration_matrix, cluster_order
+)
+from src.cache_utils import get_pair_statistics, get_pair_risk, get_data_version
+from src.risk_utils import RISK_METHODS, RISK_METHOD_NAMES, DEFAULT_MAX_HORIZON
+from src.portfolio_utils import PortfolioBook, build_portfolio, pair_label
+from src.scan_utils import PairScanExecutor
+from src.plot_utils import get_pair_plot, get_single_plot, create_heatmap, create_risk_plot
+from src.metrics_utils import (
+    METRICS_EXPORT_PATH, snapshot, diff_snapshots, format_metric, export_metrics, span
+)
+
+# Metrics at the start of this rerun, for the per-rerun debug breakdown
+rerun_started = time.perf_counter()
+rerun_metrics_start = snapshot()
 
 def clear_session_state():
     """Clear all session state variables"""
     for key in list(st.session_state.keys()):
         del st.session_state[key]
 
+def pair_data_version():
+    """Stored-data version of both tickers of the selected pair"""
+    return tuple(get_data_version(ticker) for ticker in st.session_state.ticker_pair)
+
+def get_portfolio_book():
+    """The session's pair book on the current ticker list and dates, rebuilt only when those or
+    the tickers' stored data change
+    
+    Returns None, keeping the previous book's pairs for later, when the listed tickers share
+    too few sessions in the selected range to estimate a covariance.
+    """
+    key = (tuple(st.session_state.ticker_list), str(st.session_state.start_date), str(st.session_state.end_date),
+           tuple(get_data_version(ticker) for ticker in st.session_state.ticker_list))
+    if st.session_state.get('portfolio_key') != key:
+        panel = load_panel(st.session_state.ticker_list, st.session_state.start_date,
+                           st.session_state.end_date, download=False).align('intersect')
+        if not PortfolioBook(panel).has_history:
+            return None
+        pairs = [(pair.ticker1, pair.ticker2, pair.weight) for pair in st.session_state.portfolio_book.pairs
+                 if pair.ticker1 in panel and pair.ticker2 in panel] \
+            if 'portfolio_book' in st.session_state else []
+        st.session_state.portfolio_book = build_portfolio(panel, pairs)
+        st.session_state.portfolio_key = key
+    return st.session_state.portfolio_book
+
 # Clear session state on first load
 if 'initialized' not in st.session_state:
     clear_session_state()
@@ -65,9 +105,6 @@ if 'last_start_date' not in st.session_state:
 if 'last_end_date' not in st.session_state:
     st.session_state.last_end_date = DEFAULT_END_DATE
 
-if 'should_update_stats' not in st.session_state:
-    st.session_state.should_update_stats = False
-
 if 'input_counter' not in st.session_state:
     st.session_state.input_counter = 0
 
@@ -82,8 +119,9 @@ div.stButton > button:first-child {
 </style>
 """, unsafe_allow_html=True)
 
-# Check and download default ticker data on launch
-check_and_download_default_data()
+# Data is fetched by the background refresh worker; the page only reads the local store
+start_refresh_worker()
+watch_tickers(st.session_state.ticker_list)
 
 # Top Row
 col1, col2, col3, col4, col5, col6 = st.columns([1, 1, 1, 3, 0.2, 2.6])
@@ -105,10 +143,11 @@ with col1:
                 st.session_state.ticker_pair[0],
                 st.session_state.ticker_pair[1],
                 start_date,
-                st.session_state.end_date
+                st.session_state.end_date,
+                download=False
             )
             st.session_state.pair_data = pair_data
-        st.session_state.should_update_stats = True
+            st.session_state.pair_data_version = pair_data_version()
     st.session_state.start_date = start_date
 
 with col2:
@@ -131,23 +170,77 @@ with col2:
                 st.session_state.ticker_pair[0],
                 st.session_state.ticker_pair[1],
                 st.session_state.start_date,
-                end_date
+                end_date,
+                download=False
             )
             st.session_state.pair_data = pair_data
-        st.session_state.should_update_stats = True
+            st.session_state.pair_data_version = pair_data_version()
     st.session_state.end_date = end_date
 
+# The refresh worker rewrites stored prices in the background; reload the pair once either
+# ticker changed, so charts and statistics follow the "Data as of" stamp
+if st.session_state.ticker_pair[0] != "" and st.session_state.ticker_pair[1] != "" and \
+        st.session_state.get('pair_data_version') != pair_data_version():
+    st.session_state.pair_data = download_pair_data(
+        st.session_state.ticker_pair[0],
+        st.session_state.ticker_pair[1],
+        st.session_state.start_date,
+        st.session_state.end_date,
+        download=False
+    )
+    st.session_state.pair_data_version = pair_data_version()
+
 # Title
 with col4:
     st.markdown("<div style='text-align: center;'><h1>Risk Engine Simulator</h1></div>", unsafe_allow_html=True)
 
+    # Freshness of the stored data the page is rendered from
+    as_of = data_as_of(st.session_state.ticker_list)
+    freshness = get_freshness()
+    missing = [ticker for ticker in st.session_state.ticker_list if last_stored_date(ticker) is None]
+    failed = [ticker for ticker in st.session_state.ticker_list if freshness.get(ticker, {}).get('error')]
+    stamp = f"Data as of {as_of:%Y-%m-%d}" if as_of is not None else "No data stored yet"
+    if missing:
+        stamp += f" · waiting for {', '.join(missing)}"
+    if failed:
+        stamp += f" · refresh failed for {', '.join(failed)}"
+    st.markdown(f"<div style='text-align: center; color: #888; font-size: 0.8rem;'>{stamp}</div>",
+                unsafe_allow_html=True)
+
 # Run Button
 with col6:
+    exact_scan = st.toggle("Exact ADF p-values", key="exact_scan",
+                           help="Run the full statsmodels ADF test on every pair across all CPU cores instead of the fast batched scan")
+
     if st.button("Find Best Cointegrated Pair", key="Test", type="secondary"):
-        if len(st.session_state.ticker_list) >= 2:
-            indices = random.sample(range(len(st.session_state.ticker_list)), 2)
-            ticker1 = st.session_state.ticker_list[indices[0]]
-            ticker2 = st.session_state.ticker_list[indices[1]]
+        panel = load_panel(
+            st.session_state.ticker_list,
+            st.session_state.start_date,
+            st.session_state.end_date,
+            download=False
+        )
+        prices = panel.align('intersect').to_frame()
+
+        if exact_scan:
+            # Stream a live leaderboard; leaving the block (e.g. a date change rerun) cancels the scan
+            progress = st.progress(0.0, text="Scanning pairs...")
+            leaderboard = st.empty()
+            scan_results = pd.DataFrame()
+            with PairScanExecutor(prices) as executor:
+                for fraction, scan_results in executor.stream():
+                    progress.progress(fraction, text=f"Scanning pairs... {fraction:.0%}")
+                    leaderboard.dataframe(scan_results, hide_index=True)
+        else:
+            scan_results = scan_cointegrated_pairs(prices)
+
+        if scan_results.empty:
+            st.session_state.error_message = "⚠️ Not enough overlapping data to scan for pairs ⚠️"
+            st.session_state.show_error = True
+            st.rerun()
+        else:
+            ticker1 = scan_results['ticker1'].iloc[0]
+            ticker2 = scan_results['ticker2'].iloc[0]
+            st.session_state.show_error = False
 
             if st.session_state.ticker_pair[0] != "":
                 st.session_state.ticker_color_map[st.session_state.ticker_pair[0]] = PRIMARY_COLOR
@@ -159,15 +252,18 @@ with col6:
             st.session_state.ticker_color_map[ticker1] = SELECTED_PRIMARY_COLOR
             st.session_state.ticker_color_map[ticker2] = SELECTED_PRIMARY_COLOR
 
+            # The pair is a column slice of the panel the scan ran on
             pair_data = download_pair_data(
                 ticker1, 
                 ticker2, 
                 st.session_state.start_date, 
-                st.session_state.end_date
+                st.session_state.end_date,
+                panel=panel,
+                download=False
             )
             
             st.session_state.pair_data = pair_data
-            st.session_state.should_update_stats = True
+            st.session_state.pair_data_version = pair_data_version()
 
             st.rerun()
     
@@ -199,17 +295,50 @@ col1, col2 = st.columns([2, 1])
 # Plot
 with col1:
     if hasattr(st.session_state, 'pair_data') and not st.session_state.pair_data.empty:
-        st.plotly_chart(create_pair_plot(
+        col_overlay, col_window = st.columns([3, 1])
+        with col_overlay:
+            overlay_name = st.selectbox("Overlay", list(ROLLING_OVERLAYS), key="rolling_overlay",
+                                        label_visibility="collapsed")
+        with col_window:
+            rolling_window = st.number_input("Window", min_value=10, max_value=1000,
+                                             value=DEFAULT_ROLLING_WINDOW, step=10, key="rolling_window",
+                                             label_visibility="collapsed")
+
+        # A box selection zooms in: only that window is re-plotted, at full resolution
+        zoom_range = st.session_state.get('zoom_range')
+        if zoom_range is not None and zoom_range[0] != st.session_state.ticker_pair:
+            zoom_range = None
+        fig = get_pair_plot(
             st.session_state.pair_data,
             st.session_state.ticker_pair[0],
-            st.session_state.ticker_pair[1]
-        ), use_container_width=True)
+            st.session_state.ticker_pair[1],
+            overlay=ROLLING_OVERLAYS[overlay_name],
+            overlay_name=overlay_name,
+            window=int(rolling_window),
+            x_range=zoom_range[1] if zoom_range is not None else None
+        )
+        with span('main.render_pair_chart'):
+            event = st.plotly_chart(fig, use_container_width=True, on_select="rerun",
+                                    selection_mode="box", key="pair_chart")
+
+        boxes = event.selection.get('box', []) if event else []
+        if boxes and boxes[0].get('x'):
+            selected = (st.session_state.ticker_pair, tuple(sorted(boxes[0]['x'])))
+            if selected != zoom_range:
+                st.session_state.zoom_range = selected
+                st.rerun()
+        if zoom_range is not None and st.button("Reset zoom", key="reset_zoom"):
+            st.session_state.zoom_range = None
+            st.rerun()
     else:
-        st.plotly_chart(create_single_plot(
+        fig = get_single_plot(
             DEFAULT_TICKERS_LIST[0],
             st.session_state.start_date,
-            st.session_state.end_date
-        ), use_container_width=True)
+            st.session_state.end_date,
+            download=False
+        )
+        with span('main.render_single_chart'):
+            st.plotly_chart(fig, use_container_width=True)
 
 with col2:
     # Input field for new ticker
@@ -225,22 +354,34 @@ with col2:
     
     with col_add:
         if st.button("Add", key="add_ticker_btn", type="secondary"):
-            if new_ticker:
-                if new_ticker.upper() not in st.session_state.ticker_list:
-                    if is_valid_ticker(new_ticker.upper()):
-                        st.session_state.ticker_list.append(new_ticker.upper())
-                        st.session_state.ticker_color_map[new_ticker.upper()] = PRIMARY_COLOR
-                        st.session_state.input_counter += 1
-                        st.session_state.show_error = False
-                        st.rerun()
-                    else:
-                        st.session_state.error_message = f"⚠️ Ticker '{new_ticker.upper()}' does not exist on Yahoo Finance ⚠️"
-                        st.session_state.show_error = True
-                        st.rerun()
-                else:
-                    st.session_state.error_message = f"⚠️ Ticker '{new_ticker.upper()}' is already in the list ⚠️"
+            # Accept a single symbol or a pasted list, validated in one batched call
+            tickers = parse_tickers(new_ticker)
+            if tickers:
+                duplicates = [ticker for ticker in tickers if ticker in st.session_state.ticker_list]
+                validity = validate_tickers([ticker for ticker in tickers if ticker not in duplicates])
+                invalid = [ticker for ticker, valid in validity.items() if valid is False]
+                unchecked = [ticker for ticker, valid in validity.items() if valid is None]
+
+                for ticker, valid in validity.items():
+                    if valid:
+                        st.session_state.ticker_list.append(ticker)
+                        st.session_state.ticker_color_map[ticker] = PRIMARY_COLOR
+                # New tickers are fetched by the refresh worker straight away
+                watch_tickers(st.session_state.ticker_list)
+
+                if invalid:
+                    st.session_state.error_message = f"⚠️ Ticker '{', '.join(invalid)}' does not exist on Yahoo Finance ⚠️"
                     st.session_state.show_error = True
-                    st.rerun()
+                elif unchecked:
+                    st.session_state.error_message = f"⚠️ Could not reach the data provider to check '{', '.join(unchecked)}', please try again ⚠️"
+                    st.session_state.show_error = True
+                elif duplicates:
+                    st.session_state.error_message = f"⚠️ Ticker '{', '.join(duplicates)}' is already in the list ⚠️"
+                    st.session_state.show_error = True
+                else:
+                    st.session_state.input_counter += 1
+                    st.session_state.show_error = False
+                st.rerun()
 
     ticker_container = st.container(height=355)
     
@@ -277,18 +418,23 @@ col1, col2 = st.columns([100, 0.001])
 
 # Statistics section
 with col1:
+    # Compute statistics once per rerun; repeated views of a pair come from the cache
+    stats = None
+    if hasattr(st.session_state, 'pair_data') and not st.session_state.pair_data.empty:
+        stats = get_pair_statistics(
+            st.session_state.pair_data,
+            st.session_state.ticker_pair[0],
+            st.session_state.ticker_pair[1],
+            st.session_state.start_date,
+            st.session_state.end_date
+        )
+
     # Create 3 rows of statistics
     for row in range(3):
         cols = st.columns(6)
         for col in range(6):
             with cols[col]:
-                if hasattr(st.session_state, 'pair_data') and not st.session_state.pair_data.empty and st.session_state.should_update_stats:
-                    stats = calculate_pair_statistics(
-                        st.session_state.pair_data,
-                        st.session_state.ticker_pair[0],
-                        st.session_state.ticker_pair[1]
-                    )
-                    
+                if stats is not None:
                     if row == 0:
                         if col == 0:
                             st.metric("Cumulative Return", f"{stats['cum_return']:.2f}%", 
@@ -311,16 +457,16 @@ with col1:
                     elif row == 1:
                         if col == 0:
                             st.metric("VaR (95%)", f"{stats['var_95']:.2f}%",
-                                    help="Value at Risk at 95% confidence level - maximum expected loss over a given time period")
+                                    help="Value at Risk at 95% confidence level of the first ticker's daily returns. See the Risk Engine for the hedged pair")
                         elif col == 1:
                             st.metric("CVaR (95%)", f"{stats['cvar_95']:.2f}%",
-                                    help="Conditional Value at Risk - average of losses beyond the VaR threshold")
+                                    help="Conditional Value at Risk of the first ticker's daily returns - average of losses beyond the VaR threshold")
                         elif col == 2:
                             st.metric("Profit Factor", f"{stats['profit_factor']:.2f}",
-                                    help="Ratio of gross profits to gross losses. Values > 1 indicate profitable trading")
+                                    help="Ratio of gross profits to gross losses of strategy trades. Values > 1 indicate profitable trading")
                         elif col == 3:
                             st.metric("MAE", f"{stats['mae']:.2f}%",
-                                    help="Maximum Adverse Excursion - largest percentage drop from entry to lowest point")
+                                    help="Maximum Adverse Excursion - worst intra-trade drawdown of the z-score strategy on the hedged spread")
                         elif col == 4:
                             st.metric("ADF Statistic", f"{stats['adf_stat']:.4f}",
                                     help="Augmented Dickey-Fuller test statistic for testing stationarity of the spread")
@@ -336,13 +482,13 @@ with col1:
                                     help="Expected time for the spread to revert half way back to its mean")
                         elif col == 2:
                             st.metric("# of Trades", f"{stats['mean_crossings']}",
-                                    help="Number of times the spread crosses its mean, indicating potential trading opportunities")
+                                    help="Number of trades taken by the z-score entry/exit strategy on the hedged spread")
                         elif col == 3:
                             st.metric("Win Rate", f"{stats['win_rate']:.1f}%",
-                                    help="Percentage of profitable trades")
+                                    help="Percentage of strategy trades that were profitable after costs")
                         elif col == 4:
                             st.metric("Mean Duration", f"{stats['trade_duration']:.1f} days",
-                                    help="Average holding period for trades")
+                                    help="Average holding period of strategy trades")
                         else:
                             st.metric("Z-score", f"{stats['current_z']:.2f}",
                                     help="Current spread's deviation from mean in standard deviations")
@@ -369,16 +515,16 @@ with col1:
                     elif row == 1:
                         if col == 0:
                             st.metric("VaR (95%)", "N/A",
-                                    help="Value at Risk at 95% confidence level - maximum expected loss over a given time period")
+                                    help="Value at Risk at 95% confidence level of the first ticker's daily returns. See the Risk Engine for the hedged pair")
                         elif col == 1:
                             st.metric("CVaR (95%)", "N/A",
-                                    help="Conditional Value at Risk - average of losses beyond the VaR threshold")
+                                    help="Conditional Value at Risk of the first ticker's daily returns - average of losses beyond the VaR threshold")
                         elif col == 2:
                             st.metric("Profit Factor", "N/A",
-                                    help="Ratio of gross profits to gross losses. Values > 1 indicate profitable trading")
+                                    help="Ratio of gross profits to gross losses of strategy trades. Values > 1 indicate profitable trading")
                         elif col == 3:
                             st.metric("MAE", "N/A",
-                                    help="Maximum Adverse Excursion - largest percentage drop from entry to lowest point")
+                                    help="Maximum Adverse Excursion - worst intra-trade drawdown of the z-score strategy on the hedged spread")
                         elif col == 4:
                             st.metric("ADF Statistic", "N/A",
                                     help="Augmented Dickey-Fuller test statistic for testing stationarity of the spread")
@@ -394,16 +540,164 @@ with col1:
                                     help="Expected time for the spread to revert half way back to its mean")
                         elif col == 2:
                             st.metric("# of Trades", "N/A",
-                                    help="Number of times the spread crosses its mean, indicating potential trading opportunities")
+                                    help="Number of trades taken by the z-score entry/exit strategy on the hedged spread")
                         elif col == 3:
                             st.metric("Win Rate", "N/A",
-                                    help="Percentage of profitable trades")
+                                    help="Percentage of strategy trades that were profitable after costs")
                         elif col == 4:
                             st.metric("Mean Duration", "N/A",
-                                    help="Average holding period for trades")
+                                    help="Average holding period of strategy trades")
                         else:
                             st.metric("Z-score", "N/A",
                                     help="Current spread's deviation from mean in standard deviations")
-
-    # Reset the update flag after displaying statistics
-    st.session_state.should_update_stats = False 
\ No newline at end of file
+ 
+
+# Risk engine: VaR/CVaR of the beta-hedged pair over multi-day holding periods
+if stats is not None:
+    with st.expander("Risk Engine", expanded=True):
+        col_confidence, col_horizon = st.columns([1, 3])
+        with col_confidence:
+            confidence = st.selectbox("Confidence", [0.95, 0.99], format_func=lambda c: f"{c:.0%}",
+                                      key="risk_confidence")
+        with col_horizon:
+            horizon = st.slider("Holding Period (days)", 1, DEFAULT_MAX_HORIZON, 1, key="risk_horizon")
+
+        risk = get_pair_risk(
+            st.session_state.pair_data,
+            st.session_state.ticker_pair[0],
+            st.session_state.ticker_pair[1],
+            stats['beta'],
+            st.session_state.start_date,
+            st.session_state.end_date,
+            confidence=confidence
+        )
+        if risk.empty:
+            st.caption("Not enough data to estimate risk")
+        else:
+            cols = st.columns(2 * len(RISK_METHODS))
+            for i, method in enumerate(RISK_METHODS):
+                with cols[2 * i]:
+                    st.metric(f"{RISK_METHOD_NAMES[method]} VaR", f"{risk.loc[horizon, f'{method}_var']:.2f}%",
+                              help=f"{horizon}-day return of long {st.session_state.ticker_pair[0]} / short beta "
+                                   f"{st.session_state.ticker_pair[1]} exceeded with {1 - confidence:.0%} probability")
+                with cols[2 * i + 1]:
+                    st.metric(f"{RISK_METHOD_NAMES[method]} CVaR", f"{risk.loc[horizon, f'{method}_cvar']:.2f}%",
+                              help="Average return in the scenarios at or beyond the VaR")
+            with span('main.render_risk_chart'):
+                st.plotly_chart(create_risk_plot(risk, horizon), use_container_width=True)
+            st.caption("Historical: overlapping windows of actual returns. Filtered historical: bootstrapped "
+                       "returns rescaled to current EWMA volatility. Monte Carlo: normal returns with the EWMA "
+                       "covariance. Simulations use 100,000 seeded paths; returns are on gross notional.")
+
+# Portfolio of pairs: covariance-based risk of a weighted book
+with st.expander("Portfolio"):
+    book = get_portfolio_book()
+    if book is None:
+        st.caption("The listed tickers share too few sessions in the selected range to build a book")
+    else:
+        ticker1, ticker2 = st.session_state.ticker_pair
+        col_weight, col_add, col_remove, col_clear = st.columns([1, 1, 2, 1])
+        with col_weight:
+            weight = st.number_input("Weight", min_value=0.01, max_value=10.0, value=0.1, step=0.05,
+                                     key="portfolio_weight",
+                                     help="Fraction of capital allocated to the pair's gross notional")
+        with col_add:
+            can_add = ticker1 in book.panel and ticker2 in book.panel and \
+                pair_label(ticker1, ticker2) not in book.labels
+            if st.button("Add Current Pair", key="portfolio_add", disabled=not can_add):
+                # Adding a pair updates the book's covariance in place instead of rebuilding it
+                book.add_pair(ticker1, ticker2, weight)
+        with col_remove:
+            to_remove = st.selectbox("Pair", book.labels, key="portfolio_remove_pair", label_visibility="collapsed")
+            if st.button("Remove Pair", key="portfolio_remove", disabled=to_remove is None):
+                book.remove_pair(*to_remove.split('/'))
+                st.rerun()
+        with col_clear:
+            if st.button("Clear Book", key="portfolio_clear", disabled=not len(book)):
+                st.session_state.pop('portfolio_key', None)
+                st.session_state.pop('portfolio_book', None)
+                st.rerun()
+
+        if len(book):
+            summary = book.summary()
+            cols = st.columns(4)
+            with cols[0]:
+                st.metric("Pairs", f"{summary['n_pairs']}")
+            with cols[1]:
+                st.metric("Volatility", f"{summary['volatility']:.2f}%",
+                          help="Annualized volatility of the weighted book of hedged spread returns")
+            with cols[2]:
+                st.metric("VaR (95%)", f"{summary['var']:.2f}%",
+                          help="Parametric one-day Value at Risk of the book from the spread covariance")
+            with cols[3]:
+                st.metric("Max Drawdown", f"{summary['max_drawdown']:.2f}%",
+                          help="Largest peak-to-trough drop of the compounded book equity")
+            st.dataframe(book.var_contributions().round(4), use_container_width=True)
+            if len(book) > 1:
+                st.plotly_chart(create_heatmap(book.correlation(), "Correlation"), use_container_width=True)
+            st.caption("Component VaR splits the book VaR across pairs (weight x marginal VaR) and sums to it. "
+                       "Spread returns are on gross notional over the dates all listed tickers trade.")
+        else:
+            st.caption("Add pairs to build a book")
+
+# Universe heatmap
+with st.expander("Universe Heatmap"):
+    col_view, col_build = st.columns([3, 1])
+    with col_view:
+        heatmap_view = st.radio("View", ["Return Correlation", "Cointegration P-value"],
+                                horizontal=True, key="heatmap_view", label_visibility="collapsed")
+    with col_build:
+        if st.button("Build Heatmap", key="build_heatmap", type="secondary"):
+            prices = load_price_matrix(
+                st.session_state.ticker_list,
+                st.session_state.start_date,
+                st.session_state.end_date,
+                download=False
+            )
+            if prices.shape[1] < 2 or len(prices) < 20:
+                st.session_state.universe_heatmap = None
+            else:
+                corr = correlation_matrix(prices)
+                order = cluster_order(corr)
+                st.session_state.universe_heatmap = {
+                    'corr': corr.loc[order, order],
+                    'p_value': cointegration_matrix(prices, corr).loc[order, order]
+                }
+
+    heatmap = st.session_state.get('universe_heatmap')
+    if heatmap is not None:
+        if heatmap_view == "Return Correlation":
+            fig = create_heatmap(heatmap['corr'], "Correlation")
+        else:
+            fig = create_heatmap(heatmap['p_value'], "P-value", colorscale='Viridis', zmin=0, zmax=1,
+                                 reverse_scale=True)
+        with span('main.render_heatmap'):
+            st.plotly_chart(fig, use_container_width=True)
+        st.caption("Tickers ordered by hierarchical clustering of return correlation. "
+                   "Pairs with low correlation are not tested for cointegration.")
+    elif 'universe_heatmap' in st.session_state:
+        st.caption("Not enough overlapping data to build the heatmap")
+
+# Export metrics for a scraping sidecar and, with ?debug=1 in the URL, show where this rerun spent its time
+if METRICS_EXPORT_PATH:
+    export_metrics(METRICS_EXPORT_PATH)
+
+if st.query_params.get("debug") == "1":
+    rerun_metrics = diff_snapshots(rerun_metrics_start, snapshot())
+    with st.expander("Debug: Rerun Timings", expanded=True):
+        st.caption(f"Rerun took {(time.perf_counter() - rerun_started) * 1000:.0f} ms. "
+                   "Span times include nested spans; other sessions' activity in the same interval is included.")
+        col_spans, col_counters = st.columns([2, 1])
+        with col_spans:
+            spans = pd.DataFrame(
+                [(name, calls, seconds * 1000) for name, (calls, seconds) in rerun_metrics['spans'].items()],
+                columns=['span', 'calls', 'total_ms']
+            ).sort_values('total_ms', ascending=False)
+            st.dataframe(spans, hide_index=True, use_container_width=True,
+                         column_config={'total_ms': st.column_config.NumberColumn(format="%.1f")})
+        with col_counters:
+            counters = pd.DataFrame(
+                [(format_metric(name, labels), value) for (name, labels), value in rerun_metrics['counters'].items()],
+                columns=['counter', 'value']
+            ).sort_values('counter')
+            st.dataframe(counters, hide_index=True, use_container_width=True)
@@ -0,0 +1,308 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from src.constants import DEFAULT_ROLLING_WINDOW
+from src.rolling_utils import rolling_zscore
+
+TRADING_DAYS = 252
+
+BacktestResult = namedtuple('BacktestResult', ['ledger', 'equity', 'positions', 'metrics'])
+
+def _holding(entry, exit):
+    """Whether a one-sided position is held at each bar: its latest entry or exit event was an entry"""
+    rows = np.arange(len(entry)).reshape((-1,) + (1,) * (entry.ndim - 1))
+    last_event = np.maximum.accumulate(np.where(entry | exit, rows, -1), axis=0)
+    return (last_event >= 0) & np.take_along_axis(entry, np.maximum(last_event, 0), axis=0)
+
+def simulate_positions(zscore, entry_z=2.0, exit_z=0.5):
+    """Spread position (+1 long, -1 short, 0 flat) of a z-score entry/exit strategy
+
+    Enter short above entry_z and long below -entry_z. Exits are direction-aware: a long
+    is closed once z reverts to -exit_z or above, a short once it reverts to exit_z or
+    below; otherwise the previous position is held. Each side is a two-state machine
+    evaluated without a loop: a side is held when its latest entry or exit event is an
+    entry. Works along axis 0 of 1-D or 2-D (bars x pairs) arrays.
+    """
+    zscore = np.asarray(zscore, dtype=float)
+    enter_long, enter_short = zscore <= -entry_z, zscore >= entry_z
+    long = _holding(enter_long, (zscore >= -exit_z) & ~enter_long)
+    short = _holding(enter_short, (zscore <= exit_z) & ~enter_short)
+    return long.astype(float) - short.astype(float)
+
+def expanding_hedge_ratio(y, x):
+    """OLS slope (with intercept) of y on x through each bar, using no later bars; NaN at the first bar
+
+    Unlike the whole-sample hedge ratio it never revises earlier bars, so a backtest on it
+    can be carried forward as bars arrive (see IncrementalBacktest).
+    """
+    y = np.asarray(y, dtype=float)
+    x = np.asarray(x, dtype=float)
+    if not len(y):
+        return np.empty(0)
+    # Sums are shifted by the first bar for precision
+    dx, dy = x - x[0], y - y[0]
+    n = np.arange(1, len(y) + 1)
+    sx, sy, sxx, sxy = np.cumsum(dx), np.cumsum(dy), np.cumsum(dx * dx), np.cumsum(dx * dy)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (n * sxy - sx * sy) / (n * sxx - sx * sx)
+
+def strategy_returns(positions, y, x, beta, cost_bps=5.0):
+    """Net per-bar returns on gross notional of holding `positions` units of y - beta * x
+
+    beta is one hedge ratio per series, or one per bar when it has y's shape; the hedge
+    set at the close of bar t is then the one held into bar t + 1.
+    """
+    y = np.asarray(y, dtype=float)
+    x = np.asarray(x, dtype=float)
+    hedge = np.asarray(beta, dtype=float)
+    if hedge.ndim and hedge.ndim == y.ndim:
+        hedge = hedge[:-1]
+    notional = y[:-1] + np.abs(hedge) * x[:-1]
+
+    # The position set at the close of bar t earns the spread change into bar t + 1
+    gross = np.zeros(positions.shape)
+    with np.errstate(invalid='ignore'):
+        gross[1:] = np.where(positions[:-1] != 0,
+                             positions[:-1] * (np.diff(y, axis=0) - hedge * np.diff(x, axis=0)) / notional, 0.0)
+    costs = np.zeros(positions.shape)
+    costs[1:] = np.abs(np.diff(positions, axis=0)) * cost_bps / 1e4
+    return gross, costs
+
+def _trade_runs(positions, gross, n_bars):
+    """Trades as runs of constant non-zero position in one or more back-to-back series of n_bars
+
+    A trade entered at bar e is exited at the close of bar x (the next change) and earns
+    the gross returns of bars e + 1 .. x; a run still open at the end of its series is
+    marked to market at that series' last bar.
+    """
+    n = len(positions)
+    boundary = np.zeros(n, dtype=bool)
+    boundary[::n_bars] = True
+    boundary[1:] |= positions[1:] != positions[:-1]
+    starts = np.flatnonzero(boundary)
+    run_ends = np.append(starts[1:], n)
+    series_ends = (starts // n_bars + 1) * n_bars
+
+    held = positions[starts] != 0
+    entries = starts[held]
+    exits = np.minimum(run_ends[held], series_ends[held] - 1)
+    is_open = run_ends[held] == series_ends[held]
+    keep = exits > entries
+    entries, exits, is_open = entries[keep], exits[keep], is_open[keep]
+
+    cum_gross = np.concatenate([[0.0], np.cumsum(gross)])
+    trade_gross = cum_gross[exits + 1] - cum_gross[entries + 1]
+    return entries, exits, is_open, trade_gross, cum_gross
+
+def _trade_returns(positions, gross, cost_rate):
+    """Entry and exit bars, net return, maximum adverse excursion and open flag of each trade of one series"""
+    entries, exits, is_open, trade_gross, cum_gross = _trade_runs(positions, gross, len(positions))
+    trade_costs = cost_rate * (1 + ~is_open)
+
+    # Worst running return within each trade, from the concatenated holding bars of all trades
+    lengths = exits - entries
+    offsets = (np.cumsum(lengths) - lengths).astype(int)
+    trade_index = np.repeat(np.arange(len(entries)), lengths)
+    bars = np.arange(lengths.sum()) - np.repeat(offsets, lengths) + np.repeat(entries + 1, lengths)
+    excursion = cum_gross[bars + 1] - cum_gross[entries + 1][trade_index]
+    mae = np.minimum.reduceat(excursion, offsets) if len(entries) else np.empty(0)
+    return entries, exits, trade_gross - trade_costs, np.minimum(mae, 0), is_open
+
+def _trade_ledger(dates, zscore, positions, gross, cost_rate):
+    """Trade ledger of a single series with net return and maximum adverse excursion"""
+    entries, exits, net, mae, is_open = _trade_returns(positions, gross, cost_rate)
+    return pd.DataFrame({
+        'entry_date': dates[entries],
+        'exit_date': dates[exits],
+        'direction': positions[entries].astype(int),
+        'entry_z': zscore[entries],
+        'exit_z': zscore[exits],
+        'duration': exits - entries,
+        'return': net * 100,
+        'mae': mae * 100,
+        'is_open': is_open
+    })
+
+def performance_metrics(returns, ledger):
+    """Return/risk metrics of a per-bar return series plus trade statistics from a ledger"""
+    returns = pd.Series(returns)
+    equity = (1 + returns).cumprod()
+
+    cum_return = (equity.iloc[-1] - 1) * 100
+    annual_return = ((1 + cum_return / 100) ** (TRADING_DAYS / len(returns)) - 1) * 100
+    vol = returns.std() * np.sqrt(TRADING_DAYS) * 100
+    sharpe = annual_return / vol if vol != 0 else 0
+
+    neg_returns = returns[returns < 0]
+    downside_vol = neg_returns.std() * np.sqrt(TRADING_DAYS) * 100 if len(neg_returns) > 1 else 0
+    sortino = annual_return / downside_vol if downside_vol != 0 else 0
+
+    max_drawdown = ((equity / equity.cummax() - 1) * 100).min()
+    calmar = abs(annual_return / max_drawdown) if max_drawdown != 0 else 0
+
+    var_95 = np.percentile(returns, 5) * 100
+    cvar_95 = returns[returns <= np.percentile(returns, 5)].mean() * 100
+
+    trade_returns = ledger['return']
+    gross_profit = trade_returns[trade_returns > 0].sum()
+    gross_loss = abs(trade_returns[trade_returns < 0].sum())
+
+    return {
+        'cum_return': cum_return,
+        'annual_return': annual_return,
+        'sharpe': sharpe,
+        'sortino': sortino,
+        'calmar': calmar,
+        'max_drawdown': max_drawdown,
+        'var_95': var_95,
+        'cvar_95': cvar_95,
+        'profit_factor': gross_profit / gross_loss if gross_loss != 0 else 0,
+        'mae': ledger['mae'].min() if len(ledger) else 0,
+        'mean_crossings': len(ledger),
+        'win_rate': (trade_returns > 0).mean() * 100 if len(ledger) else 0,
+        'trade_duration': ledger['duration'].mean() if len(ledger) else 0
+    }
+
+def run_pair_backtest(pair_data, ticker1, ticker2, beta, entry_z=2.0, exit_z=0.5,
+                      lookback=DEFAULT_ROLLING_WINDOW, cost_bps=5.0):
+    """Backtest a z-score mean-reversion strategy on the beta-hedged spread of a pair
+
+    beta is a single hedge ratio or one per bar (e.g. expanding_hedge_ratio).
+    """
+    y = pair_data[f'adj_close_{ticker1}'].to_numpy(dtype=float)
+    x = pair_data[f'adj_close_{ticker2}'].to_numpy(dtype=float)
+
+    zscore = rolling_zscore(y - beta * x, lookback)
+    positions = simulate_positions(zscore, entry_z, exit_z)
+    gross, costs = strategy_returns(positions, y, x, beta, cost_bps)
+    returns = gross - costs
+
+    ledger = _trade_ledger(pair_data['date'].array, zscore, positions, gross, cost_bps / 1e4)
+    equity = pd.Series((1 + returns).cumprod(), index=pair_data['date'].array, name='equity')
+    return BacktestResult(ledger, equity, positions, performance_metrics(returns, ledger))
+
+class IncrementalBacktest:
+    """Trade statistics of run_pair_backtest on a per-bar hedge ratio, carried forward as bars arrive
+
+    The hedge ratio of a bar must not change once it is known (expanding_hedge_ratio).
+    Only the last lookback - 1 spreads, the last bar, the bars of the current position run
+    and running totals of the closed trades are kept, so appending k bars costs
+    O(k + lookback + length of the open trade).
+    """
+
+    def __init__(self, entry_z=2.0, exit_z=0.5, lookback=DEFAULT_ROLLING_WINDOW, cost_bps=5.0):
+        self.entry_z = entry_z
+        self.exit_z = exit_z
+        self.lookback = lookback
+        self.cost_bps = cost_bps
+        self.spreads = np.empty(0)
+        self.last_bar = None  # y, x and hedge ratio
+        self.positions = np.empty(0)
+        self.gross = np.empty(0)
+        self.closed = np.zeros(5)  # trades, wins, profit, loss, bars held
+        self.closed_mae = 0.0
+
+    def update(self, y, x, beta):
+        """Absorb the next bars with their hedge ratios"""
+        y, x, beta = (np.asarray(values, dtype=float) for values in (y, x, beta))
+        if not len(y):
+            return
+        window = np.concatenate([self.spreads, y - beta * x])
+        with np.errstate(invalid='ignore'):
+            zscore = rolling_zscore(window, self.lookback)[len(self.spreads):]
+        self.spreads = window[max(len(window) - self.lookback + 1, 0):]
+
+        # A leading z-score that recreates the last position continues the state machine
+        held = self.positions[-1] if len(self.positions) else 0.0
+        seed = -np.inf if held > 0 else np.inf if held < 0 else 0.0
+        positions = simulate_positions(np.concatenate([[seed], zscore]), self.entry_z, self.exit_z)
+        if self.last_bar is None:
+            gross, _ = strategy_returns(positions[1:], y, x, beta, self.cost_bps)
+        else:
+            last_y, last_x, last_beta = self.last_bar
+            gross, _ = strategy_returns(positions, np.concatenate([[last_y], y]), np.concatenate([[last_x], x]),
+                                        np.concatenate([[last_beta], beta]), self.cost_bps)
+            gross = gross[1:]
+        self.last_bar = (y[-1], x[-1], beta[-1])
+
+        # Trades closed by the new bars join the totals; the current run is kept for the next update
+        positions = np.concatenate([self.positions, positions[1:]])
+        gross = np.concatenate([self.gross, gross])
+        entries, exits, net, mae, is_open = _trade_returns(positions, gross, self.cost_bps / 1e4)
+        closed = ~is_open
+        self.closed += (closed.sum(), (net[closed] > 0).sum(), np.maximum(net[closed], 0).sum(),
+                        -np.minimum(net[closed], 0).sum(), (exits - entries)[closed].sum())
+        if closed.any():
+            self.closed_mae = min(self.closed_mae, mae[closed].min())
+        changes = np.flatnonzero(positions[1:] != positions[:-1])
+        start = len(positions) - 1 if positions[-1] == 0 else changes[-1] + 1 if len(changes) else 0
+        self.positions, self.gross = positions[start:], gross[start:]
+
+    def trade_metrics(self):
+        """Trade statistics in the performance_metrics layout, counting the open trade as run_pair_backtest does"""
+        entries, exits, net, mae, _ = _trade_returns(self.positions, self.gross, self.cost_bps / 1e4)
+        n_trades, wins, profit, loss, held = self.closed + (len(net), (net > 0).sum(), np.maximum(net, 0).sum(),
+                                                            -np.minimum(net, 0).sum(), (exits - entries).sum())
+        worst = min([self.closed_mae] + list(mae))
+        return {
+            'profit_factor': profit / loss if loss != 0 else 0,
+            'mae': worst * 100 if n_trades else 0,
+            'mean_crossings': int(n_trades),
+            'win_rate': wins / n_trades * 100 if n_trades else 0,
+            'trade_duration': held / n_trades if n_trades else 0
+        }
+
+def backtest_pairs(y, x, betas, entry_z=2.0, exit_z=0.5, lookback=DEFAULT_ROLLING_WINDOW, cost_bps=5.0):
+    """Backtest many pairs at once from (bars x pairs) price matrices; returns one summary row per pair"""
+    y = np.asarray(y, dtype=float)
+    x = np.asarray(x, dtype=float)
+    betas = np.asarray(betas, dtype=float)
+    n_bars, n_pairs = y.shape
+
+    spread = y - betas * x
+    zscore = np.column_stack([rolling_zscore(spread[:, j], lookback) for j in range(n_pairs)]) \
+        if n_pairs else np.empty((n_bars, 0))
+    positions = simulate_positions(zscore, entry_z, exit_z)
+    return summarize_backtests(positions, y, x, betas, cost_bps)
+
+def summarize_backtests(positions, y, x, betas, cost_bps=5.0):
+    """Summary metrics for each column of a (bars x runs) position matrix
+
+    y, x and betas broadcast against the positions, so one pair can be evaluated under
+    many position paths (e.g. a parameter grid) without copying its prices.
+    """
+    n_bars, n_runs = positions.shape
+    gross, costs = strategy_returns(positions, y, x, betas, cost_bps)
+    returns = gross - costs
+
+    # Equity-curve metrics along the bar axis
+    equity = np.cumprod(1 + returns, axis=0)
+    cum_return = (equity[-1] - 1) * 100
+    with np.errstate(invalid='ignore'):
+        annual_return = ((1 + cum_return / 100) ** (TRADING_DAYS / n_bars) - 1) * 100
+    vol = returns.std(axis=0, ddof=1) * np.sqrt(TRADING_DAYS) * 100
+    max_drawdown = ((equity / np.maximum.accumulate(equity, axis=0) - 1) * 100).min(axis=0)
+
+    # Trade statistics: runs are found on the columns laid end to end, then summed per column
+    entries, exits, is_open, trade_gross, _ = _trade_runs(positions.T.ravel(), gross.T.ravel(), n_bars)
+    net = trade_gross - cost_bps / 1e4 * (1 + ~is_open)
+    run = entries // n_bars
+    n_trades = np.bincount(run, minlength=n_runs)
+    wins = np.bincount(run, weights=net > 0, minlength=n_runs)
+    gross_profit = np.bincount(run, weights=np.maximum(net, 0), minlength=n_runs)
+    gross_loss = -np.bincount(run, weights=np.minimum(net, 0), minlength=n_runs)
+    durations = np.bincount(run, weights=exits - entries, minlength=n_runs)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return pd.DataFrame({
+            'cum_return': cum_return,
+            'annual_return': annual_return,
+            'sharpe': np.where(vol != 0, annual_return / vol, 0),
+            'max_drawdown': max_drawdown,
+            'profit_factor': np.where(gross_loss != 0, gross_profit / gross_loss, 0),
+            'mean_crossings': n_trades,
+            'win_rate': np.where(n_trades > 0, wins / n_trades * 100, 0),
+            'trade_duration': np.where(n_trades > 0, durations / n_trades, 0)
+        })
@@ -0,0 +1,208 @@
+import os
+import threading
+from collections import OrderedDict
+
+from src.kalman_utils import update_kalman_hedge, load_kalman_result, save_kalman_result
+from src.metrics_utils import increment, timed
+from src.risk_utils import pair_risk, DEFAULT_CONFIDENCE, DEFAULT_MAX_HORIZON, DEFAULT_PATHS, DEFAULT_SEED
+from src.stats_utils import IncrementalPairStatistics
+from src.store_utils import store_path
+
+# Number of pair statistics results kept in memory
+STATS_CACHE_SIZE = 128
+# Number of risk reports kept in memory
+RISK_CACHE_SIZE = 32
+
+# Marks a missing entry, since None can be a cached value
+_MISSING = object()
+
+class _PendingLoad:
+    """Result of an in-flight load that other callers of the same key wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+class LRUCache:
+    """Thread-safe least-recently-used mapping bounded by entry count and/or total size
+    
+    With max_bytes set, each value's size is measured once by sizeof when it is stored.
+    With a name, hits and misses are also counted in the cache_hits/cache_misses metrics.
+    get_or_load coalesces concurrent misses of one key into a single load.
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None, sizeof=None, name=None):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self._pending = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        """Return the cached value and mark it as most recently used"""
+        with self._lock:
+            hit = key in self._entries
+            if hit:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                value = self._entries[key]
+            else:
+                self.misses += 1
+                value = default
+        if self.name is not None:
+            increment('cache_hits' if hit else 'cache_misses', cache=self.name)
+        return value
+
+    def get_or_load(self, key, load):
+        """Return the cached value, calling load() on a miss and caching its result
+        
+        While one caller loads a key, other callers of that key wait for its result (or
+        exception) instead of loading it again.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        with self._lock:
+            # The entry may have been stored between the miss above and taking the lock
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            pending = self._pending.get(key)
+            leader = pending is None
+            if leader:
+                pending = self._pending[key] = _PendingLoad()
+
+        if not leader:
+            if self.name is not None:
+                increment('cache_coalesced', cache=self.name)
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.value
+
+        try:
+            pending.value = load()
+            self.put(key, pending.value)
+            return pending.value
+        except BaseException as e:
+            pending.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._pending[key]
+            pending.done.set()
+
+    def put(self, key, value):
+        """Store a value, evicting least recently used entries while over either bound"""
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = value
+            self._sizes[key] = size
+            self.total_bytes += size
+            while self._entries and self._over_limit():
+                self._remove(next(iter(self._entries)))
+
+    def discard_where(self, predicate):
+        """Drop every entry whose key satisfies predicate"""
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                self._remove(key)
+
+    def clear(self):
+        """Drop every cached entry"""
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self.total_bytes = 0
+
+    def _over_limit(self):
+        if self.max_entries is not None and len(self._entries) > self.max_entries:
+            return True
+        return self.max_bytes is not None and self.total_bytes > self.max_bytes
+
+    def _remove(self, key):
+        if key in self._entries:
+            del self._entries[key]
+            self.total_bytes -= self._sizes.pop(key)
+
+_stats_cache = LRUCache(STATS_CACHE_SIZE, name='pair_statistics')
+# Running statistics per pair and start date, extended when the end date moves forward
+_incremental_stats = LRUCache(STATS_CACHE_SIZE, name='incremental_statistics')
+_risk_cache = LRUCache(RISK_CACHE_SIZE, name='risk')
+# Kalman hedge ratio path and filter state per pair and first bar, extended as bars arrive
+_kalman_cache = LRUCache(STATS_CACHE_SIZE, name='kalman')
+
+def get_data_version(ticker):
+    """Version stamp of a ticker's stored data, changing whenever it is rewritten"""
+    try:
+        return os.stat(store_path(ticker)).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+def frame_stamp(pair_data):
+    """Length and first/last dates of a pair frame, so cache keys follow the data actually passed in"""
+    if pair_data.empty:
+        return (0, None, None)
+    return (len(pair_data), pair_data['date'].iloc[0], pair_data['date'].iloc[-1])
+
+@timed
+def get_pair_statistics(pair_data, ticker1, ticker2, start_date, end_date):
+    """Return pair statistics from the cache, computing them only on a miss
+    
+    A miss caused by a later end date only feeds the new bars into the pair's running state.
+    Concurrent misses of one key share a single computation, and the running state is
+    locked while it absorbs bars, so sessions never see it half updated.
+    """
+    key = (ticker1, ticker2, str(start_date), str(end_date),
+           get_data_version(ticker1), get_data_version(ticker2)) + frame_stamp(pair_data)
+    
+    def load():
+        state = _incremental_stats.get_or_load((ticker1, ticker2, str(start_date)),
+                                               lambda: IncrementalPairStatistics(ticker1, ticker2))
+        with state.lock:
+            # Reuse the running state when pair_data only appends bars to what it has seen
+            if not state.matches(pair_data):
+                state.reset()
+            state.update(pair_data)
+            return state.statistics()
+    return _stats_cache.get_or_load(key, load)
+
+def get_pair_risk(pair_data, ticker1, ticker2, beta, start_date, end_date, confidence=DEFAULT_CONFIDENCE,
+                  max_horizon=DEFAULT_MAX_HORIZON, n_paths=DEFAULT_PATHS, seed=DEFAULT_SEED):
+    """Cached pair_risk report, keyed by pair, date range, data version, frame and risk settings"""
+    key = (ticker1, ticker2, str(start_date), str(end_date), get_data_version(ticker1), get_data_version(ticker2),
+           beta, confidence, max_horizon, n_paths, seed) + frame_stamp(pair_data)
+    return _risk_cache.get_or_load(key, lambda: pair_risk(pair_data, ticker1, ticker2, beta, max_horizon,
+                                                          confidence, n_paths, seed))
+
+def get_kalman_hedge(pair_data, ticker1, ticker2):
+    """Kalman hedge ratio and z-score of every bar of pair_data, filtering only bars not seen before
+    
+    On a memory miss the pair's persisted result is used when it was computed on the current
+    data versions. Cached results are never mutated, so sessions racing on one pair at worst
+    repeat the filter over the same new bars.
+    """
+    if pair_data.empty:
+        return update_kalman_hedge(pair_data, ticker1, ticker2)
+    key = (ticker1, ticker2, pair_data['date'].iloc[0])
+    versions = (get_data_version(ticker1), get_data_version(ticker2))
+    previous = _kalman_cache.get(key)
+    if previous is None:
+        previous = load_kalman_result(ticker1, ticker2, key[2], versions)
+    result = update_kalman_hedge(pair_data, ticker1, ticker2, previous)
+    if result is not previous:
+        save_kalman_result(ticker1, ticker2, result, versions)
+    _kalman_cache.put(key, result)
+    return result
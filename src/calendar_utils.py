@@ -0,0 +1,109 @@
+import threading
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.holiday import (
+    AbstractHolidayCalendar, Holiday, GoodFriday, USMartinLutherKingJr, USPresidentsDay,
+    USMemorialDay, USLaborDay, USThanksgivingDay, nearest_workday, sunday_to_monday
+)
+
+from src.constants import DEFAULT_TICKERS_LIST
+from src.store_utils import read_prices, to_epoch_day
+
+# Range covered by the rule-based session table
+CALENDAR_START_DATE = "1990-01-01"
+CALENDAR_LOOKAHEAD_DAYS = 366
+
+class NYSEHolidayCalendar(AbstractHolidayCalendar):
+    """Regular NYSE full-day holidays (one-off closures come from stored data)"""
+    rules = [
+        Holiday('New Years Day', month=1, day=1, observance=sunday_to_monday),
+        USMartinLutherKingJr,
+        USPresidentsDay,
+        GoodFriday,
+        USMemorialDay,
+        Holiday('Juneteenth', month=6, day=19, start_date='2022-01-01', observance=nearest_workday),
+        Holiday('Independence Day', month=7, day=4, observance=nearest_workday),
+        USLaborDay,
+        USThanksgivingDay,
+        Holiday('Christmas', month=12, day=25, observance=nearest_workday)
+    ]
+
+def rule_based_sessions(start_date, end_date):
+    """NYSE sessions between two dates as epoch days, from the holiday rules"""
+    sessions = pd.date_range(start_date, end_date,
+                             freq=pd.offsets.CustomBusinessDay(calendar=NYSEHolidayCalendar()))
+    return sessions.values.astype('datetime64[D]').astype(np.int64)
+
+_rule_sessions = None
+_rule_sessions_date = None
+_rule_sessions_lock = threading.Lock()
+
+def calendar_rule_sessions():
+    """Rule-based sessions from CALENDAR_START_DATE through the lookahead, built once per day
+
+    Generating them takes a few hundred milliseconds, so calendar rebuilds after store
+    writes only re-merge the stored days onto this table.
+    """
+    global _rule_sessions, _rule_sessions_date
+    today = pd.Timestamp.today().normalize()
+    with _rule_sessions_lock:
+        if _rule_sessions_date != today:
+            _rule_sessions = rule_based_sessions(CALENDAR_START_DATE,
+                                                 today + pd.Timedelta(days=CALENDAR_LOOKAHEAD_DAYS))
+            _rule_sessions_date = today
+        return _rule_sessions
+
+class MarketCalendar:
+    """Sorted trading-session index answering date queries by binary search
+
+    Sessions are epoch days. Inside the range covered by stored price data the stored
+    dates are authoritative; outside it the NYSE holiday rules fill in.
+    """
+
+    def __init__(self, stored_days):
+        rule_days = calendar_rule_sessions()
+        stored_days = np.unique(np.asarray(stored_days, dtype=np.int64))
+        if len(stored_days) == 0:
+            self.sessions = rule_days
+        else:
+            self.sessions = np.concatenate([
+                rule_days[rule_days < stored_days[0]],
+                stored_days,
+                rule_days[rule_days > stored_days[-1]]
+            ])
+
+    def last_session_on_or_before(self, date):
+        """Epoch day of the last session on or before a date, or None"""
+        pos = np.searchsorted(self.sessions, to_epoch_day(date), side='right')
+        return int(self.sessions[pos - 1]) if pos > 0 else None
+
+    def first_session_on_or_after(self, date):
+        """Epoch day of the first session on or after a date, or None"""
+        pos = np.searchsorted(self.sessions, to_epoch_day(date), side='left')
+        return int(self.sessions[pos]) if pos < len(self.sessions) else None
+
+    def sessions_between(self, start_date, end_date):
+        """Epoch days of every session in [start_date, end_date]"""
+        lo = np.searchsorted(self.sessions, to_epoch_day(start_date), side='left')
+        hi = np.searchsorted(self.sessions, to_epoch_day(end_date), side='right')
+        return self.sessions[lo:hi]
+
+_calendar = None
+_calendar_lock = threading.Lock()
+
+def get_market_calendar():
+    """Shared calendar built once from the default tickers' stored dates"""
+    global _calendar
+    with _calendar_lock:
+        if _calendar is None:
+            stored = [read_prices(ticker) for ticker in DEFAULT_TICKERS_LIST]
+            stored_days = [np.asarray(prices.dates) for prices in stored if prices is not None]
+            _calendar = MarketCalendar(np.concatenate(stored_days) if stored_days else [])
+        return _calendar
+
+def invalidate_market_calendar():
+    """Drop the shared calendar so the next query rebuilds it from the store"""
+    global _calendar
+    with _calendar_lock:
+        _calendar = None
@@ -0,0 +1,214 @@
+from collections import namedtuple
+
+import numpy as np
+from scipy.stats import norm
+
+# MacKinnon (1994) response-surface coefficients for the constant-only case, one row per
+# number of I(1) series N = 1..6 (N = 1 is the ADF test, N = 2 a pair cointegration test)
+TAU_MAX_C = np.array([2.74, 0.92, 0.55, 0.61, 0.79, 1.0])
+TAU_MIN_C = np.array([-18.83, -18.86, -23.48, -28.07, -25.96, -23.27])
+TAU_STAR_C = np.array([-1.61, -2.62, -3.13, -3.47, -3.78, -3.93])
+TAU_C_SMALLP = np.array([
+    [2.1659, 1.4412, 0.038269],
+    [2.92, 1.5012, 0.039796],
+    [3.4699, 1.4856, 0.03164],
+    [3.9673, 1.4777, 0.026315],
+    [4.5509, 1.5338, 0.029545],
+    [5.1399, 1.6036, 0.034445]
+])
+TAU_C_LARGEP = np.array([
+    [1.7339, 0.93202, -0.12745, -0.010368],
+    [2.1945, 0.64695, -0.29198, -0.042377],
+    [2.5893, 0.45168, -0.36529, -0.050074],
+    [3.0387, 0.45452, -0.33666, -0.041921],
+    [3.5049, 0.52098, -0.29158, -0.033468],
+    [3.9489, 0.58933, -0.25359, -0.02721]
+])
+
+# Series (columns) tested per block, and the size of the (series x rows x regressors) design
+# array built at a time; long series are summed over row blocks within that budget
+ADF_CHUNK_SIZE = 64
+ADF_BLOCK_ELEMENTS = 4 * 1024 * 1024
+
+ADFResult = namedtuple('ADFResult', ['adf_stat', 'p_value', 'used_lag', 'nobs'])
+CointResult = namedtuple('CointResult', ['adf_stat', 'p_value', 'used_lag', 'beta', 'alpha'])
+
+def mackinnon_pvalues(adf_stats, n_vars=2):
+    """Vectorized MacKinnon (1994) approximate p-values for constant-only tests"""
+    adf_stats = np.asarray(adf_stats, dtype=float)
+    small_p = norm.cdf(np.polyval(TAU_C_SMALLP[n_vars - 1][::-1], adf_stats))
+    large_p = norm.cdf(np.polyval(TAU_C_LARGEP[n_vars - 1][::-1], adf_stats))
+    p_values = np.where(adf_stats <= TAU_STAR_C[n_vars - 1], small_p, large_p)
+    p_values = np.where(adf_stats > TAU_MAX_C[n_vars - 1], 1.0, p_values)
+    p_values = np.where(adf_stats < TAU_MIN_C[n_vars - 1], 0.0, p_values)
+    return np.where(np.isnan(adf_stats), np.nan, p_values)
+
+def default_max_lag(nobs, trend=True):
+    """Schwert's rule 12 * (nobs / 100)^(1/4), capped as statsmodels' adfuller does"""
+    return int(min(nobs // 2 - int(trend) - 1, np.ceil(12.0 * (nobs / 100.0) ** 0.25)))
+
+def adf_design(levels, max_lag, trend):
+    """Stacked ADF design (series x rows x columns) over every usable row, plus the targets
+
+    Columns are the lagged level, an optional constant and max_lag lagged differences;
+    lagged differences reaching before the sample are zero, so row t is only valid for
+    regressions using at most t lags.
+    """
+    diffs = np.diff(levels, axis=0).T
+    n_series, n_rows = diffs.shape
+    n_fixed = 1 + int(trend)
+    design = np.zeros((n_series, n_rows, n_fixed + max_lag))
+    design[:, :, 0] = levels[:-1].T
+    if trend:
+        design[:, :, 1] = 1.0
+    for lag in range(1, max_lag + 1):
+        design[:, lag:, n_fixed + lag - 1] = diffs[:, :-lag]
+    return design, diffs
+
+def solve_normal_equations(XtX, Xty, yty, nobs):
+    """Batched OLS from normal equations: t-statistic of the first coefficient and SSR"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        XtX_inv = np.linalg.pinv(XtX)
+        params = np.einsum('skl,sl->sk', XtX_inv, Xty)
+        ssr = yty - np.einsum('sk,sk->s', params, Xty)
+        std_err = np.sqrt(ssr / (nobs - XtX.shape[-1]) * XtX_inv[:, 0, 0])
+        return params[:, 0] / std_err, ssr
+
+def _nested_ssr(XtX, Xty, yty):
+    """SSR of every regression on the first k columns (k = 1..K) from one Cholesky factorization
+
+    With XtX = L L' and w = L^-1 Xty, the SSR using the leading k columns is yty minus the
+    sum of the first k squares of w, because leading blocks of L factor leading blocks of XtX.
+    Falls back to one pseudo-inverse solve per k for singular systems.
+    """
+    try:
+        chol = np.linalg.cholesky(XtX)
+        w = np.linalg.solve(chol, Xty[:, :, None])[:, :, 0]
+        return yty[:, None] - np.cumsum(w * w, axis=1)
+    except np.linalg.LinAlgError:
+        return np.column_stack([
+            solve_normal_equations(XtX[:, :k, :k], Xty[:, :k], yty, np.inf)[1]
+            for k in range(1, XtX.shape[-1] + 1)
+        ])
+
+def adf_from_normal_equations(XtX, Xty, yty, prefix, prefix_target, n_rows, autolag='aic', trend=True):
+    """ADF statistics and chosen lags of a batch of series from their accumulated sums
+
+    XtX, Xty and yty are the normal equations over the common sample of the full-lag
+    design (rows max_lag onwards), stacked over series; prefix and prefix_target are the
+    first max_lag design rows and targets, and n_rows is the total number of rows.
+    Because only sums are needed, callers can grow them row by row as new bars arrive.
+    """
+    max_lag = prefix.shape[1]
+    n_fixed = 1 + int(trend)
+
+    if autolag is None:
+        lags = np.full(len(yty), max_lag)
+    else:
+        # Information criteria on the common sample, as adfuller's lag search does
+        nobs = n_rows - max_lag
+        ssr = _nested_ssr(XtX, Xty, yty)[:, n_fixed - 1:]
+        k = n_fixed + np.arange(max_lag + 1)
+        penalty = 2 * k if autolag == 'aic' else k * np.log(nobs)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            criteria = nobs * np.log(ssr / nobs) + penalty
+        lags = np.argmin(np.nan_to_num(criteria, nan=np.inf), axis=1)
+
+    # Refit each series at its lag on the longer sample it allows: the common-sample sums
+    # plus the prefix rows between its lag and max_lag
+    stats = np.full(len(yty), np.nan)
+    for lag in np.unique(lags):
+        group = np.flatnonzero(lags == lag)
+        k = n_fixed + lag
+        extra = prefix[group, lag:, :k]
+        extra_target = prefix_target[group, lag:]
+        stats[group], _ = solve_normal_equations(
+            XtX[group, :k, :k] + extra.transpose(0, 2, 1) @ extra,
+            Xty[group, :k] + np.einsum('srk,sr->sk', extra, extra_target),
+            yty[group] + np.einsum('sr,sr->s', extra_target, extra_target),
+            n_rows - lag
+        )
+    return stats, lags
+
+def adf_normal_equations(levels, max_lag, trend=True):
+    """Common-sample normal equations and prefix rows of the full-lag ADF design (see adf_from_normal_equations)
+
+    The sums are accumulated over row blocks so long series never materialize the full design.
+    """
+    n_series = levels.shape[1]
+    n_rows = len(levels) - 1
+    prefix, prefix_target = adf_design(levels[:max_lag + 1], max_lag, trend)
+
+    n_columns = prefix.shape[2]
+    block_rows = max(ADF_BLOCK_ELEMENTS // (n_series * n_columns), 1)
+    XtX = np.zeros((n_series, n_columns, n_columns))
+    Xty = np.zeros((n_series, n_columns))
+    yty = np.zeros(n_series)
+    for start in range(max_lag, n_rows, block_rows):
+        stop = min(start + block_rows, n_rows)
+        design, target = adf_design(levels[start - max_lag:stop + 1], max_lag, trend)
+        common, common_target = design[:, max_lag:], target[:, max_lag:]
+        XtX += common.transpose(0, 2, 1) @ common
+        Xty += np.einsum('srk,sr->sk', common, common_target)
+        yty += np.einsum('sr,sr->s', common_target, common_target)
+    return XtX, Xty, yty, prefix, prefix_target
+
+def _adf_block(levels, max_lag, autolag, trend):
+    """ADF statistics and chosen lags for one block of series (rows x series)"""
+    # The common-sample normal equations hold every nested lag model
+    XtX, Xty, yty, prefix, prefix_target = adf_normal_equations(levels, max_lag, trend)
+    return adf_from_normal_equations(XtX, Xty, yty, prefix, prefix_target, len(levels) - 1, autolag, trend)
+
+def _adf_statistics(levels, max_lag, autolag, trend):
+    """ADF statistics, lags and sample sizes of every column, in blocks of ADF_CHUNK_SIZE"""
+    levels = np.asarray(levels, dtype=float)
+    if levels.ndim == 1:
+        levels = levels[:, None]
+    n_obs, n_series = levels.shape
+    max_lag = default_max_lag(n_obs, trend) if max_lag is None else max_lag
+    if autolag is not None and autolag not in ('aic', 'bic'):
+        raise ValueError(f"Unknown autolag '{autolag}'")
+
+    stats = np.empty(n_series)
+    lags = np.empty(n_series, dtype=int)
+    for start in range(0, n_series, ADF_CHUNK_SIZE):
+        block = slice(start, start + ADF_CHUNK_SIZE)
+        stats[block], lags[block] = _adf_block(levels[:, block], max_lag, autolag, trend)
+    return stats, lags, n_obs - 1 - lags
+
+def adf_test(series, max_lag=None, autolag='aic'):
+    """Augmented Dickey-Fuller test with constant on one series or each column of a matrix
+
+    Matches statsmodels' adfuller(x, maxlag, regression='c', autolag) for autolag 'aic',
+    'bic' or None (fixed max_lag). The lag search reuses one set of normal equations for
+    all candidate lags instead of fitting a model per lag.
+    """
+    stats, lags, nobs = _adf_statistics(series, max_lag, autolag, trend=True)
+    result = ADFResult(stats, mackinnon_pvalues(stats, n_vars=1), lags, nobs)
+    if np.ndim(series) == 1:
+        return ADFResult(*(value[0] for value in result))
+    return result
+
+def coint_test(y, x, max_lag=None, autolag='aic'):
+    """Engle-Granger cointegration test of y on x for one pair or each column pair of two matrices
+
+    Matches statsmodels' coint(y, x, trend='c', maxlag, autolag): y is regressed on x with
+    a constant and the residuals get a no-constant ADF test with N = 2 p-values.
+    """
+    single = np.ndim(y) == 1
+    y = np.asarray(y, dtype=float).reshape(len(y), -1)
+    x = np.asarray(x, dtype=float).reshape(len(x), -1)
+
+    # Hedge ratios of every pair at once
+    x_c = x - x.mean(axis=0)
+    y_c = y - y.mean(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        beta = (x_c * y_c).sum(axis=0) / (x_c * x_c).sum(axis=0)
+    alpha = y.mean(axis=0) - beta * x.mean(axis=0)
+    residuals = y_c - beta * x_c
+
+    stats, lags, _ = _adf_statistics(residuals, max_lag, autolag, trend=False)
+    result = CointResult(stats, mackinnon_pvalues(stats, n_vars=2), lags, beta, alpha)
+    if single:
+        return CointResult(*(value[0] for value in result))
+    return result
@@ -12,5 +12,20 @@ TICKERS_SELECTION_COLORS = {ticker: PRIMARY_COLOR for ticker in DEFAULT_TICKERS_
 DEFAULT_START_DATE = "2016-01-04"
 DEFAULT_END_DATE = datetime.datetime.today().strftime("%Y-%m-%d") 
 
+# Rolling analytics overlays (label -> column of calculate_rolling_statistics)
+ROLLING_OVERLAYS = {
+    "None": None,
+    "Rolling Z-score": "zscore",
+    "Rolling Hedge Ratio": "beta",
+    "Rolling Half-life": "half_life",
+    "Rolling ADF p-value": "adf_p_value",
+    "Kalman Hedge Ratio": "kalman_beta",
+    "Kalman Z-score": "kalman_zscore"
+}
+DEFAULT_ROLLING_WINDOW = 60
+
+# Universe heatmap: pairs below this absolute return correlation skip the cointegration test
+HEATMAP_MIN_CORRELATION = 0.5
+
 # Paths
 DATA_FOLDER_PATH = "data"
\ No newline at end of file
@@ -1,119 +1,518 @@
+import numpy as np
 import pandas as pd
 import yfinance as yf
+from scipy.signal import lfilter
 import os
+import threading
+import zlib
+from collections import namedtuple
+from contextlib import ExitStack, contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from src.constants import DEFAULT_TICKERS_LIST, DEFAULT_START_DATE, DEFAULT_END_DATE, DATA_FOLDER_PATH
+from src.store_utils import (
+    PriceSeries, read_prices, write_prices, merge_prices, slice_prices,
+    to_epoch_day, to_epoch_days, from_epoch_days, migrate_csv_store, history_start, mark_history_start,
+    EMPTY_PRICES
+)
+from src.metrics_utils import increment, span, timed
+from src.panel_utils import get_panel
+from src.calendar_utils import (
+    get_market_calendar, invalidate_market_calendar, rule_based_sessions, CALENDAR_LOOKAHEAD_DAYS
+)
+
+# Synthetic price paths start here so every date range is a slice of the same path
+SYNTHETIC_START_DATE = "2000-01-03"
+# Relative change of an already stored adjusted close, seen again in a tail fetch, beyond which the
+# provider is taken to have re-based the history (a split or dividend since the last sync)
+ADJUSTMENT_TOLERANCE = 1e-4
+
+# Text of yfinance's per-ticker error for symbols it has no listing for (YFTickerMissingError)
+YF_MISSING_SYMBOL_ERROR = 'possibly delisted'
+
+# How long an empty head fetch keeps the head from being re-requested; an empty response
+# may be a transient provider error rather than proof the ticker was not listed yet
+UNCONFIRMED_HISTORY_START_TTL = 24 * 3600
+
+DownloadSummary = namedtuple('DownloadSummary', ['succeeded', 'failed', 'rebased'])
 
 # Create data folder if it doesn't exist
 os.makedirs(DATA_FOLDER_PATH, exist_ok=True)
 
+# One lock per ticker, held from the coverage check until the fetched data is stored
+_download_locks = {}
+_download_locks_guard = threading.Lock()
+
+@contextmanager
+def download_locks(tickers):
+    """Hold the download locks of tickers for the duration of the block
+
+    A session needing a ticker another session is already downloading waits for that
+    download and then finds the data stored, instead of fetching it a second time.
+    Locks are taken in sorted order so overlapping requests cannot deadlock.
+    """
+    with _download_locks_guard:
+        locks = [_download_locks.setdefault(ticker, threading.Lock()) for ticker in sorted(set(tickers))]
+    with ExitStack() as stack:
+        for lock in locks:
+            if not lock.acquire(blocking=False):
+                increment('download_waits')
+                lock.acquire()
+            stack.callback(lock.release)
+        yield
+
+@timed
 def get_last_market_day(end_date):
-    """Get the last market day before or on the given date"""
-    # Convert to datetime and subtract one day to start checking
-    check_date = pd.to_datetime(end_date).tz_localize('UTC') - pd.Timedelta(days=1)
-    
-    # Try up to 5 days back (to account for weekends and holidays)
-    for _ in range(5):
-        # Check if this date exists in any of our default tickers' data
-        for ticker in DEFAULT_TICKERS_LIST:
-            try:
-                df = pd.read_csv(f'{DATA_FOLDER_PATH}/{ticker}.csv')
-                df['date'] = pd.to_datetime(df['date'], utc=True)
-                if check_date.date() in df['date'].dt.date.values:
-                    return check_date.date()
-            except (FileNotFoundError, KeyError, ValueError):
-                continue
-        # If not found, go back one more day
-        check_date = check_date - pd.Timedelta(days=1)
+    """Get the last market day before the given (exclusive) end date"""
+    calendar = get_market_calendar()
+    last_day = calendar.last_session_on_or_before(pd.to_datetime(end_date) - pd.Timedelta(days=1))
     
     # If we can't find a market day, return the original end date minus 1 day
-    return (pd.to_datetime(end_date).tz_localize('UTC') - pd.Timedelta(days=1)).date()
+    if last_day is None:
+        return (pd.to_datetime(end_date) - pd.Timedelta(days=1)).date()
+    return from_epoch_days([last_day])[0].date()
 
-def download_stock_data(ticker, start_date, end_date):
-    """Download stock data from Yahoo Finance and save to CSV"""
-    try:
-        # First check if we already have the data
-        try:
-            df = pd.read_csv(f'{DATA_FOLDER_PATH}/{ticker}.csv')
-            df['date'] = pd.to_datetime(df['date'], utc=True)
-            
-            # Convert input dates to UTC and get just the date part
-            start_timestamp = pd.to_datetime(start_date).tz_localize('UTC').date()
-            end_timestamp = get_last_market_day(end_date)
-            
-            # Get just the date part from the dataframe
-            df_dates = df['date'].dt.date
-            
-            # Check if we have data covering the requested range
-            if df_dates.min() <= start_timestamp and df_dates.max() >= end_timestamp:
-                return True  # We already have the data we need
-        except (FileNotFoundError, KeyError, ValueError):
-            pass  # If any error occurs, we'll download fresh data
+class DataProvider:
+    """Source of daily price history; subclasses implement fetch_history"""
+
+    def fetch_history(self, ticker, start_date, end_date):
+        """Daily history as a PriceSeries (end date exclusive)"""
+        raise NotImplementedError
+
+    def fetch_history_batch(self, tickers, start_date, end_date):
+        """Daily history for many tickers, as a dict of PriceSeries"""
+        return {ticker: self.fetch_history(ticker, start_date, end_date) for ticker in tickers}
+
+    def is_valid_ticker(self, ticker):
+        """Check if the provider knows the ticker"""
+        return self.validate_batch([ticker])[ticker]
+
+    def validate_batch(self, tickers):
+        """Check many tickers at once by requesting their last two weeks of history
         
-        # If we don't have the data, download it
+        Returns {ticker: True/False/None}, None meaning the provider could not tell. Provider
+        errors propagate, so a failed lookup is never mistaken for unknown tickers.
+        """
+        end_date = pd.Timestamp.today().date()
+        recent = self.fetch_history_batch(tickers, end_date - pd.Timedelta(days=14), end_date)
+        return {ticker: ticker in recent and len(recent[ticker].dates) > 0 for ticker in tickers}
+
+class YFinanceProvider(DataProvider):
+    """Live data from Yahoo Finance"""
+
+    def fetch_history(self, ticker, start_date, end_date):
+        """Fetch daily history from Yahoo Finance as a PriceSeries (end date exclusive)"""
         stock = yf.Ticker(ticker)
 
         # Download historical data
+        increment('network_calls', provider='yfinance')
         hist_data = stock.history(start=start_date, end=end_date, auto_adjust=False)
+        if hist_data.empty:
+            return EMPTY_PRICES
 
         # Select and rename columns to follow financial industry conventions
-        df = hist_data[['Adj Close', 'Volume']].copy()
-        df.columns = ['adj_close', 'vol']
-        df.index.name = 'date'
+        return PriceSeries(
+            to_epoch_days(hist_data.index),
+            hist_data['Adj Close'].to_numpy(dtype=float),
+            hist_data['Volume'].to_numpy(dtype=float)
+        )
+
+    def fetch_history_batch(self, tickers, start_date, end_date):
+        """Fetch daily history for many tickers in one Yahoo Finance request"""
+        increment('network_calls', provider='yfinance')
+        hist_data = yf.download(list(tickers), start=start_date, end=end_date, auto_adjust=False,
+                                group_by='ticker', progress=False, threads=False)
+        
+        results = {}
+        for ticker in tickers:
+            df = self._ticker_frame(hist_data, ticker)
+            if df is None:
+                results[ticker] = EMPTY_PRICES
+                continue
+            df = df[['Adj Close', 'Volume']].dropna()
+            results[ticker] = PriceSeries(
+                to_epoch_days(df.index),
+                df['Adj Close'].to_numpy(dtype=float),
+                df['Volume'].to_numpy(dtype=float)
+            )
+        return results
+
+    @staticmethod
+    def _ticker_frame(hist_data, ticker):
+        """One ticker's columns of a yf.download result, or None if the ticker is missing from it"""
+        if isinstance(hist_data.columns, pd.MultiIndex):
+            if ticker not in hist_data.columns.get_level_values(0):
+                return None
+            return hist_data[ticker]
+        return hist_data if not hist_data.empty else None
+
+    def validate_batch(self, tickers):
+        """Check many tickers in one request for their last two weeks of history
         
-        # Save to CSV
-        df.to_csv(f'{DATA_FOLDER_PATH}/{ticker}.csv')
+        yf.download logs per-ticker failures (unknown symbols, but also rate limits and
+        timeouts) and returns missing or all-NaN columns instead of raising. Such a ticker is
+        only invalid when yfinance's error says the symbol is missing; otherwise it is
+        reported as unknown (None).
+        """
+        end_date = pd.Timestamp.today().date()
+        increment('network_calls', provider='yfinance')
+        hist_data = yf.download(list(tickers), start=end_date - pd.Timedelta(days=14), end=end_date,
+                                auto_adjust=False, group_by='ticker', progress=False, threads=False)
+        errors = getattr(getattr(yf, 'shared', None), '_ERRORS', {})
+        results = {}
+        for ticker in tickers:
+            df = self._ticker_frame(hist_data, ticker)
+            if df is not None and not df['Adj Close'].isna().all():
+                results[ticker] = True
+            else:
+                results[ticker] = False if YF_MISSING_SYMBOL_ERROR in str(errors.get(ticker.upper(), '')) else None
+        return results
+
+    def is_valid_ticker(self, ticker):
+        """Check if ticker exists on Yahoo Finance"""
+        try:
+            increment('network_calls', provider='yfinance')
+            # Looking up the info fails for symbols Yahoo Finance does not know
+            yf.Ticker(ticker).info
+            return True
+        except Exception:
+            return False
+
+def _slice_exclusive(prices, start_date, end_date):
+    """Rows in [start_date, end_date) of an in-memory series"""
+    return slice_prices(prices, start_date, pd.Timestamp(end_date) - pd.Timedelta(days=1))
+
+class FixtureProvider(DataProvider):
+    """Offline data from a folder of {ticker}.parquet or {ticker}.csv files (date, adj_close, vol)"""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _load(self, ticker):
+        """Read and cache one fixture file, or None if the ticker has no fixture"""
+        with self._lock:
+            if ticker not in self._series:
+                df = None
+                for extension, read in (('parquet', pd.read_parquet), ('csv', pd.read_csv)):
+                    path = f'{self.folder}/{ticker}.{extension}'
+                    if os.path.exists(path):
+                        increment('bytes_read', os.path.getsize(path), source='fixture')
+                        with span(f'data_utils.read_{extension}'):
+                            df = read(path)
+                        break
+                if df is not None:
+                    days = to_epoch_days(pd.to_datetime(df['date'], utc=True))
+                    order = np.argsort(days, kind='stable')
+                    df = PriceSeries(days[order], df['adj_close'].to_numpy(dtype=float)[order],
+                                     df['vol'].to_numpy(dtype=float)[order])
+                self._series[ticker] = df
+            return self._series[ticker]
+
+    def fetch_history(self, ticker, start_date, end_date):
+        """Fixture rows in [start_date, end_date)"""
+        prices = self._load(ticker)
+        if prices is None:
+            return EMPTY_PRICES
+        return _slice_exclusive(prices, start_date, end_date)
+
+    def is_valid_ticker(self, ticker):
+        """Check if a fixture file exists for the ticker"""
+        return self._load(ticker) is not None
+
+    def validate_batch(self, tickers):
+        """A ticker is valid when it has a fixture file, however old its data"""
+        return {ticker: self.is_valid_ticker(ticker) for ticker in tickers}
+
+class SyntheticProvider(DataProvider):
+    """Deterministic generated prices on the NYSE session calendar
+
+    Each ticker loads on one of n_factors random-walk factors plus a mean-reverting
+    idiosyncratic spread, so tickers sharing a factor form cointegrated pairs. Paths are
+    seeded from the ticker name and fixed from SYNTHETIC_START_DATE, so any date range
+    of a ticker is always the same slice of the same path.
+    """
+
+    def __init__(self, seed=0, n_factors=5):
+        self.seed = seed
+        self.n_factors = n_factors
+        self._sessions = None
+        self._factors = None
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _build_factors(self):
+        """Session calendar and common factor paths, generated once"""
+        end_date = pd.Timestamp.today() + pd.Timedelta(days=CALENDAR_LOOKAHEAD_DAYS)
+        self._sessions = rule_based_sessions(SYNTHETIC_START_DATE, end_date)
+        rng = np.random.default_rng(self.seed)
+        steps = rng.normal(0.0003, 0.012, size=(len(self._sessions), self.n_factors))
+        self._factors = np.cumsum(steps, axis=0)
+
+    def _generate(self, ticker):
+        """Full synthetic history of one ticker"""
+        with self._lock:
+            if ticker not in self._series:
+                if self._factors is None:
+                    self._build_factors()
+                ticker_seed = zlib.crc32(ticker.encode())
+                rng = np.random.default_rng([self.seed, ticker_seed])
+                factor = self._factors[:, ticker_seed % self.n_factors]
+                
+                # Mean-reverting AR(1) idiosyncratic spread
+                n = len(self._sessions)
+                shocks = rng.normal(0, 0.01, size=n)
+                spread = lfilter([1.0], [1.0, -rng.uniform(0.9, 0.99)], shocks)
+                
+                log_price = np.log(rng.uniform(20, 500)) + rng.uniform(0.5, 1.5) * factor + spread
+                vol = rng.lognormal(np.log(1e6), 0.5, size=n).round()
+                self._series[ticker] = PriceSeries(self._sessions, np.exp(log_price), vol)
+            return self._series[ticker]
+
+    def fetch_history(self, ticker, start_date, end_date):
+        """Synthetic rows in [start_date, end_date)"""
+        return _slice_exclusive(self._generate(ticker), start_date, end_date)
+
+    def is_valid_ticker(self, ticker):
+        """Every non-empty symbol exists synthetically"""
+        return bool(ticker)
+
+    def validate_batch(self, tickers):
+        """Every non-empty symbol exists synthetically"""
+        return {ticker: self.is_valid_ticker(ticker) for ticker in tickers}
+
+def create_data_provider(spec):
+    """Build a provider from a spec: 'yfinance', 'synthetic[:seed]' or 'fixture:<folder>'"""
+    name, _, arg = spec.partition(':')
+    if name == 'yfinance':
+        return YFinanceProvider()
+    if name == 'synthetic':
+        return SyntheticProvider(seed=int(arg) if arg else 0)
+    if name == 'fixture':
+        return FixtureProvider(arg)
+    raise ValueError(f"Unknown data provider '{spec}'")
+
+_provider = create_data_provider(os.environ.get('DATA_PROVIDER', 'yfinance'))
+
+def get_data_provider():
+    """Provider used by every download in the app"""
+    return _provider
+
+def set_data_provider(provider):
+    """Replace the provider used by every download in the app"""
+    global _provider
+    _provider = provider
+
+@timed
+def missing_segments(ticker, start_date, end_date, incremental=True):
+    """Date ranges (end exclusive) that must be fetched for the store to cover a request"""
+    prices = read_prices(ticker)
+    if prices is None or len(prices.dates) == 0 or not incremental:
+        # Nothing usable stored yet, fetch the whole range
+        return [(start_date, end_date)]
+    
+    # Compare the first and last sessions of the request against the stored range
+    start_day = get_market_calendar().first_session_on_or_after(start_date)
+    end_day = to_epoch_day(get_last_market_day(end_date))
+    first_day, last_day = int(prices.dates[0]), int(prices.dates[-1])
+    
+    # Only the missing head and tail segments need fetching. The head is skipped once the
+    # provider has shown it has nothing before the first stored session (a later listing)
+    segments = []
+    if start_day is not None and start_day < first_day and history_start(ticker) != first_day:
+        # The head runs through the first stored session so the provider confirms where its history starts
+        segments.append((pd.Timestamp(start_date).date(), head_segment_end(first_day)))
+    if end_day > last_day:
+        # The tail starts at the last stored session so a re-based history can be detected
+        segments.append((from_epoch_days([last_day])[0].date(), pd.Timestamp(end_date).date()))
+    return segments
+
+def head_segment_end(first_day):
+    """Exclusive end date of a head segment covering the first stored session"""
+    return (from_epoch_days([first_day])[0] + pd.Timedelta(days=1)).date()
+
+def history_rebased(prices, fetched):
+    """Whether fetched bars disagree with the stored adjusted closes on the sessions they share"""
+    for history in fetched:
+        _, stored, new = np.intersect1d(prices.dates, history.dates, assume_unique=True, return_indices=True)
+        if not np.allclose(np.asarray(history.adj_close)[new], np.asarray(prices.adj_close)[stored],
+                           rtol=ADJUSTMENT_TOLERANCE, atol=0):
+            return True
+    return False
+
+def store_fetched_history(ticker, fetched, replace=False):
+    """Merge fetched segments into the stored series (deduplicated on date) and save"""
+    prices = None if replace else read_prices(ticker)
+    merged = prices or EMPTY_PRICES
+    for history in fetched:
+        merged = merge_prices(merged, history)
+    
+    if len(merged.dates) == 0:
+        raise ValueError(f"No data returned for {ticker}")
+    if prices is None or len(merged.dates) != len(prices.dates):
+        write_prices(ticker, *merged)
+        if ticker in DEFAULT_TICKERS_LIST:
+            invalidate_market_calendar()
+    return merged
+
+def sync_fetched_history(ticker, segments, fetched, start_date, end_date, provider, replace=False):
+    """Store fetched segments, re-fetching the whole range instead if the provider re-based the history
+    
+    fetched holds one series per segment, in the same order. Returns whether the history was
+    re-based. Also records where the provider's history starts when a head fetch found nothing
+    before the first stored session, so later syncs stop asking for it: permanently when the
+    response confirms it by starting on that session, provisionally when it came back empty.
+    """
+    prices = None if replace else read_prices(ticker)
+    if prices is not None and len(prices.dates) and history_rebased(prices, fetched):
+        increment('history_rebased')
+        full_start = min(pd.Timestamp(start_date), from_epoch_days([prices.dates[0]])[0].tz_localize(None))
+        store_fetched_history(ticker, [provider.fetch_history(ticker, full_start.date(), end_date)], replace=True)
         return True
+    
+    merged = store_fetched_history(ticker, fetched, replace)
+    if prices is not None and len(prices.dates) and int(merged.dates[0]) == int(prices.dates[0]):
+        first_day = int(prices.dates[0])
+        for (_, seg_end), history in zip(segments, fetched):
+            if seg_end != head_segment_end(first_day):
+                continue
+            if len(history.dates) and int(history.dates[0]) == first_day:
+                mark_history_start(ticker, first_day)
+            elif len(history.dates) == 0:
+                mark_history_start(ticker, first_day, ttl=UNCONFIRMED_HISTORY_START_TTL)
+    return False
+
+@timed
+def download_stock_data(ticker, start_date, end_date, incremental=True, provider=None):
+    """Download stock data from the data provider and save to the price store"""
+    provider = provider or get_data_provider()
+    try:
+        with download_locks([ticker]):
+            segments = missing_segments(ticker, start_date, end_date, incremental)
+            if not segments:
+                return True  # We already have the data we need
+            
+            fetched = [provider.fetch_history(ticker, seg_start, seg_end) for seg_start, seg_end in segments]
+            sync_fetched_history(ticker, segments, fetched, start_date, end_date, provider, replace=not incremental)
+            return True
     except Exception as e:
         print(f"Error downloading data for {ticker}: {str(e)}")
         return False
 
-def check_and_download_default_data():
-    """Check and download data for default tickers if not already present"""
-    for ticker in DEFAULT_TICKERS_LIST:
-        download_stock_data(ticker, DEFAULT_START_DATE, DEFAULT_END_DATE)
-
-def download_pair_data(ticker1, ticker2, start_date, end_date):
-    """Download and process data for a pair of tickers"""
-    # Download data for both tickers if needed
-    download_stock_data(ticker1, start_date, end_date)
-    download_stock_data(ticker2, start_date, end_date)
-    
-    # Download data for both tickers
-    df1 = pd.read_csv(f'{DATA_FOLDER_PATH}/{ticker1}.csv')
-    df2 = pd.read_csv(f'{DATA_FOLDER_PATH}/{ticker2}.csv')
+@timed
+def download_bulk_data(tickers, start_date, end_date, max_workers=8, batch_size=None,
+                       incremental=True, provider=None):
+    """Download many tickers concurrently and return a per-ticker success/failure summary
     
-    # Convert dates to datetime with UTC
-    df1['date'] = pd.to_datetime(df1['date'], utc=True)
-    df2['date'] = pd.to_datetime(df2['date'], utc=True)
+    With batch_size set, tickers missing the same date segment are fetched together through
+    the provider's batch request in groups of up to batch_size; otherwise each ticker segment
+    is its own request. The summary also lists the tickers whose adjusted history was re-based
+    and downloaded again.
+    """
+    provider = provider or get_data_provider()
+    # Sessions asking for the same tickers at once share a single fetch
+    with download_locks(tickers):
+        failed = {}
+        segments = {}
+        for ticker in tickers:
+            try:
+                segments[ticker] = missing_segments(ticker, start_date, end_date, incremental)
+            except Exception as e:
+                failed[ticker] = str(e)
     
-    # Filter by date range
-    start_timestamp = pd.Timestamp(start_date).tz_localize('UTC')
-    end_timestamp = pd.Timestamp(end_date).tz_localize('UTC')
+        # Build one job per request to be made
+        jobs = []
+        if batch_size:
+            groups = {}
+            for ticker, ticker_segments in segments.items():
+                for segment in ticker_segments:
+                    groups.setdefault(segment, []).append(ticker)
+            for (seg_start, seg_end), group in groups.items():
+                for i in range(0, len(group), batch_size):
+                    jobs.append((group[i:i + batch_size], seg_start, seg_end))
+        else:
+            for ticker, ticker_segments in segments.items():
+                for seg_start, seg_end in ticker_segments:
+                    jobs.append(([ticker], seg_start, seg_end))
     
-    mask1 = (df1['date'] >= start_timestamp) & (df1['date'] <= end_timestamp)
-    mask2 = (df2['date'] >= start_timestamp) & (df2['date'] <= end_timestamp)
+        def run_job(job):
+            job_tickers, seg_start, seg_end = job
+            if batch_size:
+                return provider.fetch_history_batch(job_tickers, seg_start, seg_end)
+            return {job_tickers[0]: provider.fetch_history(job_tickers[0], seg_start, seg_end)}
     
-    df1 = df1.loc[mask1]
-    df2 = df2.loc[mask2]
+        # Network fetches run concurrently; results are collected per ticker and segment
+        fetched = {ticker: {} for ticker in segments}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(run_job, job): job for job in jobs}
+            for future in as_completed(futures):
+                try:
+                    _, seg_start, seg_end = futures[future]
+                    for ticker, history in future.result().items():
+                        fetched[ticker][(seg_start, seg_end)] = history
+                except Exception as e:
+                    for ticker in futures[future][0]:
+                        failed[ticker] = str(e)
     
-    # Add ticker suffix to columns
-    df1 = df1.add_suffix(f'_{ticker1}')
-    df2 = df2.add_suffix(f'_{ticker2}')
+        # Writes happen once per ticker after all its segments have arrived
+        succeeded = []
+        rebased = []
+        for ticker, ticker_segments in segments.items():
+            if ticker in failed:
+                continue
+            try:
+                ticker_fetched = [fetched[ticker].get(segment, EMPTY_PRICES) for segment in ticker_segments]
+                if ticker_segments and sync_fetched_history(ticker, ticker_segments, ticker_fetched, start_date,
+                                                            end_date, provider, replace=not incremental):
+                    rebased.append(ticker)
+                succeeded.append(ticker)
+            except Exception as e:
+                failed[ticker] = str(e)
     
-    # Merge the dataframes on date
-    df1 = df1.rename(columns={f'date_{ticker1}': 'date'})
-    df2 = df2.rename(columns={f'date_{ticker2}': 'date'})
+    return DownloadSummary(succeeded, failed, rebased)
+
+@timed
+def check_and_download_default_data():
+    """Check and download data for default tickers if not already present"""
+    # Convert any legacy CSV files before checking coverage
+    if migrate_csv_store():
+        invalidate_market_calendar()
+    return download_bulk_data(DEFAULT_TICKERS_LIST, DEFAULT_START_DATE, DEFAULT_END_DATE)
+
+@timed
+def load_panel(tickers, start_date, end_date, download=True):
+    """Download tickers if needed and return their cached union-dated PricePanel
     
-    merged_df = pd.merge(df1, df2, on='date', how='inner')
+    Tickers whose download failed are left out. With download=False only the local store
+    is read, and tickers without stored data in the range are left out.
+    """
+    if download:
+        failed = download_bulk_data(tickers, start_date, end_date).failed
+        tickers = [ticker for ticker in tickers if ticker not in failed]
+    return get_panel(tickers, start_date, end_date)
+
+@timed
+def download_pair_data(ticker1, ticker2, start_date, end_date, panel=None, download=True):
+    """Download and process data for a pair of tickers
     
-    return merged_df
+    With a panel that already holds both tickers the pair is a column slice of it.
+    """
+    if panel is None or ticker1 not in panel or ticker2 not in panel:
+        panel = load_panel([ticker1, ticker2], start_date, end_date, download)
+    if ticker1 not in panel or ticker2 not in panel:
+        return pd.DataFrame(columns=['date', f'adj_close_{ticker1}', f'vol_{ticker1}',
+                                     f'adj_close_{ticker2}', f'vol_{ticker2}'])
+    return panel.pair_frame(ticker1, ticker2)
 
+@timed
+def load_price_matrix(tickers, start_date, end_date, policy='intersect', download=True):
+    """Load date-aligned adjusted closes for many tickers as one dates x tickers frame"""
+    panel = load_panel(tickers, start_date, end_date, download)
+    if not panel.tickers:
+        return pd.DataFrame()
+    return panel.align(policy).to_frame()
+
+@timed
 def is_valid_ticker(ticker):
-    """Check if ticker exists on Yahoo Finance"""
-    try:
-        stock = yf.Ticker(ticker)
-        # Try to get info, if it fails the ticker doesn't exist
-        info = stock.info
-        return True
-    except:
-        return False 
\ No newline at end of file
+    """Check if ticker exists at the data provider"""
+    return get_data_provider().is_valid_ticker(ticker)
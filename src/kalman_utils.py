@@ -0,0 +1,159 @@
+import os
+import threading
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from src.constants import DATA_FOLDER_PATH
+
+# State noise as a fraction of the observation noise (higher adapts faster)
+KALMAN_DELTA = 1e-4
+# Observation noise variance of y around beta * x + alpha
+KALMAN_OBS_VAR = 1e-3
+# Prior variance of the initial beta and alpha
+KALMAN_INITIAL_VAR = 1.0
+# Last filtered path and state of each pair, so a restarted process resumes instead of re-filtering
+KALMAN_STATE_FOLDER = f'{DATA_FOLDER_PATH}/kalman'
+
+# beta/alpha are the filtered estimates and p00/p01/p11 the entries of their 2x2
+# covariance; all have one value per pair. first_date/last_date and last_y/last_x
+# identify the bars a streamed single-pair state has absorbed.
+KalmanState = namedtuple('KalmanState', ['beta', 'alpha', 'p00', 'p01', 'p11', 'first_date', 'last_date',
+                                         'last_y', 'last_x', 'delta', 'obs_var'])
+KalmanResult = namedtuple('KalmanResult', ['beta', 'alpha', 'spread', 'zscore', 'state'])
+
+def init_kalman_state(n_pairs=1, delta=KALMAN_DELTA, obs_var=KALMAN_OBS_VAR):
+    """Uninformative filter state for n_pairs pairs"""
+    zeros = np.zeros(n_pairs)
+    return KalmanState(zeros, zeros.copy(), np.full(n_pairs, KALMAN_INITIAL_VAR), zeros.copy(),
+                       np.full(n_pairs, KALMAN_INITIAL_VAR), None, None, None, None, delta, obs_var)
+
+def kalman_step(state, y, x):
+    """One O(1) filter update of every pair from its next bar
+
+    Returns the new state, the one-step forecast error (the spread) and its variance.
+    Pairs whose bar is missing keep their state and get a NaN spread.
+    """
+    beta, alpha, p00, p01, p11 = state.beta, state.alpha, state.p00, state.p01, state.p11
+
+    # Predict: beta and alpha follow a random walk
+    q = state.delta / (1 - state.delta)
+    p00, p11 = p00 + q, p11 + q
+
+    # Update with the observation y = beta * x + alpha + noise
+    error = y - (beta * x + alpha)
+    variance = x * x * p00 + 2 * x * p01 + p11 + state.obs_var
+    gain0 = (x * p00 + p01) / variance
+    gain1 = (x * p01 + p11) / variance
+    h0, h1 = x * p00 + p01, x * p01 + p11
+
+    valid = ~(np.isnan(y) | np.isnan(x))
+    new_state = state._replace(
+        beta=np.where(valid, beta + gain0 * error, state.beta),
+        alpha=np.where(valid, alpha + gain1 * error, state.alpha),
+        p00=np.where(valid, p00 - gain0 * h0, state.p00),
+        p01=np.where(valid, p01 - gain0 * h1, state.p01),
+        p11=np.where(valid, p11 - gain1 * h1, state.p11)
+    )
+    return new_state, error, variance
+
+def kalman_filter(y, x, state=None, delta=KALMAN_DELTA, obs_var=KALMAN_OBS_VAR):
+    """Time-varying hedge ratio of y on x, continuing from state if given
+
+    y and x are 1-D for one pair or (bars x pairs) to filter many pairs at once; each bar
+    costs one vectorized kalman_step regardless of history length. The spread is the
+    one-step forecast error y - (beta * x + alpha) and the z-score divides it by its
+    forecast standard deviation.
+    """
+    y = np.asarray(y, dtype=float)
+    x = np.asarray(x, dtype=float)
+    single = y.ndim == 1
+    y2, x2 = (y[:, None], x[:, None]) if single else (y, x)
+    n_bars, n_pairs = y2.shape
+    state = init_kalman_state(n_pairs, delta, obs_var) if state is None else state
+
+    beta = np.empty((n_bars, n_pairs))
+    alpha = np.empty((n_bars, n_pairs))
+    spread = np.empty((n_bars, n_pairs))
+    variance = np.empty((n_bars, n_pairs))
+    with np.errstate(invalid='ignore'):
+        for t in range(n_bars):
+            state, spread[t], variance[t] = kalman_step(state, y2[t], x2[t])
+            beta[t], alpha[t] = state.beta, state.alpha
+        zscore = spread / np.sqrt(variance)
+
+    if single:
+        beta, alpha, spread, zscore = beta[:, 0], alpha[:, 0], spread[:, 0], zscore[:, 0]
+    return KalmanResult(beta, alpha, spread, zscore, state)
+
+def _continues(previous, pair_data, ticker1, ticker2, delta, obs_var):
+    """Whether pair_data extends the bars behind a previous update_kalman_hedge result unchanged"""
+    if previous is None or (previous.state.delta, previous.state.obs_var) != (delta, obs_var):
+        return False
+    n = len(previous.beta)
+    if n == 0 or len(pair_data) < n:
+        return False
+    state = previous.state
+    return (pair_data['date'].iloc[0] == state.first_date and pair_data['date'].iloc[n - 1] == state.last_date
+            and pair_data[f'adj_close_{ticker1}'].iloc[n - 1] == state.last_y
+            and pair_data[f'adj_close_{ticker2}'].iloc[n - 1] == state.last_x)
+
+def update_kalman_hedge(pair_data, ticker1, ticker2, previous=None, delta=KALMAN_DELTA, obs_var=KALMAN_OBS_VAR):
+    """Kalman hedge ratio and z-score of every bar of pair_data, resuming from a previous result
+    
+    previous is what this returned for an earlier pair_data of the same pair. When pair_data
+    only appends bars to it (same first date, unrevised last bar), just the new bars are
+    filtered, in O(1) each; otherwise the filter restarts from the first bar.
+    """
+    if not _continues(previous, pair_data, ticker1, ticker2, delta, obs_var):
+        previous = None
+    start = len(previous.beta) if previous is not None else 0
+    y = pair_data[f'adj_close_{ticker1}'].to_numpy(dtype=float)[start:]
+    x = pair_data[f'adj_close_{ticker2}'].to_numpy(dtype=float)[start:]
+    if previous is not None and not len(y):
+        return previous
+
+    result = kalman_filter(y, x, previous.state if previous is not None else None, delta, obs_var)
+    if previous is not None:
+        result = KalmanResult(*(np.concatenate([old, new]) for old, new in zip(previous[:4], result[:4])),
+                              result.state)
+    if len(pair_data):
+        result = result._replace(state=result.state._replace(
+            first_date=pair_data['date'].iloc[0], last_date=pair_data['date'].iloc[-1],
+            last_y=pair_data[f'adj_close_{ticker1}'].iloc[-1], last_x=pair_data[f'adj_close_{ticker2}'].iloc[-1]
+        ))
+    return result
+
+def kalman_state_path(ticker1, ticker2):
+    """Path of a pair's persisted filter result"""
+    return f'{KALMAN_STATE_FOLDER}/{ticker1}_{ticker2}.npz'
+
+def save_kalman_result(ticker1, ticker2, result, versions):
+    """Atomically persist a pair's update_kalman_hedge result along with the data versions it was run on"""
+    state = result.state
+    os.makedirs(KALMAN_STATE_FOLDER, exist_ok=True)
+    path = kalman_state_path(ticker1, ticker2)
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, path=np.stack(result[:4]), filter=np.stack([state.beta, state.alpha, state.p00,
+                                                                 state.p01, state.p11]),
+                 dates=np.array([str(state.first_date), str(state.last_date)]),
+                 params=np.array([state.last_y, state.last_x, state.delta, state.obs_var], dtype=float),
+                 versions=np.array([-1 if v is None else v for v in versions], dtype=np.int64))
+    os.replace(tmp_path, path)
+
+def load_kalman_result(ticker1, ticker2, first_date, versions):
+    """A pair's persisted result, or None unless it starts on first_date and the data versions match"""
+    try:
+        with np.load(kalman_state_path(ticker1, ticker2)) as saved:
+            if list(saved['versions']) != [-1 if v is None else v for v in versions] or \
+                    pd.Timestamp(str(saved['dates'][0])) != first_date:
+                return None
+            beta, alpha, spread, zscore = saved['path']
+            last_y, last_x, delta, obs_var = saved['params']
+            state = KalmanState(*saved['filter'], pd.Timestamp(str(saved['dates'][0])),
+                                pd.Timestamp(str(saved['dates'][1])), last_y, last_x, delta, obs_var)
+            return KalmanResult(beta, alpha, spread, zscore, state)
+    except (FileNotFoundError, KeyError, ValueError):
+        return None
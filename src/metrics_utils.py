@@ -0,0 +1,131 @@
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Prefix of every metric name in the Prometheus export
+METRICS_PREFIX = 'pairs'
+# When set, metrics are written to this file after every rerun (.json for JSON, otherwise Prometheus text)
+METRICS_EXPORT_PATH = os.environ.get('METRICS_EXPORT_PATH')
+
+# Process-wide aggregates, shared by every session and worker thread
+_lock = threading.Lock()
+# span name -> [calls, total seconds, slowest call in seconds]
+_spans = {}
+# (counter name, sorted label items) -> value
+_counters = {}
+
+def increment(name, value=1, **labels):
+    """Add value to a counter, e.g. increment('cache_hits', cache='stats')"""
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def record_span(name, seconds):
+    """Add one timed call to a span's totals"""
+    with _lock:
+        totals = _spans.setdefault(name, [0, 0.0, 0.0])
+        totals[0] += 1
+        totals[1] += seconds
+        totals[2] = max(totals[2], seconds)
+
+@contextmanager
+def span(name):
+    """Time the enclosed block under a span name"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - start)
+
+def timed(func):
+    """Decorator timing every call of a function as the span '<module>.<function>'"""
+    name = f"{func.__module__.rsplit('.', 1)[-1]}.{func.__qualname__}"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            record_span(name, time.perf_counter() - start)
+    return wrapper
+
+def snapshot():
+    """Copy of the current span totals and counters"""
+    with _lock:
+        return {
+            'spans': {name: tuple(totals) for name, totals in _spans.items()},
+            'counters': dict(_counters)
+        }
+
+def diff_snapshots(before, after):
+    """What happened between two snapshots: span calls/seconds and counter increases
+
+    Aggregates are process-wide, so activity of other sessions in the same interval is included.
+    """
+    spans = {}
+    for name, (calls, seconds, _) in after['spans'].items():
+        old_calls, old_seconds, _ = before['spans'].get(name, (0, 0.0, 0.0))
+        if calls > old_calls:
+            spans[name] = (calls - old_calls, seconds - old_seconds)
+    counters = {key: value - before['counters'].get(key, 0) for key, value in after['counters'].items()
+                if value != before['counters'].get(key, 0)}
+    return {'spans': spans, 'counters': counters}
+
+def format_metric(name, labels):
+    """Prometheus-style name{label="value"} of a counter key"""
+    if not labels:
+        return name
+    return name + '{' + ','.join(f'{label}="{value}"' for label, value in labels) + '}'
+
+def to_prometheus(snap):
+    """Snapshot in the Prometheus text exposition format"""
+    lines = []
+    span_metrics = [
+        ('span_calls_total', 'counter', 0),
+        ('span_seconds_total', 'counter', 1),
+        ('span_seconds_max', 'gauge', 2)
+    ]
+    for suffix, kind, index in span_metrics:
+        lines.append(f'# TYPE {METRICS_PREFIX}_{suffix} {kind}')
+        for name, totals in sorted(snap['spans'].items()):
+            lines.append(f'{METRICS_PREFIX}_{suffix}{{span="{name}"}} {totals[index]}')
+
+    names = sorted({name for name, _ in snap['counters']})
+    for name in names:
+        lines.append(f'# TYPE {METRICS_PREFIX}_{name}_total counter')
+        for (counter, labels), value in sorted(snap['counters'].items()):
+            if counter == name:
+                lines.append(f'{format_metric(f"{METRICS_PREFIX}_{name}_total", labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+def to_json(snap):
+    """Snapshot as a JSON document"""
+    return json.dumps({
+        'timestamp': time.time(),
+        'spans': {name: {'calls': calls, 'seconds_total': seconds, 'seconds_max': slowest}
+                  for name, (calls, seconds, slowest) in sorted(snap['spans'].items())},
+        'counters': [{'name': name, 'labels': dict(labels), 'value': value}
+                     for (name, labels), value in sorted(snap['counters'].items())]
+    }, indent=2)
+
+def export_metrics(path):
+    """Atomically write the current metrics to path, as JSON for .json files and Prometheus text otherwise"""
+    snap = snapshot()
+    text = to_json(snap) if path.endswith('.json') else to_prometheus(snap)
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        with open(tmp_path, 'w') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Error exporting metrics to {path}: {str(e)}")
+
+def reset_metrics():
+    """Clear every span and counter"""
+    with _lock:
+        _spans.clear()
+        _counters.clear()
@@ -0,0 +1,146 @@
+import numpy as np
+import pandas as pd
+
+from src.cache_utils import LRUCache, get_data_version
+from src.store_utils import (
+    PriceSeries, read_prices, slice_prices, from_epoch_days, add_write_listener, EMPTY_PRICES
+)
+
+# Missing-data policies understood by PricePanel.align
+PANEL_POLICIES = ('intersect', 'ffill', 'drop')
+# Under the 'drop' policy, tickers missing more than this fraction of dates are removed
+DEFAULT_MAX_MISSING = 0.05
+# Memory budget for cached panels
+PANEL_CACHE_BYTES = 256 * 1024 * 1024
+# Memory budget for the per-ticker price arrays shared by every session
+PRICE_CACHE_BYTES = 256 * 1024 * 1024
+
+class PricePanel:
+    """Date-aligned price and volume matrices (dates x tickers) for a set of tickers
+
+    Rows are the union of every ticker's dates (epoch days), with NaN where a ticker
+    has no bar. The arrays are read-only because panels are shared through the cache.
+    """
+
+    def __init__(self, dates, tickers, adj_close, vol):
+        self.dates = dates
+        self.tickers = list(tickers)
+        self.adj_close = adj_close
+        self.vol = vol
+        self._columns = {ticker: i for i, ticker in enumerate(self.tickers)}
+        for array in (self.dates, self.adj_close, self.vol):
+            array.flags.writeable = False
+
+    def __contains__(self, ticker):
+        return ticker in self._columns
+
+    @property
+    def nbytes(self):
+        return self.dates.nbytes + self.adj_close.nbytes + self.vol.nbytes
+
+    def align(self, policy='intersect', max_missing=DEFAULT_MAX_MISSING):
+        """Panel without missing values under a missing-data policy
+
+        intersect: keep only the dates every ticker trades on
+        ffill:     carry each ticker's last price over its gaps, starting once all tickers have data
+        drop:      remove tickers missing more than max_missing of the dates, then intersect
+        """
+        if policy not in PANEL_POLICIES:
+            raise ValueError(f"Unknown missing-data policy '{policy}'")
+
+        missing = np.isnan(self.adj_close)
+        if policy == 'drop':
+            keep = missing.mean(axis=0) <= max_missing if len(self.dates) else np.ones(len(self.tickers), bool)
+            panel = PricePanel(self.dates, np.asarray(self.tickers, dtype=object)[keep],
+                               self.adj_close[:, keep], self.vol[:, keep])
+            return panel.align('intersect')
+
+        if policy == 'intersect':
+            rows = ~missing.any(axis=1)
+            return PricePanel(self.dates[rows], self.tickers, self.adj_close[rows], self.vol[rows])
+
+        # Forward fill: row index of each column's latest observation at or before each row
+        rows = np.arange(len(self.dates))[:, None]
+        last_seen = np.maximum.accumulate(np.where(missing, 0, rows), axis=0)
+        adj_close = np.take_along_axis(self.adj_close, last_seen, axis=0)
+        vol = np.take_along_axis(self.vol, last_seen, axis=0)
+        vol[missing] = 0.0
+        started = ~np.isnan(adj_close).any(axis=1)
+        return PricePanel(self.dates[started], self.tickers, adj_close[started], vol[started])
+
+    def to_frame(self):
+        """Adjusted closes as a dates x tickers DataFrame"""
+        return pd.DataFrame(self.adj_close, index=from_epoch_days(self.dates), columns=self.tickers)
+
+    def pair_frame(self, ticker1, ticker2):
+        """Pair view in the date/adj_close_{ticker}/vol_{ticker} layout on the dates both trade"""
+        i, j = self._columns[ticker1], self._columns[ticker2]
+        rows = ~(np.isnan(self.adj_close[:, i]) | np.isnan(self.adj_close[:, j]))
+        return pd.DataFrame({
+            'date': from_epoch_days(self.dates[rows]),
+            f'adj_close_{ticker1}': self.adj_close[rows, i],
+            f'vol_{ticker1}': self.vol[rows, i],
+            f'adj_close_{ticker2}': self.adj_close[rows, j],
+            f'vol_{ticker2}': self.vol[rows, j]
+        })
+
+_price_cache = LRUCache(max_bytes=PRICE_CACHE_BYTES, name='prices',
+                        sizeof=lambda prices: sum(array.nbytes for array in prices))
+
+# Keys are (ticker, data version), so a rewrite also evicts the ticker's stale arrays
+add_write_listener(lambda ticker: _price_cache.discard_where(lambda key: key[0] == ticker))
+
+def load_prices(ticker):
+    """Read a ticker's whole stored series into read-only in-memory arrays"""
+    prices = read_prices(ticker) or EMPTY_PRICES
+    arrays = [np.array(array) for array in prices]
+    for array in arrays:
+        array.flags.writeable = False
+    return PriceSeries(*arrays)
+
+def get_prices(ticker):
+    """Stored prices of a ticker from the process-wide cache, shared by every session
+    
+    Concurrent misses of the same ticker trigger one store read.
+    """
+    return _price_cache.get_or_load((ticker, get_data_version(ticker)), lambda: load_prices(ticker))
+
+def build_panel(tickers, start_date, end_date):
+    """Read stored prices for tickers into one union-dated panel in a single pass
+
+    Tickers with no stored data in the range are left out.
+    """
+    series = {}
+    for ticker in dict.fromkeys(tickers):
+        prices = slice_prices(get_prices(ticker), start_date, end_date)
+        if len(prices.dates):
+            series[ticker] = prices
+
+    dates = np.unique(np.concatenate([np.asarray(prices.dates) for prices in series.values()])) \
+        if series else np.empty(0, dtype=np.int64)
+    adj_close = np.full((len(dates), len(series)), np.nan)
+    vol = np.full((len(dates), len(series)), np.nan)
+    for j, prices in enumerate(series.values()):
+        rows = np.searchsorted(dates, prices.dates)
+        adj_close[rows, j] = prices.adj_close
+        vol[rows, j] = prices.vol
+    return PricePanel(dates, list(series), adj_close, vol)
+
+_panel_cache = LRUCache(max_bytes=PANEL_CACHE_BYTES, sizeof=lambda panel: panel.nbytes, name='panel')
+
+# Keys start with the tuple of tickers, so a rewrite evicts every panel containing that ticker
+add_write_listener(lambda ticker: _panel_cache.discard_where(lambda key: ticker in key[0]))
+
+def get_panel(tickers, start_date, end_date):
+    """Cached build_panel, keyed by tickers, date range and data version
+    
+    Sessions requesting the same panel at the same time share one build.
+    """
+    tickers = tuple(dict.fromkeys(tickers))
+    key = (tickers, str(start_date), str(end_date), tuple(get_data_version(ticker) for ticker in tickers))
+    return _panel_cache.get_or_load(key, lambda: build_panel(tickers, start_date, end_date))
+
+def clear_panel_cache():
+    """Drop every cached panel and price array"""
+    _panel_cache.clear()
+    _price_cache.clear()
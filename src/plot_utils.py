@@ -1,30 +1,146 @@
+import numpy as np
+import pandas as pd
 import plotly.graph_objects as go
+from src.cache_utils import LRUCache, get_data_version, get_kalman_hedge
+from src.constants import DEFAULT_ROLLING_WINDOW
 from src.data_utils import download_stock_data
-import pandas as pd
-from src.constants import DATA_FOLDER_PATH
+from src.metrics_utils import span, timed
+from src.panel_utils import get_prices
+from src.risk_utils import RISK_METHODS, RISK_METHOD_NAMES
+from src.rolling_utils import calculate_rolling_statistics
+from src.store_utils import slice_prices, prices_to_frame, add_write_listener
+
+# Downsampling targets roughly one point per horizontal pixel of the chart
+DEFAULT_PLOT_WIDTH = 1200
+# Traces rendering more points than this (max_points=None or a large max_points) use WebGL
+SCATTERGL_THRESHOLD = 5000
+# Tick labels are hidden on heatmaps with more tickers than this
+HEATMAP_LABEL_LIMIT = 60
+# Memory budget for cached figures, measured by their serialized JSON size
+FIGURE_CACHE_BYTES = 64 * 1024 * 1024
+
+# Cached entries are (figure, figure JSON); keys start with the tuple of tickers plotted
+_figure_cache = LRUCache(max_bytes=FIGURE_CACHE_BYTES, sizeof=lambda entry: 2 * len(entry[1]),
+                         name='figure')
+
+# Figures of a ticker are stale as soon as its stored prices change
+add_write_listener(lambda ticker: _figure_cache.discard_where(lambda key: ticker in key[0]))
+
+def lttb_indices(x, y, n_out):
+    """Indices of the points kept by Largest-Triangle-Three-Buckets downsampling"""
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    
+    # Interior points split into n_out - 2 buckets; first and last points always kept
+    edges = (np.floor(np.arange(n_out - 1) * (n - 2) / (n_out - 2)) + 1).astype(int)
+    edges[-1] = n - 1
+    counts = np.diff(edges)
+    bucket_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / counts
+    bucket_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / counts
+    next_x = np.append(bucket_x[1:], x[-1])
+    next_y = np.append(bucket_y[1:], y[-1])
+    
+    # Each pick forms the largest triangle with the previous pick and the next bucket's mean
+    indices = np.empty(n_out, dtype=int)
+    indices[0], indices[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs((x[a] - next_x[i]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y[i] - y[a]))
+        a = lo + int(np.argmax(area))
+        indices[i + 1] = a
+    return indices
+
+def minmax_indices(y, n_out):
+    """Indices of each bucket's minimum and maximum, preserving spikes"""
+    n = len(y)
+    n_buckets = n_out // 2
+    if n_out >= n or n_buckets < 1:
+        return np.arange(n)
+    
+    size = n // n_buckets
+    body = y[:size * n_buckets].reshape(n_buckets, size)
+    offsets = np.arange(n_buckets) * size
+    picks = [offsets + body.argmin(axis=1), offsets + body.argmax(axis=1)]
+    if size * n_buckets < n:
+        tail = y[size * n_buckets:]
+        picks.append(size * n_buckets + np.array([tail.argmin(), tail.argmax()]))
+    return np.unique(np.concatenate(picks + [[0, n - 1]]))
+
+@timed
+def downsample(dates, values, max_points=DEFAULT_PLOT_WIDTH, method='lttb'):
+    """Reduce a date/value series to about max_points points, dropping NaN and inf values"""
+    dates = pd.DatetimeIndex(dates)
+    values = np.asarray(values, dtype=float)
+    valid = np.isfinite(values)
+    dates, values = dates[valid], values[valid]
+    if max_points is None or len(values) <= max_points:
+        return dates, values
+    
+    if method == 'minmax':
+        indices = minmax_indices(values, max_points)
+    else:
+        indices = lttb_indices(dates.asi8.astype(float), values, max_points)
+    return dates[indices], values[indices]
 
-def create_pair_plot(pair_data, ticker1, ticker2):
-    """Create a plot for a pair of stocks"""
+def _line_trace(dates, values, max_points, method, **trace_kwargs):
+    """Line trace of a downsampled series, switching to WebGL when many points are rendered"""
+    x, y = downsample(dates, values, max_points, method)
+    trace_type = go.Scattergl if len(y) > SCATTERGL_THRESHOLD else go.Scatter
+    return trace_type(x=x, y=y, mode='lines', **trace_kwargs)
+
+@timed
+def create_pair_plot(pair_data, ticker1, ticker2, rolling=None, overlay=None, overlay_name=None,
+                     x_range=None, max_points=DEFAULT_PLOT_WIDTH, method='lttb'):
+    """Create a plot for a pair of stocks, optionally overlaying a rolling statistic
+    
+    Each series is downsampled to about max_points points. With x_range (start, end) only
+    that window is drawn, so zooming in re-resolves full detail.
+    """
+    if x_range is not None:
+        start, end = pd.Timestamp(x_range[0], tz='UTC'), pd.Timestamp(x_range[1], tz='UTC')
+        pair_data = pair_data.loc[(pair_data['date'] >= start) & (pair_data['date'] <= end)]
+        if rolling is not None:
+            rolling = rolling.loc[(rolling['date'] >= start) & (rolling['date'] <= end)]
+    
     fig = go.Figure()
     
     # Add first ticker
-    fig.add_trace(go.Scatter(
-        x=pair_data['date'],
-        y=pair_data[f'adj_close_{ticker1}'],
-        mode='lines',
+    fig.add_trace(_line_trace(
+        pair_data['date'],
+        pair_data[f'adj_close_{ticker1}'],
+        max_points, method,
         name=f'{ticker1}',
         line=dict(color='#2ecc71', width=2)
     ))
     
     # Add second ticker
-    fig.add_trace(go.Scatter(
-        x=pair_data['date'],
-        y=pair_data[f'adj_close_{ticker2}'],
-        mode='lines',
+    fig.add_trace(_line_trace(
+        pair_data['date'],
+        pair_data[f'adj_close_{ticker2}'],
+        max_points, method,
         name=f'{ticker2}',
         line=dict(color='#e74c3c', width=2)
     ))
 
+    # Rolling statistic on a secondary axis
+    if rolling is not None and overlay is not None:
+        fig.add_trace(_line_trace(
+            rolling['date'],
+            rolling[overlay],
+            max_points, method,
+            name=overlay_name or overlay,
+            line=dict(color='#3498db', width=1, dash='dot'),
+            yaxis='y2'
+        ))
+        fig.update_layout(yaxis2=dict(
+            title=overlay_name or overlay,
+            overlaying='y',
+            side='right',
+            showgrid=False
+        ))
+
     fig.update_layout(
         template="plotly_dark",
         paper_bgcolor='rgba(0,0,0,0)',
@@ -44,27 +160,23 @@ def create_pair_plot(pair_data, ticker1, ticker2):
     
     return fig
 
-def create_single_plot(ticker, start_date, end_date):
+@timed
+def create_single_plot(ticker, start_date, end_date, max_points=DEFAULT_PLOT_WIDTH, method='lttb',
+                       download=True):
     """Create a plot for a single stock"""
     # Download data if needed
-    download_stock_data(ticker, start_date, end_date)
-    
-    # Read the data
-    df = pd.read_csv(f'{DATA_FOLDER_PATH}/{ticker}.csv')
-    df['date'] = pd.to_datetime(df['date'], utc=True)
+    if download:
+        download_stock_data(ticker, start_date, end_date)
     
-    # Filter data based on selected date range
-    start_timestamp = pd.Timestamp(start_date).tz_localize('UTC')
-    end_timestamp = pd.Timestamp(end_date).tz_localize('UTC')
-    mask = (df['date'] >= start_timestamp) & (df['date'] <= end_timestamp)
-    df = df.loc[mask]
+    # Read the selected date range from the shared price cache
+    df = prices_to_frame(slice_prices(get_prices(ticker), start_date, end_date))
     
     # Create a line graph using Plotly
     fig = go.Figure()
-    fig.add_trace(go.Scatter(
-        x=df['date'],
-        y=df['adj_close'],
-        mode='lines',
+    fig.add_trace(_line_trace(
+        df['date'],
+        df['adj_close'],
+        max_points, method,
         name=f'{ticker}',
         line=dict(color='#2ecc71', width=2)
     ))
@@ -86,4 +198,122 @@ def create_single_plot(ticker, start_date, end_date):
         )
     )
     
-    return fig 
\ No newline at end of file
+    return fig 
+
+@timed
+def create_heatmap(matrix, title, colorscale='RdBu', zmin=-1, zmax=1, reverse_scale=False):
+    """Create a single heatmap trace of a square tickers x tickers matrix
+    
+    Values are sent as rounded float32 to keep the figure small for large universes.
+    """
+    tickers = list(matrix.index)
+    values = np.round(matrix.to_numpy(dtype=np.float32), 4)
+    show_labels = len(tickers) <= HEATMAP_LABEL_LIMIT
+    
+    fig = go.Figure(go.Heatmap(
+        z=values,
+        x=tickers,
+        y=tickers,
+        colorscale=colorscale,
+        reversescale=reverse_scale,
+        zmin=zmin,
+        zmax=zmax,
+        colorbar=dict(title=title),
+        hovertemplate='%{y} / %{x}<br>' + title + ': %{z:.4f}<extra></extra>'
+    ))
+
+    fig.update_layout(
+        template="plotly_dark",
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        margin=dict(l=0, r=0, t=0, b=0),
+        height=600,
+        xaxis=dict(showticklabels=show_labels, tickangle=-90),
+        yaxis=dict(showticklabels=show_labels, autorange='reversed')
+    )
+    
+    return fig
+
+@timed
+def create_risk_plot(report, horizon=None):
+    """VaR (solid) and CVaR (dashed) of each risk method against the holding period"""
+    colors = {'historical': '#2ecc71', 'filtered_historical': '#3498db', 'monte_carlo': '#ff4b4b'}
+    fig = go.Figure()
+    for method in RISK_METHODS:
+        if f'{method}_var' not in report:
+            continue
+        name = RISK_METHOD_NAMES[method]
+        fig.add_trace(go.Scatter(x=report.index, y=report[f'{method}_var'], mode='lines',
+                                 name=f'{name} VaR', line=dict(color=colors[method], width=2)))
+        fig.add_trace(go.Scatter(x=report.index, y=report[f'{method}_cvar'], mode='lines',
+                                 name=f'{name} CVaR', line=dict(color=colors[method], width=2, dash='dash')))
+    if horizon is not None:
+        fig.add_vline(x=horizon, line_width=1, line_dash='dot', line_color='gray')
+
+    fig.update_layout(
+        template="plotly_dark",
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        margin=dict(l=0, r=0, t=0, b=0),
+        height=350,
+        xaxis_title="Holding Period (days)",
+        yaxis_title="Return on Gross Notional (%)",
+        legend=dict(orientation='h', y=1.02, yanchor='bottom')
+    )
+    return fig
+
+def _cached_figure(make_key, build, as_json):
+    """Return a cached figure (or its JSON), building and caching it on a miss
+    
+    The key is made again after building, since building may download and so bump the data version.
+    """
+    entry = _figure_cache.get(make_key())
+    if entry is None:
+        fig = build()
+        with span('plot_utils.to_json'):
+            entry = (fig, fig.to_json())
+        _figure_cache.put(make_key(), entry)
+    return entry[1] if as_json else entry[0]
+
+@timed
+def get_pair_plot(pair_data, ticker1, ticker2, overlay=None, overlay_name=None,
+                  window=DEFAULT_ROLLING_WINDOW, x_range=None, max_points=DEFAULT_PLOT_WIDTH,
+                  method='lttb', as_json=False):
+    """Cached create_pair_plot, keyed by tickers, date range, data version and plot options
+    
+    The rolling overlay is only computed when the figure is not already cached.
+    """
+    if pair_data.empty:
+        return create_pair_plot(pair_data, ticker1, ticker2, max_points=max_points, method=method)
+    
+    def make_key():
+        return ((ticker1, ticker2), pair_data['date'].iloc[0], pair_data['date'].iloc[-1], len(pair_data),
+                get_data_version(ticker1), get_data_version(ticker2),
+                overlay, overlay_name, window, x_range, max_points, method)
+    
+    def build():
+        rolling = None
+        if overlay is not None:
+            rolling = calculate_rolling_statistics(pair_data, ticker1, ticker2, window=window)
+            if overlay.startswith('kalman_'):
+                # The filter resumes from the state behind the last figure of this pair
+                kalman = get_kalman_hedge(pair_data, ticker1, ticker2)
+                rolling['kalman_beta'] = kalman.beta
+                rolling['kalman_zscore'] = kalman.zscore
+        return create_pair_plot(pair_data, ticker1, ticker2, rolling=rolling, overlay=overlay,
+                                overlay_name=overlay_name, x_range=x_range,
+                                max_points=max_points, method=method)
+    return _cached_figure(make_key, build, as_json)
+
+@timed
+def get_single_plot(ticker, start_date, end_date, max_points=DEFAULT_PLOT_WIDTH, method='lttb',
+                    as_json=False, download=True):
+    """Cached create_single_plot; a hit skips the download check and the store read"""
+    def make_key():
+        return ((ticker,), str(start_date), str(end_date), get_data_version(ticker), max_points, method)
+    return _cached_figure(make_key, lambda: create_single_plot(ticker, start_date, end_date,
+                                                          max_points, method, download), as_json)
+
+def clear_figure_cache():
+    """Drop every cached figure"""
+    _figure_cache.clear()
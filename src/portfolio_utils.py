@@ -0,0 +1,220 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+
+from src.backtest_utils import TRADING_DAYS
+from src.metrics_utils import timed
+from src.risk_utils import DEFAULT_CONFIDENCE
+from src.store_utils import from_epoch_days
+
+PortfolioPair = namedtuple('PortfolioPair', ['ticker1', 'ticker2', 'weight', 'beta'])
+
+def pair_label(ticker1, ticker2):
+    return f'{ticker1}/{ticker2}'
+
+def hedge_ratios(panel, idx1, idx2):
+    """OLS hedge ratio of every (idx1, idx2) column pair of an aligned panel, from one covariance product"""
+    centered = panel.adj_close - panel.adj_close.mean(axis=0)
+    cov = centered.T @ centered
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(cov[idx2, idx2] > 0, cov[idx1, idx2] / cov[idx2, idx2], np.nan)
+
+def spread_returns(panel, idx1, idx2, betas):
+    """Daily returns (days x pairs) on gross notional of long idx1 / short beta * idx2, as in the backtest"""
+    y = panel.adj_close[:, idx1]
+    x = panel.adj_close[:, idx2]
+    return (np.diff(y, axis=0) - betas * np.diff(x, axis=0)) / (y[:-1] + np.abs(betas) * x[:-1])
+
+class PortfolioBook:
+    """Weighted book of hedged pairs on one date-aligned PricePanel
+
+    The book keeps the spread-return matrix R (days x pairs), its Gram matrix R'R and
+    column sums, the covariance-weight product S w and the portfolio return series R w.
+    Adding or removing a pair, or changing its weight, updates these in O(days x pairs):
+    one new Gram row/column plus rank-one updates of S w and R w, instead of recomputing
+    the covariance of the whole book.
+    """
+
+    def __init__(self, panel):
+        self.panel = panel
+        self.dates = from_epoch_days(panel.dates[1:])
+        self._columns = {ticker: i for i, ticker in enumerate(panel.tickers)}
+        self.pairs = []
+        # A panel without dates (no sessions in range, or no overlap) gives an empty book
+        n_days = max(len(panel.dates) - 1, 0)
+        self.returns = np.empty((n_days, 0))
+        self.gram = np.empty((0, 0))
+        self.sums = np.empty(0)
+        self.cov_weights = np.empty(0)
+        self.portfolio = np.zeros(n_days)
+
+    def __len__(self):
+        return len(self.pairs)
+
+    @property
+    def n_days(self):
+        return self.returns.shape[0]
+
+    @property
+    def weights(self):
+        return np.array([pair.weight for pair in self.pairs], dtype=float)
+
+    @property
+    def labels(self):
+        return [pair_label(pair.ticker1, pair.ticker2) for pair in self.pairs]
+
+    @property
+    def has_history(self):
+        """Whether there are enough daily returns for a sample covariance"""
+        return self.n_days >= 2
+
+    def index(self, ticker1, ticker2):
+        """Position of a pair in the book"""
+        for i, pair in enumerate(self.pairs):
+            if (pair.ticker1, pair.ticker2) == (ticker1, ticker2):
+                return i
+        raise KeyError(f"{pair_label(ticker1, ticker2)} is not in the book")
+
+    def _covariance_column(self, gram_column, column_sum):
+        """Sample covariance of every pair with one whose Gram column and return sum are given"""
+        return (gram_column - self.sums * column_sum / self.n_days) / (self.n_days - 1)
+
+    def add_pair(self, ticker1, ticker2, weight=1.0, beta=None):
+        """Add a pair, estimating its hedge ratio from the panel unless beta is given"""
+        if any((pair.ticker1, pair.ticker2) == (ticker1, ticker2) for pair in self.pairs):
+            raise ValueError(f"{pair_label(ticker1, ticker2)} is already in the book")
+        if not self.has_history:
+            raise ValueError("Not enough overlapping dates to add a pair")
+        i, j = self._columns[ticker1], self._columns[ticker2]
+        if beta is None:
+            beta = float(hedge_ratios(self.panel, np.array([i]), np.array([j]))[0])
+        r = spread_returns(self.panel, np.array([i]), np.array([j]), np.array([beta]))[:, 0]
+
+        # Border the Gram matrix with the new pair's cross products
+        cross = self.returns.T @ r
+        r_sum = r.sum()
+        new_cov = self._covariance_column(cross, r_sum)
+        own_var = (r @ r - r_sum ** 2 / self.n_days) / (self.n_days - 1)
+        self.gram = np.block([[self.gram, cross[:, None]], [cross[None, :], np.array([[r @ r]])]])
+        self.sums = np.append(self.sums, r_sum)
+        self.returns = np.column_stack([self.returns, r])
+
+        # S w gains weight * (new covariance column) and a new entry for the added pair
+        self.cov_weights = np.append(self.cov_weights + weight * new_cov,
+                                     new_cov @ self.weights + weight * own_var)
+        self.portfolio = self.portfolio + weight * r
+        self.pairs.append(PortfolioPair(ticker1, ticker2, float(weight), beta))
+
+    def remove_pair(self, ticker1, ticker2):
+        """Drop a pair from the book"""
+        i = self.index(ticker1, ticker2)
+        weight = self.pairs[i].weight
+        self.cov_weights = np.delete(self.cov_weights - weight * self.covariance[:, i], i)
+        self.portfolio = self.portfolio - weight * self.returns[:, i]
+        self.gram = np.delete(np.delete(self.gram, i, axis=0), i, axis=1)
+        self.sums = np.delete(self.sums, i)
+        self.returns = np.delete(self.returns, i, axis=1)
+        del self.pairs[i]
+
+    def set_weight(self, ticker1, ticker2, weight):
+        """Change a pair's weight with a rank-one update"""
+        i = self.index(ticker1, ticker2)
+        change = weight - self.pairs[i].weight
+        self.cov_weights = self.cov_weights + change * self.covariance[:, i]
+        self.portfolio = self.portfolio + change * self.returns[:, i]
+        self.pairs[i] = self.pairs[i]._replace(weight=float(weight))
+
+    @property
+    def covariance(self):
+        """Sample covariance of the pairs' daily spread returns, from the Gram matrix"""
+        if not self.has_history:
+            return np.full(self.gram.shape, np.nan)
+        return (self.gram - np.outer(self.sums, self.sums) / self.n_days) / (self.n_days - 1)
+
+    def correlation(self):
+        """Pair-to-pair spread return correlation"""
+        cov = self.covariance
+        with np.errstate(divide='ignore', invalid='ignore'):
+            std = np.sqrt(np.diag(cov))
+            corr = np.clip(cov / np.outer(std, std), -1, 1)
+        np.fill_diagonal(corr, 1.0)
+        return pd.DataFrame(corr, index=self.labels, columns=self.labels)
+
+    def variance(self):
+        """Daily variance of the book's return, w' S w"""
+        return float(self.weights @ self.cov_weights) if self.pairs else 0.0
+
+    def volatility(self):
+        """Annualized volatility of the book in percent"""
+        return np.sqrt(self.variance() * TRADING_DAYS) * 100
+
+    def var_contributions(self, confidence=DEFAULT_CONFIDENCE):
+        """Parametric (normal) one-day VaR of the book split into marginal and component VaR per pair
+
+        Component VaR is weight x marginal VaR and sums to the book VaR. Values are percent
+        returns, negative for losses like the other VaR figures in the app.
+        """
+        z = norm.ppf(confidence)
+        sigma = np.sqrt(self.variance())
+        means = self.sums / self.n_days
+        with np.errstate(divide='ignore', invalid='ignore'):
+            marginal = means - z * self.cov_weights / sigma
+        component = self.weights * marginal
+        total = component.sum()
+        return pd.DataFrame({
+            'weight': self.weights,
+            'beta': [pair.beta for pair in self.pairs],
+            'marginal_var': marginal * 100,
+            'component_var': component * 100,
+            'contribution': component / total * 100 if total != 0 else np.nan
+        }, index=pd.Index(self.labels, name='pair'))
+
+    def portfolio_returns(self):
+        """Daily book returns as a date-indexed Series"""
+        return pd.Series(self.portfolio, index=self.dates)
+
+    def drawdown(self):
+        """Drawdown of the compounded book equity in percent, per day"""
+        equity = np.cumprod(1 + self.portfolio)
+        return pd.Series((equity / np.maximum.accumulate(equity) - 1) * 100, index=self.dates)
+
+    def summary(self, confidence=DEFAULT_CONFIDENCE):
+        """Headline figures of the book"""
+        contributions = self.var_contributions(confidence)
+        drawdown = self.drawdown()
+        return {
+            'n_pairs': len(self.pairs),
+            'volatility': self.volatility(),
+            'var': contributions['component_var'].sum(),
+            'max_drawdown': drawdown.min() if len(drawdown) else np.nan,
+            'current_drawdown': drawdown.iloc[-1] if len(drawdown) else np.nan
+        }
+
+@timed
+def build_portfolio(panel, pairs):
+    """Book of (ticker1, ticker2, weight) pairs on an aligned panel, with every matrix built in one pass
+
+    Hedge ratios, spread returns, the Gram matrix and S w are each one vectorized
+    operation over all pairs; later additions go through PortfolioBook.add_pair.
+    """
+    book = PortfolioBook(panel)
+    if not pairs:
+        return book
+    if not book.has_history:
+        raise ValueError("Not enough overlapping dates to build the book")
+    columns = book._columns
+    idx1 = np.array([columns[ticker1] for ticker1, _, _ in pairs])
+    idx2 = np.array([columns[ticker2] for _, ticker2, _ in pairs])
+    weights = np.array([weight for _, _, weight in pairs], dtype=float)
+    betas = hedge_ratios(panel, idx1, idx2)
+
+    book.returns = spread_returns(panel, idx1, idx2, betas)
+    book.gram = book.returns.T @ book.returns
+    book.sums = book.returns.sum(axis=0)
+    book.pairs = [PortfolioPair(ticker1, ticker2, float(weight), float(beta))
+                  for (ticker1, ticker2, weight), beta in zip(pairs, betas)]
+    book.cov_weights = book.covariance @ weights
+    book.portfolio = book.returns @ weights
+    return book
@@ -0,0 +1,157 @@
+import datetime
+import json
+import os
+import threading
+from zoneinfo import ZoneInfo
+
+from src.calendar_utils import invalidate_market_calendar
+from src.constants import DEFAULT_TICKERS_LIST, DEFAULT_START_DATE, DATA_FOLDER_PATH
+from src.data_utils import download_bulk_data
+from src.metrics_utils import timed
+from src.store_utils import read_prices, migrate_csv_store, from_epoch_days
+
+# Tickers kept current by the refresh worker, shared with an out-of-process worker
+WATCHLIST_PATH = f'{DATA_FOLDER_PATH}/watchlist.json'
+# Per-ticker freshness written after every refresh cycle
+FRESHNESS_PATH = f'{DATA_FOLDER_PATH}/freshness.json'
+# Seconds between coverage checks; a cycle only fetches tickers missing sessions
+REFRESH_INTERVAL_SECONDS = 15 * 60
+# A session's bar is requested once this much time has passed since the close (New York time)
+MARKET_TIMEZONE = ZoneInfo('America/New_York')
+MARKET_CLOSE_TIME = datetime.time(16, 0)
+CLOSE_SETTLE_MINUTES = 30
+# 'thread' runs the worker inside the app; 'external' expects `python -m src.refresh_utils` to run it
+REFRESH_WORKER_MODE = os.environ.get('REFRESH_WORKER', 'thread')
+
+_watchlist_lock = threading.Lock()
+_worker = None
+_worker_lock = threading.Lock()
+
+def _write_json(path, data):
+    """Atomically write a JSON file"""
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+def _read_json(path, default):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return default
+
+def load_watchlist():
+    """Tickers the refresh worker keeps current (the defaults plus every watched ticker)"""
+    return list(dict.fromkeys(DEFAULT_TICKERS_LIST + _read_json(WATCHLIST_PATH, [])))
+
+def watch_tickers(tickers):
+    """Add tickers to the watchlist, waking the worker when any of them is new"""
+    with _watchlist_lock:
+        watched = load_watchlist()
+        new = [ticker for ticker in tickers if ticker not in watched]
+        if new:
+            _write_json(WATCHLIST_PATH, watched + new)
+    if new:
+        request_refresh()
+    return new
+
+def refresh_end_date(now=None):
+    """Exclusive end date to refresh up to: today's bar only counts once the close has settled"""
+    now = now or datetime.datetime.now(MARKET_TIMEZONE)
+    settled = datetime.datetime.combine(now.date(), MARKET_CLOSE_TIME, MARKET_TIMEZONE) + \
+        datetime.timedelta(minutes=CLOSE_SETTLE_MINUTES)
+    return now.date() + datetime.timedelta(days=1) if now >= settled else now.date()
+
+def last_stored_date(ticker):
+    """Date of a ticker's latest stored bar, or None"""
+    prices = read_prices(ticker)
+    if prices is None or len(prices.dates) == 0:
+        return None
+    return from_epoch_days([prices.dates[-1]])[0].date()
+
+@timed
+def refresh_once(tickers=None):
+    """Bring the stored history of tickers (default: the watchlist) up to the latest settled session
+
+    Only tickers missing sessions are fetched. Returns the freshness record that is also
+    written to FRESHNESS_PATH.
+    """
+    tickers = load_watchlist() if tickers is None else tickers
+    summary = download_bulk_data(tickers, DEFAULT_START_DATE, refresh_end_date())
+
+    checked_at = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds')
+    freshness = _read_json(FRESHNESS_PATH, {})
+    for ticker in tickers:
+        last_date = last_stored_date(ticker)
+        freshness[ticker] = {
+            'last_date': last_date.isoformat() if last_date else None,
+            'checked_at': checked_at,
+            'error': summary.failed.get(ticker)
+        }
+    _write_json(FRESHNESS_PATH, freshness)
+    return freshness
+
+class RefreshWorker(threading.Thread):
+    """Daemon thread keeping the watchlist's stored prices current
+
+    It runs a refresh cycle at start, then every interval seconds or as soon as
+    request_refresh is called. Failures are recorded in the freshness file and retried
+    on the next cycle.
+    """
+
+    def __init__(self, interval=REFRESH_INTERVAL_SECONDS):
+        super().__init__(name='data-refresh', daemon=True)
+        self.interval = interval
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+
+    def request_refresh(self):
+        """Run the next cycle now instead of at the end of the interval"""
+        self._wake.set()
+
+    def stop(self):
+        """Stop after the current cycle"""
+        self._stopped.set()
+        self._wake.set()
+
+    def run(self):
+        # Convert any legacy CSV files before the first coverage check
+        if migrate_csv_store():
+            invalidate_market_calendar()
+        while not self._stopped.is_set():
+            try:
+                refresh_once()
+            except Exception as e:
+                print(f"Error refreshing data: {str(e)}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+def start_refresh_worker():
+    """Start the process-wide refresh worker once (a no-op in 'external' mode)"""
+    global _worker
+    if REFRESH_WORKER_MODE != 'thread':
+        return None
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = RefreshWorker()
+            _worker.start()
+        return _worker
+
+def request_refresh():
+    """Wake the in-process worker, if it runs here"""
+    if _worker is not None:
+        _worker.request_refresh()
+
+def get_freshness():
+    """Per-ticker freshness from the last refresh cycle: last_date, checked_at and error"""
+    return _read_json(FRESHNESS_PATH, {})
+
+def data_as_of(tickers):
+    """Earliest latest-stored date across tickers that have data, or None if none do"""
+    dates = [date for date in (last_stored_date(ticker) for ticker in tickers) if date is not None]
+    return min(dates) if dates else None
+
+if __name__ == '__main__':
+    # Standalone worker process for REFRESH_WORKER=external deployments
+    RefreshWorker().run()
@@ -0,0 +1,161 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+
+from src.metrics_utils import timed
+
+# Risk methods, in the order they are reported
+RISK_METHODS = ('historical', 'filtered_historical', 'monte_carlo')
+RISK_METHOD_NAMES = {
+    'historical': "Historical",
+    'filtered_historical': "Filtered Historical",
+    'monte_carlo': "Monte Carlo"
+}
+DEFAULT_CONFIDENCE = 0.95
+# Longest holding period in trading days; every horizon from 1 day up to it is reported
+DEFAULT_MAX_HORIZON = 20
+DEFAULT_PATHS = 100_000
+# Paths simulated per batch, bounding the size of the intermediate arrays
+DEFAULT_CHUNK_SIZE = 25_000
+DEFAULT_SEED = 0
+# RiskMetrics decay of the exponentially weighted volatility and covariance
+EWMA_LAMBDA = 0.94
+
+# var and cvar hold one value per horizon (1..max_horizon days), as percentage returns on
+# gross notional, so losses are negative like var_95/cvar_95 in calculate_pair_statistics
+RiskResult = namedtuple('RiskResult', ['method', 'var', 'cvar', 'n_scenarios'])
+
+def hedged_weights(pair_data, ticker1, ticker2, beta):
+    """Leg weights of long one share of ticker1 and short beta shares of ticker2, per unit of gross notional"""
+    y0 = pair_data[f'adj_close_{ticker1}'].iloc[-1]
+    x0 = pair_data[f'adj_close_{ticker2}'].iloc[-1]
+    notional = y0 + abs(beta) * x0
+    return np.array([y0 / notional, -beta * x0 / notional])
+
+def leg_log_returns(pair_data, ticker1, ticker2):
+    """Daily log returns of both legs as a (days x 2) array"""
+    prices = pair_data[[f'adj_close_{ticker1}', f'adj_close_{ticker2}']].to_numpy(dtype=float)
+    return np.diff(np.log(prices), axis=0)
+
+def position_returns(cum_log_returns, weights):
+    """Return of the fixed-share position given each leg's cumulative log return (last axis = legs)"""
+    return np.expm1(cum_log_returns) @ weights
+
+def var_cvar(returns, confidence=DEFAULT_CONFIDENCE):
+    """VaR (the 1 - confidence quantile) and CVaR (mean at or beyond it) along axis 0, in percent"""
+    returns = np.asarray(returns, dtype=float)
+    cutoff = np.quantile(returns, 1 - confidence, axis=0)
+    tail = returns <= cutoff
+    cvar = np.where(tail, returns, 0.0).sum(axis=0) / tail.sum(axis=0)
+    return cutoff * 100, cvar * 100
+
+def ewma_variance(returns, lam=EWMA_LAMBDA):
+    """One-step-ahead EWMA variance of each column, and the forecast for the day after the last
+
+    sigma2[t] = lam * sigma2[t - 1] + (1 - lam) * r[t - 1] ** 2, seeded with the sample
+    variance, so sigma2[t] only uses returns before day t.
+    """
+    seed = returns.var(axis=0)
+    sigma2 = np.empty(returns.shape)
+    sigma2[0] = seed
+    sigma2[1:] = lfilter([1 - lam], [1.0, -lam], returns[:-1] ** 2, axis=0, zi=(lam * seed)[None, :])[0]
+    forecast = lam * sigma2[-1] + (1 - lam) * returns[-1] ** 2
+    return sigma2, forecast
+
+def ewma_covariance(returns, lam=EWMA_LAMBDA):
+    """RiskMetrics zero-mean EWMA covariance forecast for the day after the last"""
+    weights = (1 - lam) * lam ** np.arange(len(returns) - 1, -1, -1)
+    weights /= weights.sum()
+    return (returns * weights[:, None]).T @ returns
+
+def _simulate(n_paths, chunk_size, simulate_chunk):
+    """Stack the (paths x horizons) position returns of successive chunks of paths
+
+    Chunks consume the generator in path order, so results do not depend on chunk_size.
+    """
+    chunk_size = chunk_size or n_paths
+    return np.concatenate([simulate_chunk(min(chunk_size, n_paths - start))
+                           for start in range(0, n_paths, chunk_size)])
+
+def historical_var(returns, weights, max_horizon=DEFAULT_MAX_HORIZON, confidence=DEFAULT_CONFIDENCE):
+    """Historical simulation over overlapping h-day windows of the actual leg returns"""
+    cumulative = np.vstack([np.zeros((1, returns.shape[1])), np.cumsum(returns, axis=0)])
+    var = np.full(max_horizon, np.nan)
+    cvar = np.full(max_horizon, np.nan)
+    for h in range(1, min(max_horizon, len(returns)) + 1):
+        var[h - 1], cvar[h - 1] = var_cvar(position_returns(cumulative[h:] - cumulative[:-h], weights),
+                                           confidence)
+    return RiskResult('historical', var, cvar, len(returns))
+
+def filtered_historical_var(returns, weights, max_horizon=DEFAULT_MAX_HORIZON, confidence=DEFAULT_CONFIDENCE,
+                            n_paths=DEFAULT_PATHS, seed=DEFAULT_SEED, chunk_size=DEFAULT_CHUNK_SIZE,
+                            lam=EWMA_LAMBDA):
+    """Filtered historical simulation: bootstrapped devolatilized returns rescaled by EWMA volatility
+
+    Each day's pair of leg returns is divided by that day's EWMA volatility and resampled
+    jointly, so the cross-leg dependence is kept. Along each path the volatility is
+    updated with the simulated returns, starting from today's forecast.
+    """
+    sigma2, forecast = ewma_variance(returns, lam)
+    standardized = returns / np.sqrt(sigma2)
+    rng = np.random.default_rng(seed)
+
+    def simulate_chunk(size):
+        draws = standardized[rng.integers(0, len(standardized), (size, max_horizon))]
+        variance = np.broadcast_to(forecast, (size, 2))
+        cumulative = np.zeros((size, 2))
+        path_returns = np.empty((size, max_horizon))
+        for h in range(max_horizon):
+            step = draws[:, h] * np.sqrt(variance)
+            variance = lam * variance + (1 - lam) * step ** 2
+            cumulative += step
+            path_returns[:, h] = position_returns(cumulative, weights)
+        return path_returns
+
+    var, cvar = var_cvar(_simulate(n_paths, chunk_size, simulate_chunk), confidence)
+    return RiskResult('filtered_historical', var, cvar, n_paths)
+
+def monte_carlo_var(returns, weights, max_horizon=DEFAULT_MAX_HORIZON, confidence=DEFAULT_CONFIDENCE,
+                    n_paths=DEFAULT_PATHS, seed=DEFAULT_SEED, chunk_size=DEFAULT_CHUNK_SIZE, lam=EWMA_LAMBDA):
+    """Parametric Monte Carlo: jointly normal daily leg returns with the EWMA covariance forecast"""
+    # A tiny ridge keeps the factorisation valid for perfectly correlated legs
+    cholesky = np.linalg.cholesky(ewma_covariance(returns, lam) + 1e-12 * np.eye(2))
+    rng = np.random.default_rng(seed)
+
+    def simulate_chunk(size):
+        cumulative = np.cumsum(rng.standard_normal((size, max_horizon, 2)) @ cholesky.T, axis=1)
+        return position_returns(cumulative, weights)
+
+    var, cvar = var_cvar(_simulate(n_paths, chunk_size, simulate_chunk), confidence)
+    return RiskResult('monte_carlo', var, cvar, n_paths)
+
+@timed
+def pair_risk(pair_data, ticker1, ticker2, beta, max_horizon=DEFAULT_MAX_HORIZON,
+              confidence=DEFAULT_CONFIDENCE, n_paths=DEFAULT_PATHS, seed=DEFAULT_SEED,
+              chunk_size=DEFAULT_CHUNK_SIZE, methods=RISK_METHODS):
+    """VaR/CVaR of the beta-hedged pair for every horizon and method
+
+    Returns a DataFrame indexed by horizon (days) with '<method>_var' and '<method>_cvar'
+    columns in percent of gross notional. Simulated methods are reproducible for a seed.
+    """
+    returns = leg_log_returns(pair_data, ticker1, ticker2)
+    returns = returns[~np.isnan(returns).any(axis=1)]
+    report = pd.DataFrame(index=pd.RangeIndex(1, max_horizon + 1, name='horizon'))
+    if len(returns) < 2:
+        return report
+
+    weights = hedged_weights(pair_data, ticker1, ticker2, beta)
+    for method in methods:
+        if method == 'historical':
+            result = historical_var(returns, weights, max_horizon, confidence)
+        elif method == 'filtered_historical':
+            result = filtered_historical_var(returns, weights, max_horizon, confidence, n_paths, seed, chunk_size)
+        elif method == 'monte_carlo':
+            result = monte_carlo_var(returns, weights, max_horizon, confidence, n_paths, seed, chunk_size)
+        else:
+            raise ValueError(f"Unknown risk method '{method}'")
+        report[f'{method}_var'] = result.var
+        report[f'{method}_cvar'] = result.cvar
+    return report
@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+
+from src.coint_utils import mackinnon_pvalues
+from src.kalman_utils import kalman_filter
+
+def rolling_sum(values, window):
+    """Trailing window sums in O(n) from a cumulative sum (NaN until the window fills)"""
+    values = np.asarray(values, dtype=float)
+    valid = ~np.isnan(values)
+    cumsum = np.concatenate([[0.0], np.cumsum(np.where(valid, values, 0.0))])
+    counts = np.concatenate([[0], np.cumsum(valid)])
+    
+    # Windows containing any NaN stay NaN
+    sums = np.full(len(values), np.nan)
+    if len(values) >= window:
+        window_sums = cumsum[window:] - cumsum[:-window]
+        window_counts = counts[window:] - counts[:-window]
+        sums[window - 1:] = np.where(window_counts == window, window_sums, np.nan)
+    return sums
+
+def rolling_ols(y, x, window):
+    """Rolling intercept and slope of y on x over a trailing window"""
+    # Centre the inputs so the running sums do not lose precision
+    x_mean, y_mean = np.nanmean(x), np.nanmean(y)
+    x = np.asarray(x, dtype=float) - x_mean
+    y = np.asarray(y, dtype=float) - y_mean
+    sx, sy = rolling_sum(x, window), rolling_sum(y, window)
+    sxx, sxy = rolling_sum(x * x, window), rolling_sum(x * y, window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        beta = (window * sxy - sx * sy) / (window * sxx - sx ** 2)
+        alpha = (sy - beta * sx) / window + y_mean - beta * x_mean
+    return alpha, beta
+
+def rolling_zscore(values, window):
+    """Deviation of each value from its trailing window mean, in window standard deviations"""
+    values = np.asarray(values, dtype=float)
+    centered = values - np.nanmean(values)
+    mean = rolling_sum(centered, window) / window
+    var = (rolling_sum(centered ** 2, window) - window * mean ** 2) / (window - 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (centered - mean) / np.sqrt(np.maximum(var, 0))
+
+def rolling_mean_reversion(values, window):
+    """Rolling half-life and Dickey-Fuller t-statistic (with constant) of a series
+
+    Both come from the regression of the one-bar change on the lagged level over the
+    trailing window, built from running sums of the five cross products it needs.
+    """
+    values = np.asarray(values, dtype=float)
+    values = values - np.nanmean(values)
+    lagged = values[:-1]
+    delta = np.diff(values)
+    n = window - 1  # regression rows per window of `window` levels
+
+    s_l, s_d = rolling_sum(lagged, n), rolling_sum(delta, n)
+    s_ll, s_ld, s_dd = rolling_sum(lagged ** 2, n), rolling_sum(lagged * delta, n), rolling_sum(delta ** 2, n)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sxx = s_ll - s_l ** 2 / n
+        sxy = s_ld - s_l * s_d / n
+        syy = s_dd - s_d ** 2 / n
+        slope = sxy / sxx
+        ssr = np.maximum(syy - slope * sxy, 0)
+        adf_stat = slope / np.sqrt(ssr / (n - 2) / sxx)
+        half_life = np.where(slope < 0, -np.log(2) / slope, np.nan)
+
+    # Shift by one so each value lines up with the last bar of its window
+    return np.concatenate([[np.nan], half_life]), np.concatenate([[np.nan], adf_stat])
+
+def calculate_rolling_statistics(pair_data, ticker1, ticker2, window=60, include_kalman=False):
+    """Rolling hedge ratio, spread, z-score, half-life and ADF aligned with pair_data dates
+    
+    With include_kalman the Kalman-filter hedge ratio and z-score are added as well; the
+    filter steps bar by bar, so it is skipped unless asked for.
+    """
+    y = pair_data[f'adj_close_{ticker1}'].to_numpy(dtype=float)
+    x = pair_data[f'adj_close_{ticker2}'].to_numpy(dtype=float)
+
+    # Hedge each bar with the ratio estimated over the window ending at that bar
+    alpha, beta = rolling_ols(y, x, window)
+    spread = y - beta * x
+
+    zscore = rolling_zscore(spread, window)
+    half_life, adf_stat = rolling_mean_reversion(spread, window)
+
+    rolling = pd.DataFrame({
+        'date': pair_data['date'].array,
+        'beta': beta,
+        'alpha': alpha,
+        'spread': spread,
+        'zscore': zscore,
+        'half_life': half_life,
+        'adf_stat': adf_stat,
+        'adf_p_value': mackinnon_pvalues(adf_stat, n_vars=1)
+    })
+    
+    if include_kalman:
+        kalman = kalman_filter(y, x)
+        rolling['kalman_beta'] = kalman.beta
+        rolling['kalman_zscore'] = kalman.zscore
+    return rolling
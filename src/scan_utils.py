@@ -0,0 +1,124 @@
+import heapq
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+import statsmodels.api as sm
+from statsmodels.tsa.stattools import coint
+
+from src.stats_utils import SCAN_COLUMNS
+
+# Price matrix attached to shared memory inside each worker process
+_worker_shm = None
+_worker_prices = None
+
+def _init_worker(shm_name, shape, dtype):
+    """Attach a worker process to the shared price matrix"""
+    global _worker_shm, _worker_prices
+    _worker_shm = shared_memory.SharedMemory(name=shm_name)
+    _worker_prices = np.ndarray(shape, dtype=dtype, buffer=_worker_shm.buf)
+
+def _exact_pair_statistics(y, x):
+    """Engle-Granger statistics for one pair using the statsmodels estimators"""
+    model = sm.OLS(y, sm.add_constant(x)).fit()
+    beta = model.params[1]
+    adf_stat, p_value, _ = coint(y, x)
+
+    # Half-life of the OLS residual
+    resid = model.resid
+    half_life_model = sm.OLS(np.diff(resid), sm.add_constant(resid[:-1])).fit()
+    half_life = -np.log(2) / half_life_model.params[1] if half_life_model.params[1] < 0 else np.nan
+
+    return adf_stat, p_value, beta, half_life
+
+def _scan_chunk(pairs):
+    """Score a chunk of (i, j) column pairs against the shared price matrix"""
+    results = []
+    for i, j in pairs:
+        try:
+            results.append((i, j) + _exact_pair_statistics(_worker_prices[:, i], _worker_prices[:, j]))
+        except (ValueError, np.linalg.LinAlgError):
+            results.append((i, j, np.nan, np.nan, np.nan, np.nan))
+    return results
+
+class PairScanExecutor:
+    """Parallel all-pairs cointegration scan that streams a live top-N leaderboard"""
+
+    def __init__(self, prices, max_workers=None, chunk_size=100, top_n=20):
+        self.tickers = list(prices.columns)
+        self.prices = np.ascontiguousarray(prices.to_numpy(dtype=float))
+        self.max_workers = max_workers or os.cpu_count()
+        self.chunk_size = chunk_size
+        self.top_n = top_n
+        self.cancelled = False
+        self._pool = None
+        self._shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.cancel()
+
+    def _leaderboard(self, heap):
+        """Current top-N results as a frame ranked by p-value"""
+        rows = sorted((-neg_p, i, j, stat, beta, hl) for neg_p, i, j, stat, beta, hl in heap)
+        return pd.DataFrame([
+            (self.tickers[i], self.tickers[j], stat, p_value, beta, hl)
+            for p_value, i, j, stat, beta, hl in rows
+        ], columns=SCAN_COLUMNS)
+
+    def stream(self):
+        """Run the scan, yielding (fraction complete, leaderboard) as chunks finish"""
+        n_tickers = self.prices.shape[1]
+        pairs = list(zip(*np.triu_indices(n_tickers, k=1)))
+        if not pairs:
+            return
+
+        # Share the price matrix once instead of pickling it into every task
+        self._shm = shared_memory.SharedMemory(create=True, size=self.prices.nbytes)
+        np.ndarray(self.prices.shape, dtype=self.prices.dtype, buffer=self._shm.buf)[:] = self.prices
+        # Spawn rather than fork, since the Streamlit server process is multi-threaded
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(self._shm.name, self.prices.shape, self.prices.dtype)
+        )
+
+        try:
+            futures = [
+                self._pool.submit(_scan_chunk, pairs[start:start + self.chunk_size])
+                for start in range(0, len(pairs), self.chunk_size)
+            ]
+
+            # Min-heap on negated p-value keeps the N smallest p-values seen so far
+            heap = []
+            for done, future in enumerate(as_completed(futures), start=1):
+                if self.cancelled:
+                    break
+                for i, j, stat, p_value, beta, hl in future.result():
+                    if np.isnan(p_value):
+                        continue
+                    entry = (-p_value, i, j, stat, beta, hl)
+                    if len(heap) < self.top_n:
+                        heapq.heappush(heap, entry)
+                    elif entry > heap[0]:
+                        heapq.heapreplace(heap, entry)
+                yield done / len(futures), self._leaderboard(heap)
+        finally:
+            self.cancel()
+
+    def cancel(self):
+        """Stop scheduling work and release the worker pool and shared memory"""
+        self.cancelled = True
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
@@ -1,8 +1,23 @@
+import heapq
+import threading
+
 import numpy as np
 import pandas as pd
 import statsmodels.api as sm
-from statsmodels.tsa.stattools import adfuller
+from scipy.cluster.hierarchy import leaves_list, linkage
+from scipy.spatial.distance import squareform
+
+from src.backtest_utils import IncrementalBacktest, expanding_hedge_ratio, run_pair_backtest
+from src.coint_utils import (
+    adf_test, adf_design, adf_from_normal_equations, adf_normal_equations, default_max_lag,
+    mackinnon_pvalues, solve_normal_equations
+)
+from src.constants import HEATMAP_MIN_CORRELATION
+from src.metrics_utils import timed
+
+SCAN_COLUMNS = ['ticker1', 'ticker2', 'adf_stat', 'p_value', 'beta', 'half_life']
 
+@timed
 def calculate_pair_statistics(pair_data, ticker1, ticker2):
     """Calculate all statistics for a pair of stocks"""
     # Calculate returns and spreads
@@ -17,9 +32,9 @@ def calculate_pair_statistics(pair_data, ticker1, ticker2):
     beta = model.params.iloc[1]  # Get the second parameter (beta)
     
     # Calculate ADF test statistics
-    adf_result = adfuller(spread.dropna())
-    adf_stat = adf_result[0]
-    p_value = adf_result[1]
+    adf_result = adf_test(spread.dropna().to_numpy())
+    adf_stat = adf_result.adf_stat
+    p_value = adf_result.p_value
     
     # Calculate half-life of mean reversion
     spread_lag = spread.shift(1)
@@ -33,8 +48,10 @@ def calculate_pair_statistics(pair_data, ticker1, ticker2):
     z_score = (spread - spread.mean()) / spread.std()
     current_z = z_score.iloc[-1]
     
-    # Calculate number of trades (crossings of mean)
-    mean_crossings = np.sum(np.diff(np.signbit(spread - spread.mean())))
+    # Backtest the z-score strategy for the trade statistics, hedging each bar with the
+    # hedge ratio known at its close so the backtest has no look-ahead
+    hedge_ratios = expanding_hedge_ratio(y, pair_data[f'adj_close_{ticker2}'])
+    backtest = run_pair_backtest(pair_data, ticker1, ticker2, hedge_ratios)
     
     # Calculate performance metrics
     cum_return = (pair_data[f'adj_close_{ticker1}'].iloc[-1] / 
@@ -54,23 +71,16 @@ def calculate_pair_statistics(pair_data, ticker1, ticker2):
     calmar = abs(annual_return / max_drawdown) if max_drawdown != 0 else 0
     
     # Calculate VaR and CVaR
-    var_95 = np.percentile(returns1, 5) * 100
-    cvar_95 = returns1[returns1 <= np.percentile(returns1, 5)].mean() * 100
-    
-    # Calculate Profit Factor
-    gross_profit = returns1[returns1 > 0].sum()
-    gross_loss = abs(returns1[returns1 < 0].sum())
-    profit_factor = gross_profit / gross_loss if gross_loss != 0 else 0
-    
-    # Calculate MAE
-    rolling_max = pair_data[f'adj_close_{ticker1}'].expanding().max()
-    mae = ((pair_data[f'adj_close_{ticker1}'] - rolling_max) / rolling_max * 100).min()
-    
-    # Calculate Win Rate
-    win_rate = (returns1 > 0).mean() * 100
+    valid_returns = returns1.dropna()
+    var_95 = np.percentile(valid_returns, 5) * 100
+    cvar_95 = valid_returns[valid_returns <= np.percentile(valid_returns, 5)].mean() * 100
     
-    # Calculate Mean Trade Duration
-    trade_duration = len(pair_data) / mean_crossings if mean_crossings > 0 else 0
+    # Trade statistics from the backtest ledger
+    profit_factor = backtest.metrics['profit_factor']
+    mae = backtest.metrics['mae']
+    mean_crossings = backtest.metrics['mean_crossings']
+    win_rate = backtest.metrics['win_rate']
+    trade_duration = backtest.metrics['trade_duration']
     
     return {
         'cum_return': cum_return,
@@ -91,4 +101,378 @@ def calculate_pair_statistics(pair_data, ticker1, ticker2):
         'win_rate': win_rate,
         'trade_duration': trade_duration,
         'current_z': current_z
-    } 
\ No newline at end of file
+    } 
+
+class RunningMoments:
+    """Running count, mean and variance, merged batch by batch (Welford/Chan update)"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def extend(self, values):
+        if not len(values):
+            return
+        batch_mean = values.mean()
+        batch_m2 = ((values - batch_mean) ** 2).sum()
+        total = self.count + len(values)
+        delta = batch_mean - self.mean
+        self.mean += delta * len(values) / total
+        self.m2 += batch_m2 + delta * delta * self.count * len(values) / total
+        self.count = total
+
+    def std(self):
+        """Sample standard deviation (ddof=1), NaN with fewer than two values"""
+        return np.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else np.nan
+
+class RunningPercentile:
+    """Lower-tail percentile and tail mean of a growing sample, O(log n) per value
+
+    A max-heap holds the smallest values up to the two order statistics that
+    np.percentile interpolates between, and a min-heap holds the rest.
+    """
+
+    def __init__(self, q):
+        self.q = q
+        self.lower = []  # negated values
+        self.upper = []
+        self.lower_sum = 0.0
+
+    def __len__(self):
+        return len(self.lower) + len(self.upper)
+
+    def extend(self, values):
+        if len(self) == 0 and len(values):
+            # Bulk start: split the sorted sample instead of pushing value by value
+            ordered = np.sort(values)
+            size = min(len(ordered), int(np.floor(self.q / 100 * (len(ordered) - 1))) + 2)
+            self.lower = (-ordered[:size][::-1]).tolist()
+            self.upper = ordered[size:].tolist()
+            self.lower_sum = float(ordered[:size].sum())
+            return
+        for value in values.tolist():
+            self.add(value)
+
+    def add(self, value):
+        if self.lower and value < -self.lower[0]:
+            heapq.heappush(self.lower, -value)
+            self.lower_sum += value
+        else:
+            heapq.heappush(self.upper, value)
+        
+        # Keep exactly the order statistics 0 .. floor(index) + 1 in the lower heap
+        size = min(len(self), int(np.floor(self.q / 100 * (len(self) - 1))) + 2)
+        while len(self.lower) > size:
+            moved = -heapq.heappop(self.lower)
+            self.lower_sum -= moved
+            heapq.heappush(self.upper, moved)
+        while len(self.lower) < size:
+            moved = heapq.heappop(self.upper)
+            self.lower_sum += moved
+            heapq.heappush(self.lower, -moved)
+
+    def percentile(self):
+        """Same value as np.percentile(values, q) with linear interpolation"""
+        if not len(self):
+            return np.nan
+        index = self.q / 100 * (len(self) - 1)
+        frac = index - np.floor(index)
+        upper = -self.lower[0]
+        if len(self.lower) == 1:
+            return upper
+        lower = -min(self.lower[1:3])
+        # np.percentile's interpolation, which counts back from the upper value past the midpoint
+        if frac >= 0.5:
+            return upper - (upper - lower) * (1 - frac)
+        return lower + (upper - lower) * frac
+
+    def tail_mean(self):
+        """Mean of the values at or below the percentile"""
+        threshold = self.percentile()
+        top = -self.lower[0]
+        total = self.lower_sum - top
+        count = len(self.lower) - 1
+        if top <= threshold:
+            total += top
+            count += 1
+            # Ties with the threshold can also sit in the upper heap
+            ties = []
+            while self.upper and self.upper[0] <= threshold:
+                ties.append(heapq.heappop(self.upper))
+            total += sum(ties)
+            count += len(ties)
+            for value in ties:
+                heapq.heappush(self.upper, value)
+        return total / count if count else np.nan
+
+class IncrementalPairStatistics:
+    """Running state behind calculate_pair_statistics, extended bar by bar
+
+    Appending k bars costs O(k log n) for the return, drawdown, hedge ratio, z-score and
+    VaR/CVaR state, and O(k p^2) for the ADF normal equations (p the ADF max lag). The
+    lag search itself is O(p^3) regardless of history. The trade statistics come from an
+    IncrementalBacktest on the expanding hedge ratio, which carries its position and
+    trades forward.
+    """
+
+    def __init__(self, ticker1, ticker2):
+        self.ticker1 = ticker1
+        self.ticker2 = ticker2
+        # Sessions share one state per pair; hold this across matches/update/statistics
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget every absorbed bar"""
+        self.n = 0
+        self.first_date = None
+        self.last_date = None
+        self.first_y = self.first_x = self.last_y = self.last_x = None
+        
+        # Hedge-ratio OLS sums of y on x, shifted by the first bar for precision
+        self.sums = np.zeros(5)  # x, y, xx, xy, count
+        self.backtest = IncrementalBacktest()
+        self.returns = RunningMoments()
+        self.negative_returns = RunningMoments()
+        self.tail = RunningPercentile(5)
+        self.peak = -np.inf
+        self.max_drawdown = 0.0
+        
+        # Unhedged spread y - x: buffer, moments and half-life regression sums
+        self.spread = np.empty(1024)
+        self.spread_moments = RunningMoments()
+        self.half_life_sums = np.zeros(5)  # lag, delta, lag^2, lag*delta, count
+        self.adf_lag = None
+
+    def matches(self, pair_data):
+        """Whether pair_data extends the bars already absorbed (same start, unrevised prices)"""
+        if self.n == 0 or len(pair_data) < self.n:
+            return False
+        y = pair_data[f'adj_close_{self.ticker1}']
+        x = pair_data[f'adj_close_{self.ticker2}']
+        return (pair_data['date'].iloc[0] == self.first_date and pair_data['date'].iloc[self.n - 1] == self.last_date
+                and y.iloc[0] == self.first_y and y.iloc[self.n - 1] == self.last_y
+                and x.iloc[self.n - 1] == self.last_x)
+
+    def update(self, pair_data):
+        """Absorb the bars of pair_data beyond those already seen"""
+        y = pair_data[f'adj_close_{self.ticker1}'].to_numpy(dtype=float)[self.n:]
+        x = pair_data[f'adj_close_{self.ticker2}'].to_numpy(dtype=float)[self.n:]
+        if not len(y):
+            return
+        if self.n == 0:
+            self.first_date = pair_data['date'].iloc[0]
+            self.first_y, self.first_x = y[0], x[0]
+            self.spread_origin = y[0] - x[0]
+
+        # Running OLS sums through each new bar give the hedge ratio the backtest trades on
+        dx, dy = x - self.first_x, y - self.first_y
+        sums = self.sums[:, None] + np.cumsum([dx, dy, dx * dx, dx * dy, np.ones(len(y))], axis=1)
+        self.sums = sums[:, -1]
+        sx, sy, sxx, sxy, n = sums
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.backtest.update(y, x, (n * sxy - sx * sy) / (n * sxx - sx * sx))
+        
+        # Returns of the first ticker, continuing from the last absorbed close
+        previous = y[:-1] if self.last_y is None else np.concatenate([[self.last_y], y[:-1]])
+        returns = y[len(y) - len(previous):] / previous - 1
+        self.returns.extend(returns)
+        self.negative_returns.extend(returns[returns < 0])
+        self.tail.extend(returns)
+        
+        peaks = np.maximum.accumulate(np.concatenate([[self.peak], y]))[1:]
+        self.max_drawdown = min(self.max_drawdown, ((y / peaks - 1) * 100).min())
+        self.peak = peaks[-1]
+        
+        levels = y - x - self.spread_origin
+        self.spread_moments.extend(levels)
+        lagged = levels[:-1] if self.n == 0 else np.concatenate([[self.spread[self.n - 1]], levels[:-1]])
+        deltas = levels[len(levels) - len(lagged):] - lagged
+        self.half_life_sums += (lagged.sum(), deltas.sum(), (lagged * lagged).sum(),
+                                (lagged * deltas).sum(), len(lagged))
+        
+        while self.n + len(levels) > len(self.spread):
+            self.spread = np.concatenate([self.spread, np.empty(len(self.spread))])
+        self.spread[self.n:self.n + len(levels)] = levels
+        self.n += len(levels)
+
+        self.last_date = pair_data['date'].iloc[self.n - 1]
+        self.last_y, self.last_x = y[-1], x[-1]
+        self._update_adf(len(y))
+
+    def _update_adf(self, n_new):
+        """Grow the ADF normal equations by the newest rows, rebuilding if the max lag changed"""
+        max_lag = default_max_lag(self.n)
+        levels = self.spread[:self.n, None]
+        first_new_row = self.n - n_new - 1  # regression rows are indexed by their differenced bar
+        
+        if max_lag == self.adf_lag and first_new_row >= max_lag:
+            # Only the new rows, built from the levels they depend on, join the common sample
+            design, target = adf_design(levels[first_new_row - max_lag:], max_lag, True)
+            common, common_target = design[:, max_lag:], target[:, max_lag:]
+            self.adf_XtX += common.transpose(0, 2, 1) @ common
+            self.adf_Xty += np.einsum('srk,sr->sk', common, common_target)
+            self.adf_yty += np.einsum('sr,sr->s', common_target, common_target)
+            return
+        
+        # The max lag only steps up every few hundred bars; rebuild from the whole buffer then
+        self.adf_lag = max_lag
+        self.adf_XtX, self.adf_Xty, self.adf_yty, self.adf_prefix, self.adf_prefix_target = \
+            adf_normal_equations(levels, max_lag)
+
+    def statistics(self):
+        """Statistics of the bars absorbed so far, in the calculate_pair_statistics layout"""
+        sx, sy, sxx, sxy, n = self.sums
+        beta = (n * sxy - sx * sy) / (n * sxx - sx * sx)
+        
+        trades = self.backtest.trade_metrics()
+        
+        cum_return = (self.last_y / self.first_y - 1) * 100
+        annual_return = ((1 + cum_return/100) ** (252/self.n) - 1) * 100
+        vol = self.returns.std() * np.sqrt(252) * 100
+        sharpe = annual_return / vol if vol != 0 else 0
+        downside_vol = self.negative_returns.std() * np.sqrt(252) * 100
+        sortino = annual_return / downside_vol if downside_vol != 0 else 0
+        calmar = abs(annual_return / self.max_drawdown) if self.max_drawdown != 0 else 0
+        
+        adf_stat, _ = adf_from_normal_equations(self.adf_XtX, self.adf_Xty, self.adf_yty, self.adf_prefix,
+                                                self.adf_prefix_target, self.n - 1)
+        
+        # Half-life regression (with constant) of the spread change on its lagged level
+        s_l, s_d, s_ll, s_ld, m = self.half_life_sums
+        slope = (m * s_ld - s_l * s_d) / (m * s_ll - s_l * s_l)
+        half_life = -np.log(2) / slope if slope < 0 else np.nan
+        
+        current_z = (self.spread[self.n - 1] - self.spread_moments.mean) / self.spread_moments.std()
+        
+        return {
+            'cum_return': cum_return,
+            'annual_return': annual_return,
+            'sharpe': sharpe,
+            'sortino': sortino,
+            'calmar': calmar,
+            'max_drawdown': self.max_drawdown,
+            'var_95': self.tail.percentile() * 100,
+            'cvar_95': self.tail.tail_mean() * 100,
+            'profit_factor': trades['profit_factor'],
+            'mae': trades['mae'],
+            'adf_stat': adf_stat[0],
+            'p_value': mackinnon_pvalues(adf_stat[0], n_vars=1)[()],
+            'beta': beta,
+            'half_life': half_life,
+            'mean_crossings': trades['mean_crossings'],
+            'win_rate': trades['win_rate'],
+            'trade_duration': trades['trade_duration'],
+            'current_z': current_z
+        }
+
+def _adf_blocks(levels, lags):
+    """Lagged level, current difference and lagged differences aligned for an ADF regression"""
+    diffs = np.diff(levels, axis=0)
+    return [levels[lags:-1], diffs[lags:]] + [diffs[lags - lag:-lag] for lag in range(1, lags + 1)]
+
+def _pair_products(gram, idx1, idx2, beta):
+    """Cross products of hedged residuals (a_i - beta * a_j) . (b_i - beta * b_j) from a Gram matrix"""
+    return (gram[idx1, idx1] - beta * (gram[idx1, idx2] + gram[idx2, idx1])
+            + beta ** 2 * gram[idx2, idx2])
+
+@timed
+def scan_cointegrated_pairs(prices, adf_lags=1, pairs=None):
+    """Rank every pair of a date-aligned price matrix by Engle-Granger cointegration
+    
+    pairs optionally restricts the scan to (idx1, idx2) arrays of column positions, with
+    idx1 regressed on idx2; by default every pair in the upper triangle is tested.
+    """
+    tickers = list(prices.columns)
+    values = prices.to_numpy(dtype=float)
+    n_obs, n_tickers = values.shape
+    if n_tickers < 2 or n_obs < adf_lags + 10:
+        return pd.DataFrame(columns=SCAN_COLUMNS)
+    
+    # Hedge ratios for every pair come from a single covariance matrix product
+    centered = values - values.mean(axis=0)
+    cov = centered.T @ centered
+    idx1, idx2 = np.triu_indices(n_tickers, k=1) if pairs is None else map(np.asarray, pairs)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        betas = np.where(cov[idx2, idx2] > 0, cov[idx1, idx2] / cov[idx2, idx2], np.nan)
+    
+    # The pair residual is linear in the two price series, so every moment of the
+    # ADF regression is a quadratic form of per-ticker Gram matrices (one BLAS call each)
+    blocks = _adf_blocks(centered, adf_lags)
+    regressors = [0] + list(range(2, len(blocks)))
+    k = len(regressors)
+    XtX = np.empty((len(idx1), k, k))
+    Xty = np.empty((len(idx1), k))
+    for a in range(k):
+        for b in range(a, k):
+            gram = blocks[regressors[a]].T @ blocks[regressors[b]]
+            XtX[:, a, b] = XtX[:, b, a] = _pair_products(gram, idx1, idx2, betas)
+        Xty[:, a] = _pair_products(blocks[regressors[a]].T @ blocks[1], idx1, idx2, betas)
+    yty = _pair_products(blocks[1].T @ blocks[1], idx1, idx2, betas)
+    adf_stats, _ = solve_normal_equations(XtX, Xty, yty, blocks[0].shape[0])
+    
+    # Half-life regression (with constant) of the residual change on its lagged level
+    lagged = centered[:-1]
+    delta = np.diff(centered, axis=0)
+    n_hl = lagged.shape[0]
+    sum_lag = lagged.sum(axis=0)
+    sum_delta = delta.sum(axis=0)
+    pair_sum_lag = sum_lag[idx1] - betas * sum_lag[idx2]
+    pair_sum_delta = sum_delta[idx1] - betas * sum_delta[idx2]
+    lag_lag = _pair_products(lagged.T @ lagged, idx1, idx2, betas) - pair_sum_lag ** 2 / n_hl
+    lag_delta = _pair_products(lagged.T @ delta, idx1, idx2, betas) - pair_sum_lag * pair_sum_delta / n_hl
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = lag_delta / lag_lag
+        half_lives = np.where(slope < 0, -np.log(2) / slope, np.nan)
+    
+    results = pd.DataFrame({
+        'ticker1': np.asarray(tickers, dtype=object)[idx1],
+        'ticker2': np.asarray(tickers, dtype=object)[idx2],
+        'adf_stat': adf_stats,
+        'p_value': mackinnon_pvalues(adf_stats, n_vars=2),
+        'beta': betas,
+        'half_life': half_lives
+    })
+    
+    # Lowest p-value first, faster mean reversion breaks ties
+    return results.sort_values(['p_value', 'half_life'], na_position='last').reset_index(drop=True)
+
+@timed
+def correlation_matrix(prices):
+    """Pairwise daily return correlation of a date-aligned price matrix, from one matrix product"""
+    returns = np.diff(np.log(prices.to_numpy(dtype=float)), axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        standardized = (returns - returns.mean(axis=0)) / returns.std(axis=0)
+        corr = standardized.T @ standardized / len(returns)
+    np.fill_diagonal(corr, 1.0)
+    return pd.DataFrame(np.clip(corr, -1, 1), index=prices.columns, columns=prices.columns)
+
+@timed
+def cointegration_matrix(prices, corr=None, min_correlation=HEATMAP_MIN_CORRELATION):
+    """Symmetric matrix of Engle-Granger p-values, NaN for pairs screened out by correlation
+    
+    Only pairs whose absolute return correlation reaches min_correlation are tested.
+    """
+    corr = correlation_matrix(prices) if corr is None else corr
+    idx1, idx2 = np.triu_indices(len(prices.columns), k=1)
+    candidates = np.abs(corr.to_numpy()[idx1, idx2]) >= min_correlation
+    
+    pvalues = np.full((len(prices.columns), len(prices.columns)), np.nan)
+    if candidates.any():
+        results = scan_cointegrated_pairs(prices, pairs=(idx1[candidates], idx2[candidates]))
+        position = {ticker: i for i, ticker in enumerate(prices.columns)}
+        rows = results['ticker1'].map(position).to_numpy(dtype=int)
+        cols = results['ticker2'].map(position).to_numpy(dtype=int)
+        pvalues[rows, cols] = pvalues[cols, rows] = results['p_value'].to_numpy()
+    return pd.DataFrame(pvalues, index=prices.columns, columns=prices.columns)
+
+@timed
+def cluster_order(corr):
+    """Tickers reordered by average-linkage hierarchical clustering on correlation distance"""
+    if len(corr) < 3:
+        return list(corr.index)
+    distance = np.sqrt(np.clip(2 * (1 - np.nan_to_num(corr.to_numpy())), 0, None))
+    np.fill_diagonal(distance, 0)
+    order = leaves_list(linkage(squareform(distance, checks=False), method='average'))
+    return list(corr.index[order])
@@ -0,0 +1,169 @@
+import glob
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from src.constants import DATA_FOLDER_PATH
+from src.metrics_utils import increment, span
+
+# File layout: 16-byte header (magic, row count) followed by three contiguous
+# 8-byte columns of equal length: epoch-day dates, adjusted closes and volumes
+STORE_EXTENSION = '.prices'
+STORE_MAGIC = 0x5052494345533031  # "PRICES01"
+HEADER_BYTES = 16
+
+PriceSeries = namedtuple('PriceSeries', ['dates', 'adj_close', 'vol'])
+EMPTY_PRICES = PriceSeries(np.empty(0, dtype=np.int64), np.empty(0), np.empty(0))
+
+# Epoch day of each ticker's first stored session once the provider returned nothing before it
+HISTORY_START_PATH = f'{DATA_FOLDER_PATH}/history_start.json'
+_history_start_lock = threading.Lock()
+
+# Callbacks run with the ticker after each write, e.g. to evict derived caches
+_write_listeners = []
+
+def add_write_listener(callback):
+    """Register callback(ticker) to be called whenever a ticker's prices are rewritten"""
+    _write_listeners.append(callback)
+
+def store_path(ticker):
+    """Path of a ticker's binary price file"""
+    return f'{DATA_FOLDER_PATH}/{ticker}{STORE_EXTENSION}'
+
+def to_epoch_days(dates):
+    """Convert dates (strings, datetimes or a DatetimeIndex) to int64 days since 1970-01-01"""
+    converted = pd.to_datetime(dates)
+    index = pd.DatetimeIndex([converted] if isinstance(converted, pd.Timestamp) else converted)
+    if index.tz is not None:
+        # Keep the exchange-local calendar date
+        index = index.tz_localize(None)
+    return index.normalize().values.astype('datetime64[D]').astype(np.int64)
+
+def to_epoch_day(date):
+    """Convert a single date to int64 days since 1970-01-01"""
+    return int(to_epoch_days(date)[0])
+
+def from_epoch_days(days):
+    """Convert epoch days back to a UTC DatetimeIndex"""
+    return pd.to_datetime(np.asarray(days, dtype=np.int64), unit='D', utc=True)
+
+def read_prices(ticker):
+    """Memory-map a ticker's stored prices, or return None if nothing is stored"""
+    path = store_path(ticker)
+    try:
+        header = np.fromfile(path, dtype='<i8', count=2)
+    except FileNotFoundError:
+        return None
+    if len(header) < 2 or header[0] != STORE_MAGIC:
+        return None
+
+    n_rows = int(header[1])
+    # Counts the mapped size; pages are only read from disk as they are touched
+    increment('bytes_read', HEADER_BYTES + 24 * n_rows, source='store')
+    if n_rows == 0:
+        return EMPTY_PRICES
+
+    dates = np.memmap(path, dtype='<i8', mode='r', offset=HEADER_BYTES, shape=(n_rows,))
+    adj_close = np.memmap(path, dtype='<f8', mode='r', offset=HEADER_BYTES + 8 * n_rows, shape=(n_rows,))
+    vol = np.memmap(path, dtype='<f8', mode='r', offset=HEADER_BYTES + 16 * n_rows, shape=(n_rows,))
+    return PriceSeries(dates, adj_close, vol)
+
+def write_prices(ticker, dates, adj_close, vol):
+    """Atomically write a ticker's prices, sorted by date"""
+    dates = np.asarray(dates, dtype='<i8')
+    order = np.argsort(dates, kind='stable')
+
+    # Write to a temporary file first so readers never see a partial file
+    path = store_path(ticker)
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.array([STORE_MAGIC, len(dates)], dtype='<i8').tofile(f)
+        dates[order].tofile(f)
+        np.asarray(adj_close, dtype='<f8')[order].tofile(f)
+        np.asarray(vol, dtype='<f8')[order].tofile(f)
+    os.replace(tmp_path, path)
+    for callback in _write_listeners:
+        callback(ticker)
+
+def read_history_starts():
+    """Every recorded 'no history before this session' marker, by ticker"""
+    try:
+        with open(HISTORY_START_PATH) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def history_start(ticker):
+    """Epoch day before which the provider has no history for ticker, or None if unknown or expired"""
+    marker = read_history_starts().get(ticker)
+    if marker is None or isinstance(marker, int):
+        return marker
+    if marker['expires_at'] is not None and time.time() >= marker['expires_at']:
+        return None
+    return marker['day']
+
+def mark_history_start(ticker, day, ttl=None):
+    """Record that the provider has no history for ticker before an epoch day
+    
+    With ttl (seconds) the marker is provisional and is ignored once it expires.
+    """
+    marker = {'day': int(day), 'expires_at': None if ttl is None else time.time() + ttl}
+    with _history_start_lock:
+        starts = read_history_starts()
+        if ttl is None and starts.get(ticker) == marker:
+            return
+        starts[ticker] = marker
+        tmp_path = f'{HISTORY_START_PATH}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(starts, f, indent=2)
+        os.replace(tmp_path, HISTORY_START_PATH)
+
+def merge_prices(existing, new):
+    """Merge two price series by date, keeping the newer row when dates overlap"""
+    dates = np.concatenate([np.asarray(new.dates), np.asarray(existing.dates)])
+    adj_close = np.concatenate([np.asarray(new.adj_close), np.asarray(existing.adj_close)])
+    vol = np.concatenate([np.asarray(new.vol), np.asarray(existing.vol)])
+    
+    # np.unique returns the first occurrence, which is the new row
+    dates, first = np.unique(dates, return_index=True)
+    return PriceSeries(dates, adj_close[first], vol[first])
+
+def slice_prices(series, start_date, end_date):
+    """Zero-copy view of the rows whose date lies within [start_date, end_date]"""
+    lo = np.searchsorted(series.dates, to_epoch_day(start_date), side='left')
+    hi = np.searchsorted(series.dates, to_epoch_day(end_date), side='right')
+    return PriceSeries(series.dates[lo:hi], series.adj_close[lo:hi], series.vol[lo:hi])
+
+def prices_to_frame(series):
+    """Build the date/adj_close/vol DataFrame used by the rest of the app"""
+    return pd.DataFrame({
+        'date': from_epoch_days(series.dates),
+        'adj_close': np.asarray(series.adj_close),
+        'vol': np.asarray(series.vol)
+    })
+
+def migrate_csv_store(folder=DATA_FOLDER_PATH, remove_csv=False):
+    """One-time conversion of legacy per-ticker CSV files into the binary store"""
+    migrated = []
+    for csv_path in sorted(glob.glob(f'{folder}/*.csv')):
+        ticker = os.path.splitext(os.path.basename(csv_path))[0]
+        if os.path.exists(store_path(ticker)):
+            continue
+        try:
+            increment('bytes_read', os.path.getsize(csv_path), source='csv')
+            with span('store_utils.read_csv'):
+                df = pd.read_csv(csv_path)
+            dates = pd.to_datetime(df['date'], utc=True)
+            write_prices(ticker, to_epoch_days(dates), df['adj_close'], df['vol'])
+            migrated.append(ticker)
+        except (KeyError, ValueError) as e:
+            print(f"Error migrating {csv_path}: {str(e)}")
+            continue
+        if remove_csv:
+            os.remove(csv_path)
+    return migrated
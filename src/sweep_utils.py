@@ -0,0 +1,112 @@
+import argparse
+import itertools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src.backtest_utils import simulate_positions, summarize_backtests
+from src.data_utils import load_price_matrix
+from src.rolling_utils import rolling_zscore
+
+DEFAULT_ENTRY_GRID = [1.5, 2.0, 2.5, 3.0]
+DEFAULT_EXIT_GRID = [0.0, 0.25, 0.5, 1.0]
+DEFAULT_LOOKBACK_GRID = [20, 40, 60, 120]
+
+def hedge_ratio(y, x):
+    """OLS slope of y on x with intercept, as used by calculate_pair_statistics"""
+    x_c = x - x.mean()
+    return (x_c * (y - y.mean())).sum() / (x_c ** 2).sum()
+
+def sweep_pair(y, x, entry_grid, exit_grid, lookback_grid, cost_bps=5.0):
+    """Evaluate every (entry, exit, lookback) combination for one pair in one batched pass
+
+    The hedge ratio and spread are computed once per pair and the rolling z-score once
+    per lookback; all valid (entry, exit) thresholds for that lookback are then simulated
+    together as columns of a single position matrix.
+    """
+    y = np.asarray(y, dtype=float)
+    x = np.asarray(x, dtype=float)
+    beta = hedge_ratio(y, x)
+    spread = y - beta * x
+
+    thresholds = np.array([(entry, exit) for entry, exit in itertools.product(entry_grid, exit_grid)
+                           if exit < entry], dtype=float).reshape(-1, 2)
+
+    results = []
+    for lookback in lookback_grid:
+        zscore = rolling_zscore(spread, lookback)
+        grid_z = np.broadcast_to(zscore[:, None], (len(zscore), len(thresholds)))
+        positions = simulate_positions(grid_z, thresholds[:, 0], thresholds[:, 1])
+        summary = summarize_backtests(positions, y[:, None], x[:, None], beta, cost_bps)
+        summary.insert(0, 'entry_z', thresholds[:, 0])
+        summary.insert(1, 'exit_z', thresholds[:, 1])
+        summary.insert(2, 'lookback', lookback)
+        summary.insert(3, 'beta', beta)
+        results.append(summary)
+    return pd.concat(results, ignore_index=True)
+
+def _sweep_task(args):
+    """Process-pool entry point: sweep one pair and label the rows with its tickers"""
+    ticker1, ticker2, y, x, entry_grid, exit_grid, lookback_grid, cost_bps = args
+    result = sweep_pair(y, x, entry_grid, exit_grid, lookback_grid, cost_bps)
+    result.insert(0, 'ticker1', ticker1)
+    result.insert(1, 'ticker2', ticker2)
+    return result
+
+def run_parameter_sweep(prices, pairs, entry_grid=DEFAULT_ENTRY_GRID, exit_grid=DEFAULT_EXIT_GRID,
+                        lookback_grid=DEFAULT_LOOKBACK_GRID, cost_bps=5.0, rank_by='sharpe',
+                        max_workers=None):
+    """Grid-search strategy parameters for many pairs and return a ranked result table
+
+    prices is a date-aligned dates x tickers frame (see load_price_matrix) and pairs a list
+    of (ticker1, ticker2). Pairs are spread across a process pool; with max_workers=1 or a
+    single pair everything runs in the calling process.
+    """
+    tasks = [
+        (ticker1, ticker2, prices[ticker1].to_numpy(dtype=float), prices[ticker2].to_numpy(dtype=float),
+         entry_grid, exit_grid, lookback_grid, cost_bps)
+        for ticker1, ticker2 in pairs
+    ]
+    if not tasks:
+        return pd.DataFrame()
+
+    workers = min(max_workers or os.cpu_count(), len(tasks))
+    if workers <= 1:
+        results = [_sweep_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            results = list(executor.map(_sweep_task, tasks))
+
+    table = pd.concat(results, ignore_index=True)
+    return table.sort_values(rank_by, ascending=False).reset_index(drop=True)
+
+def main():
+    """Command-line sweep: python -m src.sweep_utils AAPL:MSFT GOOG:AMZN --start 2018-01-01"""
+    parser = argparse.ArgumentParser(description="Grid-search pairs-trading parameters")
+    parser.add_argument('pairs', nargs='+', help="pairs as TICKER1:TICKER2")
+    parser.add_argument('--start', default='2016-01-04')
+    parser.add_argument('--end', default=pd.Timestamp.today().strftime('%Y-%m-%d'))
+    parser.add_argument('--entry', type=float, nargs='+', default=DEFAULT_ENTRY_GRID)
+    parser.add_argument('--exit', type=float, nargs='+', default=DEFAULT_EXIT_GRID)
+    parser.add_argument('--lookback', type=int, nargs='+', default=DEFAULT_LOOKBACK_GRID)
+    parser.add_argument('--cost-bps', type=float, default=5.0)
+    parser.add_argument('--rank-by', default='sharpe')
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--output', help="optional CSV path for the full table")
+    args = parser.parse_args()
+
+    pairs = [tuple(pair.upper().split(':')) for pair in args.pairs]
+    tickers = sorted({ticker for pair in pairs for ticker in pair})
+    prices = load_price_matrix(tickers, args.start, args.end)
+    table = run_parameter_sweep(prices, pairs, args.entry, args.exit, args.lookback,
+                                args.cost_bps, args.rank_by)
+
+    print(table.head(args.top).to_string(index=False))
+    if args.output:
+        table.to_csv(args.output, index=False)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+import json
+import os
+import re
+import threading
+import time
+
+from src.constants import DATA_FOLDER_PATH
+from src.data_utils import get_data_provider
+from src.store_utils import read_prices
+
+# Persistent cache of validation results
+VALIDATION_CACHE_PATH = f'{DATA_FOLDER_PATH}/ticker_validation.json'
+POSITIVE_TTL_SECONDS = 30 * 24 * 3600
+NEGATIVE_TTL_SECONDS = 24 * 3600
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def parse_tickers(text):
+    """Split pasted text (commas, spaces or newlines) into unique upper-case symbols"""
+    tickers = []
+    for symbol in re.split(r'[\s,;]+', text.upper()):
+        if symbol and symbol not in tickers:
+            tickers.append(symbol)
+    return tickers
+
+def _load_cache():
+    """Read the cache file once per process"""
+    global _cache
+    if _cache is None:
+        try:
+            with open(VALIDATION_CACHE_PATH) as f:
+                _cache = json.load(f)
+        except (FileNotFoundError, ValueError):
+            _cache = {}
+    return _cache
+
+def _save_cache(cache):
+    """Atomically write the cache file"""
+    tmp_path = f'{VALIDATION_CACHE_PATH}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(cache, f)
+    os.replace(tmp_path, VALIDATION_CACHE_PATH)
+
+def validate_tickers(tickers):
+    """Return {ticker: is_valid}, checking the cache, then the price store, then the provider in one batch
+    
+    Tickers the provider could not be asked about, or could not answer for (a network error,
+    a rate limit), map to None and are not cached.
+    """
+    now = time.time()
+    results = {}
+    unresolved = []
+    stored = []
+    
+    with _cache_lock:
+        cache = _load_cache()
+        for ticker in tickers:
+            entry = cache.get(ticker)
+            if entry is not None:
+                ttl = POSITIVE_TTL_SECONDS if entry['valid'] else NEGATIVE_TTL_SECONDS
+                if now - entry['checked'] < ttl:
+                    results[ticker] = entry['valid']
+                    continue
+            
+            # Anything we already hold prices for is known to exist
+            prices = read_prices(ticker)
+            if prices is not None and len(prices.dates) > 0:
+                results[ticker] = True
+                stored.append(ticker)
+            else:
+                unresolved.append(ticker)
+    
+    # Only the remaining symbols go to the network, in a single batched call
+    if unresolved:
+        try:
+            results.update(get_data_provider().validate_batch(unresolved))
+        except Exception as e:
+            print(f"Error validating tickers {', '.join(unresolved)}: {str(e)}")
+            results.update({ticker: None for ticker in unresolved})
+            unresolved = []
+    
+    if stored or unresolved:
+        with _cache_lock:
+            cache = _load_cache()
+            for ticker in stored + unresolved:
+                if results.get(ticker) is None:
+                    continue
+                cache[ticker] = {'valid': results[ticker], 'checked': now}
+            _save_cache(cache)
+    
+    return {ticker: results.get(ticker) for ticker in tickers}
+
+def clear_validation_cache():
+    """Forget every cached validation result"""
+    global _cache
+    with _cache_lock:
+        _cache = {}
+        _save_cache(_cache)
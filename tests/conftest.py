@@ -0,0 +1,19 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+@pytest.fixture
+def pair_data():
+    """Two cointegrated synthetic price series in the download_pair_data layout"""
+    rng = np.random.default_rng(7)
+    n = 1500
+    x = 50 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    spread = np.zeros(n)
+    for t in range(1, n):
+        spread[t] = 0.95 * spread[t - 1] + rng.normal(0, 0.5)
+    y = 1.3 * x + 10 + spread
+    return pd.DataFrame({
+        'date': pd.date_range('2015-01-01', periods=n, freq='B', tz='UTC'),
+        'adj_close_A': y, 'vol_A': 1e6,
+        'adj_close_B': x, 'vol_B': 1e6
+    })
@@ -0,0 +1,62 @@
+import threading
+import time
+
+import pytest
+
+from src.cache_utils import LRUCache
+
+def run_concurrently(n_threads, target):
+    barrier = threading.Barrier(n_threads)
+    results = [None] * n_threads
+
+    def worker(i):
+        barrier.wait()
+        try:
+            results[i] = target()
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def test_get_or_load_runs_one_load_per_key():
+    cache = LRUCache(8)
+    calls = []
+
+    def load():
+        calls.append(1)
+        time.sleep(0.05)
+        return object()
+
+    results = run_concurrently(16, lambda: cache.get_or_load('key', load))
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert cache.get('key') is results[0]
+
+def test_get_or_load_shares_the_load_error_and_retries_later():
+    cache = LRUCache(8)
+    calls = []
+
+    def failing_load():
+        calls.append(1)
+        time.sleep(0.05)
+        raise RuntimeError('provider down')
+
+    results = run_concurrently(8, lambda: cache.get_or_load('key', failing_load))
+    assert len(calls) == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert cache.get('key') is None
+    assert cache.get_or_load('key', lambda: 42) == 42
+
+def test_get_or_load_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.get_or_load('a', lambda: 1)
+    cache.get_or_load('b', lambda: 2)
+    assert cache.get_or_load('a', lambda: pytest.fail('cached value reloaded')) == 1
+    cache.get_or_load('c', lambda: 3)
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+from statsmodels.tsa.stattools import adfuller, coint
+
+from src.coint_utils import ADF_CHUNK_SIZE, adf_test, coint_test
+
+@pytest.fixture
+def walks():
+    rng = np.random.default_rng(3)
+    x = np.cumsum(rng.normal(size=(400, 5)), axis=0)
+    y = 0.8 * x + np.cumsum(rng.normal(scale=0.3, size=(400, 5)), axis=0) * np.array([0, 0.5, 1, 2, 4])
+    return y + rng.normal(size=y.shape), x
+
+@pytest.mark.parametrize('autolag', ['aic', 'bic', None])
+def test_batched_coint_matches_statsmodels(walks, autolag):
+    y, x = walks
+    result = coint_test(y, x, max_lag=6, autolag=autolag)
+    for j in range(y.shape[1]):
+        stat, p_value, _ = coint(y[:, j], x[:, j], trend='c', maxlag=6, autolag=autolag)
+        assert result.adf_stat[j] == pytest.approx(stat, rel=1e-8)
+        assert result.p_value[j] == pytest.approx(p_value, rel=1e-6, abs=1e-12)
+
+def test_single_pair_coint_matches_statsmodels(walks):
+    y, x = walks
+    stat, p_value, _ = coint(y[:, 2], x[:, 2])
+    result = coint_test(y[:, 2], x[:, 2])
+    assert result.adf_stat == pytest.approx(stat, rel=1e-8)
+    assert result.p_value == pytest.approx(p_value, rel=1e-6)
+
+def test_batched_adf_matches_statsmodels_across_blocks():
+    rng = np.random.default_rng(5)
+    series = np.cumsum(rng.normal(size=(300, ADF_CHUNK_SIZE + 3)), axis=0)
+    result = adf_test(series)
+    for j in (0, ADF_CHUNK_SIZE - 1, ADF_CHUNK_SIZE, series.shape[1] - 1):
+        stat, p_value, lag, nobs, _, _ = adfuller(series[:, j], regression='c', autolag='AIC')
+        assert result.adf_stat[j] == pytest.approx(stat, rel=1e-8)
+        assert result.p_value[j] == pytest.approx(p_value, rel=1e-6)
+        assert (result.used_lag[j], result.nobs[j]) == (lag, nobs)
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from src.panel_utils import PricePanel
+from src.portfolio_utils import PortfolioBook, build_portfolio
+
+@pytest.fixture
+def panel():
+    rng = np.random.default_rng(11)
+    n_days, n_tickers = 300, 6
+    prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, (n_days, n_tickers)), axis=0))
+    return PricePanel(np.arange(18000, 18000 + n_days, dtype=np.int64), [f'T{i}' for i in range(n_tickers)],
+                      prices, np.ones((n_days, n_tickers)))
+
+def assert_books_match(book, expected):
+    assert book.labels == expected.labels
+    np.testing.assert_allclose([pair.beta for pair in book.pairs], [pair.beta for pair in expected.pairs])
+    np.testing.assert_allclose(book.weights, expected.weights)
+    np.testing.assert_allclose(book.covariance, expected.covariance, rtol=1e-9, atol=1e-15)
+    np.testing.assert_allclose(book.cov_weights, expected.cov_weights, rtol=1e-9, atol=1e-15)
+    np.testing.assert_allclose(book.portfolio, expected.portfolio, rtol=1e-9, atol=1e-15)
+    assert book.volatility() == pytest.approx(expected.volatility(), rel=1e-9)
+
+def test_incremental_updates_match_build_portfolio(panel):
+    book = PortfolioBook(panel)
+    book.add_pair('T0', 'T1', 1.0)
+    book.add_pair('T2', 'T3', 0.5)
+    book.add_pair('T4', 'T5', 2.0)
+    assert_books_match(book, build_portfolio(panel, [('T0', 'T1', 1.0), ('T2', 'T3', 0.5), ('T4', 'T5', 2.0)]))
+
+    book.set_weight('T2', 'T3', -1.5)
+    book.remove_pair('T0', 'T1')
+    book.add_pair('T1', 'T4', 0.25)
+    assert_books_match(book, build_portfolio(panel, [('T2', 'T3', -1.5), ('T4', 'T5', 2.0), ('T1', 'T4', 0.25)]))
+
+def test_duplicate_and_missing_pairs_are_rejected(panel):
+    book = build_portfolio(panel, [('T0', 'T1', 1.0)])
+    with pytest.raises(ValueError):
+        book.add_pair('T0', 'T1')
+    with pytest.raises(KeyError):
+        book.remove_pair('T2', 'T3')
+
+def test_book_without_history_rejects_pairs(panel):
+    short = PricePanel(panel.dates[:2], panel.tickers, panel.adj_close[:2], panel.vol[:2])
+    assert not PortfolioBook(short).has_history
+    with pytest.raises(ValueError):
+        build_portfolio(short, [('T0', 'T1', 1.0)])
+    with pytest.raises(ValueError):
+        PortfolioBook(short).add_pair('T0', 'T1')
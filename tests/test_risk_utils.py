@@ -0,0 +1,19 @@
+import numpy as np
+import pytest
+
+from src.risk_utils import filtered_historical_var, monte_carlo_var
+
+@pytest.fixture
+def leg_returns():
+    rng = np.random.default_rng(2)
+    common = rng.normal(0, 0.01, 500)
+    return np.column_stack([common + rng.normal(0, 0.005, 500), common + rng.normal(0, 0.005, 500)])
+
+@pytest.mark.parametrize('simulate', [filtered_historical_var, monte_carlo_var])
+def test_simulated_risk_does_not_depend_on_chunk_size(leg_returns, simulate):
+    weights = np.array([0.5, -0.5])
+    reference = simulate(leg_returns, weights, max_horizon=5, n_paths=2000, seed=1, chunk_size=None)
+    for chunk_size in (1, 7, 500, 1999, 5000):
+        result = simulate(leg_returns, weights, max_horizon=5, n_paths=2000, seed=1, chunk_size=chunk_size)
+        np.testing.assert_allclose(result.var, reference.var, rtol=1e-12)
+        np.testing.assert_allclose(result.cvar, reference.cvar, rtol=1e-12)
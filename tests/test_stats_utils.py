@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from src.stats_utils import IncrementalPairStatistics, calculate_pair_statistics
+
+def assert_statistics_match(incremental, full):
+    assert incremental.keys() == full.keys()
+    for key, value in full.items():
+        assert incremental[key] == pytest.approx(value, rel=1e-7, abs=1e-9, nan_ok=True), key
+
+@pytest.mark.parametrize('steps', [[1] * 25, [7, 30, 1, 120], [400]])
+def test_incremental_statistics_match_full_recompute(pair_data, steps):
+    state = IncrementalPairStatistics('A', 'B')
+    n = 600
+    state.update(pair_data.iloc[:n])
+    assert_statistics_match(state.statistics(), calculate_pair_statistics(pair_data.iloc[:n], 'A', 'B'))
+    for step in steps:
+        n += step
+        frame = pair_data.iloc[:n]
+        assert state.matches(frame)
+        state.update(frame)
+        assert_statistics_match(state.statistics(), calculate_pair_statistics(frame, 'A', 'B'))
+
+def test_revised_history_is_not_matched(pair_data):
+    state = IncrementalPairStatistics('A', 'B')
+    state.update(pair_data.iloc[:500])
+    revised = pair_data.copy()
+    revised['adj_close_A'] *= 0.98
+    assert not state.matches(revised)
+    assert not state.matches(pair_data.iloc[1:])